@@ -0,0 +1,263 @@
+"""
+Times and memory-profiles each phase of a dispatch run on synthetic profiles:
+
+    load              parse the profile files (cold profile cache)
+    build             build the matrix model and presolve it
+    solve             solve it with the configured solver
+    extract           turn the solver vector into the solution table
+    report            results_and_plotting.generate_report (xlsx)
+    plot_results, plot_soc, plot_energy_flow
+    render            all three figures in parallel worker processes (render_figures)
+
+for every combination of --weeks and --techs (storage technologies). Results are written
+to a JSON file; with --baseline they are compared against an earlier results file and
+the run exits with status 1 if any phase got slower than the tolerance.
+
+    python benchmark.py --baseline benchmark_baseline.json --weeks 1 4 13
+    python benchmark.py --out benchmark_baseline.json      # record a new baseline
+
+benchmark_baseline.json holds the 1, 4 and 13 week cases; timings are only comparable
+between runs on the same machine, so record a local baseline before comparing.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+# The model, loader and report writer are shared with the Streamlit app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streamlit'))
+import results_and_plotting as rp
+import charts as ch
+import model_builder as mb
+import presolve as ps
+import profile_loader as pl
+import solvers as sv
+import storage as sr
+
+PHASES = ['load', 'build', 'solve', 'extract', 'report', 'plot_results', 'plot_soc', 'plot_energy_flow', 'render']
+WEEKS = [1, 4, 13, 26, 52]
+TECHS = [3, 10]
+
+# Same defaults as the app, so every constraint type is active
+CAPACITIES = {'wind': 20.0, 'solar': 20.0, 'gas': 20.0, 'coal': 20.0, 'nuclear': 20.0, 'hydro': 20.0}
+COSTS = {'solar': 10.0, 'wind': 15.0, 'gas': 50.0, 'coal': 60.0, 'nuclear': 70.0, 'hydro': 40.0,
+         'unmet_demand': 100.0, 'curtailment': 5.0}
+BASE_STORAGE = [
+    {'name': 'LDES', 'efficiency': 0.85, 'capacity': 1000.0, 'charge_cost': 5.0, 'discharge_cost': 7.0},
+    {'name': 'SDES', 'efficiency': 0.9, 'capacity': 500.0, 'charge_cost': 3.0, 'discharge_cost': 5.0},
+    {'name': 'Hydrogen', 'efficiency': 0.75, 'capacity': 1500.0, 'charge_cost': 8.0, 'discharge_cost': 10.0},
+]
+
+
+def synthetic_profiles(n_hours, seed=0):
+    """
+    Hourly demand (MW) and solar/wind capacity factors with daily and seasonal shape and
+    random weather, in the columns profile_loader expects. Returns (demand_profile,
+    generation_profiles).
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_hours)
+    hour = t % 24
+    winter = np.cos(2 * np.pi * t / 8760)  # 1 at the start of the year, -1 in summer
+
+    daily = np.sin(np.pi * np.clip(hour - 6, 0, 16) / 16)
+    demand = np.clip(6 + 1.5 * winter + 3 * daily + rng.normal(0, 0.4, n_hours), 0, None)
+
+    # Clear-sky output scaled by a random cloudiness for each day
+    daylight = np.clip(np.sin(np.pi * (hour - 6) / 12), 0, None) * (0.7 - 0.2 * winter)
+    clouds = np.repeat(rng.uniform(0.3, 1.0, n_hours // 24 + 1), 24)[:n_hours]
+    solar = np.clip(daylight * clouds, 0, 1)
+
+    # Persistent wind: AR(1) weather squashed into [0, 1], windier in winter
+    weather = lfilter([1.0], [1.0, -0.97], rng.normal(0, 0.25, n_hours))
+    wind = 1 / (1 + np.exp(-(weather + 0.5 * winter - 0.3)))
+
+    return (pd.DataFrame({'Demand': demand}),
+            pd.DataFrame({'Solar Capacity Factor': solar, 'Wind Capacity Factor': wind}))
+
+
+def synthetic_storage(n_techs):
+    # The three standard technologies, or n_techs generated ones spread between them
+    if n_techs == 3:
+        return sr.make_registry(BASE_STORAGE)
+    share = np.linspace(0, 1, n_techs)
+    return sr.make_registry([
+        {'name': f'Storage_{k + 1}', 'efficiency': 0.75 + 0.15 * s, 'capacity': 1500.0 - 1000.0 * s,
+         'charge_cost': 8.0 - 5.0 * s, 'discharge_cost': 10.0 - 5.0 * s}
+        for k, s in enumerate(share)
+    ])
+
+
+def measure(fn, repeat=1, memory=True):
+    """
+    Runs fn and returns (result, seconds, peak MB). A first, untimed run warms up lazy
+    imports and caches, and gives the peak under tracemalloc (Python and NumPy allocations,
+    not memory held inside the solver library); the time is the fastest of `repeat` more.
+    """
+    peak = None
+    if memory:
+        tracemalloc.start()
+    fn()
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    return result, min(seconds), peak
+
+
+def run_case(weeks, n_techs, phases, workdir, repeat=1, memory=True, solver=None, style='auto'):
+    """
+    Benchmarks one horizon and storage count; returns one record per phase. Phases that
+    other phases depend on (load to extract) always run but are only recorded if asked for.
+    """
+    T = 168 * weeks
+    case = f'{weeks}w_{n_techs}s'
+    case_dir = os.path.join(workdir, case)
+    os.makedirs(case_dir, exist_ok=True)
+
+    demand_profile, generation_profiles = synthetic_profiles(T)
+    demand_path = os.path.join(case_dir, 'demand_profile.xlsx')
+    generation_path = os.path.join(case_dir, 'generation_profiles.xlsx')
+    demand_profile.to_excel(demand_path, index=False)
+    generation_profiles.to_excel(generation_path, index=False)
+    storage = synthetic_storage(n_techs)
+
+    records = []
+
+    def record(phase, fn):
+        result, seconds, peak = measure(fn, repeat, memory)
+        if phase in phases:
+            records.append({'case': case, 'weeks': weeks, 'techs': n_techs, 'phase': phase,
+                            'seconds': seconds, 'peak_mb': peak})
+            print(f"{case:>8} {phase:<17} {seconds:9.3f} s" + (f" {peak:9.1f} MB" if peak is not None else ""))
+        return result
+
+    # Every load gets an empty cache directory so the files are parsed each time
+    loaded = record('load', lambda: pl.load_profiles(demand_path, generation_path,
+                                                     cache_dir=tempfile.mkdtemp(dir=case_dir)))
+    data = pl.build_data(*loaded, CAPACITIES, T)
+
+    model = record('build', lambda: ps.reduce_model(mb.build_model(data, T, COSTS, CAPACITIES, storage=storage)))
+    status, x, objective, stats = record('solve', lambda: sv.solve_model(model, solver))
+    if x is None:
+        raise RuntimeError(f"{case}: solve finished with status {status}")
+    solution = record('extract', lambda: mb.make_solution(mb.extract_values(model, x)))
+    for entry in records:
+        entry.update({'rows': model['A'].shape[0], 'columns': model['A'].shape[1], 'nonzeros': model['A'].nnz,
+                      'objective': objective})
+
+    # Figures and report files go to the case directory; figures are closed after each call
+    cwd = os.getcwd()
+    os.chdir(case_dir)
+    try:
+        plots = {
+            'report': lambda: rp.generate_report(os.path.join(case_dir, 'report.xlsx'), T, data, storage,
+                                                 solution, COSTS, formats=['xlsx']),
+            'plot_results': lambda: rp.plot_results(T, data, storage, solution, style=style, show=False),
+            'plot_soc': lambda: rp.plot_soc(T, storage, solution, style=style, show=False),
+            'plot_energy_flow': lambda: rp.plot_energy_flow(T, data, storage, solution, style=style, show=False),
+            'render': lambda: rp.render_figures(T, data, storage, solution, style=style),
+        }
+        for phase, fn in plots.items():
+            if phase in phases:
+                record(phase, lambda: (fn(), plt.close('all')))
+    finally:
+        os.chdir(cwd)
+
+    return records
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, tolerance=0.2, min_seconds=0.01):
+    """
+    Joins a run to a baseline run by case and phase. A phase is a regression when it is
+    both more than `tolerance` (relative) and at least min_seconds slower. Returns a
+    DataFrame with the baseline and current seconds and peak MB, the time ratio, a
+    'regression' flag and an 'unchecked' flag for phases of this run the baseline does
+    not have (their baseline columns are NaN).
+    """
+    keys = ['case', 'phase']
+    current = pd.DataFrame(results)[keys + ['seconds', 'peak_mb']]
+    previous = pd.DataFrame(baseline)[keys + ['seconds', 'peak_mb']]
+    table = previous.merge(current, on=keys, how='right', suffixes=('_baseline', '_current'))
+    table['ratio'] = table['seconds_current'] / table['seconds_baseline']
+    table['regression'] = ((table['ratio'] > 1 + tolerance) &
+                           (table['seconds_current'] - table['seconds_baseline'] >= min_seconds))
+    table['unchecked'] = table['seconds_baseline'].isna()
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dispatch model phases on synthetic profiles")
+    parser.add_argument('--weeks', type=int, nargs='+', default=WEEKS)
+    parser.add_argument('--techs', type=int, nargs='+', default=TECHS, help='Numbers of storage technologies')
+    parser.add_argument('--phases', nargs='+', default=PHASES, choices=PHASES)
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per phase (the fastest is kept)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('--backend', default='highs', help='Solver backend (see solvers.PULP_SOLVERS)')
+    parser.add_argument('--method', default='choose', choices=sv.METHODS)
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--style', default='auto', choices=ch.STYLES, help='Chart style for the plot phases')
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown per phase')
+    args = parser.parse_args()
+
+    solver = {'backend': args.backend, 'method': args.method, 'threads': args.threads}
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for weeks in args.weeks:
+            for n_techs in args.techs:
+                results += run_case(weeks, n_techs, args.phases, workdir, args.repeat, not args.no_memory, solver,
+                                    args.style)
+
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'solver': solver, 'results': results}, f, indent=1)
+    print(f"Results saved to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        table = compare(results, baseline['results'], args.tolerance)
+        with pd.option_context('display.width', 200, 'display.max_rows', None):
+            print(table.to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+        unchecked = table[table['unchecked']]
+        if len(unchecked):
+            print(f"{len(unchecked)} phase(s) not in the baseline, so not checked: "
+                  f"{', '.join(unchecked['case'] + ' ' + unchecked['phase'])}")
+        regressions = table[table['regression']]
+        if len(regressions):
+            print(f"{len(regressions)} phase(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
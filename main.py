@@ -1,202 +1,258 @@
-import pandas as pd
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus
-import numpy as np
+import os
+import sys
+import time
+
 import matplotlib.pyplot as plt
 
-import conventional_gen as cg
+# The optimisation model and report writer are shared with the Streamlit app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streamlit'))
 import results_and_plotting as rp
+import optimisation as opt
+import storage as sr
+import rolling_horizon as rh
+import aggregation as ag
+import model_builder as mb
+import profile_loader as pl
+import solvers as sv
+import presolve as ps
+import performance as pf
+import network as nw
+import expansion as ex
+import ensemble as en
+import unit_commitment as uc
+import sensitivity as se
+
 # Define the number of weeks
 number_of_weeks = 1
 
-# Load the demand profile and generation profiles from the Excel files
-demand_profile = pd.read_excel('demand_profile.xlsx', header=0)
-generation_profiles = pd.read_excel('generation_profiles.xlsx', header=0)
+# Model time step in hours (e.g. 0.25, 1, 4, 24) and the resolution of the profile files.
+# Coarser steps average the profiles, finer steps repeat them.
+time_step = 1
+input_time_step = 1
+
+# Time and memory of each phase (load, build, solve, extract, plot, report) are printed at
+# the end; set performance_log to a file name to also append them there as JSON lines
+performance = []
+performance_log = None
 
-# Extend the data for the number of weeks
-demand_profile = pd.concat([demand_profile] * number_of_weeks, ignore_index=True)
-generation_profiles = pd.concat([generation_profiles] * number_of_weeks, ignore_index=True)
+# Load the demand profile and generation profiles (Excel or CSV). Each file is parsed and
+# validated once, then loaded from the profile cache on later runs.
+with pf.phase(performance, 'load'):
+    demand_profile, generation_profiles = pl.load_profiles('demand_profile.xlsx', 'generation_profiles.xlsx')
 
 # Define capacities for wind and solar (in MW)
 capacity_wind = 20
 capacity_solar = 20
 
-# Calculate the actual generation profiles by multiplying capacity factors by the defined capacities
-solar_generation = generation_profiles['Solar Capacity Factor'] * capacity_solar
-wind_generation = generation_profiles['Wind Capacity Factor'] * capacity_wind
+# Generation is capacity x capacity factor. Profiles shorter than the horizon (e.g. one
+# week) repeat cyclically; full-year profiles are used as they are.
+profile_rows = mb.steps(168 * number_of_weeks, input_time_step)
+data = pl.build_data(demand_profile, generation_profiles, {'solar': capacity_solar, 'wind': capacity_wind},
+                     profile_rows)
 
-# Extract the demand profile
-demand = demand_profile['Demand']
+# Ensure the data is in the correct format (168 * number_of_weeks hours in steps of time_step)
+time_horizon = mb.steps(168 * number_of_weeks, time_step)
+data = mb.resample_profiles(data, time_step, input_time_step)
 
-# Ensure the data is in the correct format (168 * number_of_weeks hourly intervals)
-time_horizon = 168 * number_of_weeks
-data = pd.DataFrame({
-    'Solar Generation (MW)': solar_generation,
-    'Wind Generation (MW)': wind_generation,
-    'Demand (MW)': demand
-})
 
-
-# Storage efficiencies and capacities
-efficiency_ldes = 0.85
-efficiency_sdes = 0.9
-efficiency_hydrogen = 0.75
-
-capacity_ldes = 1000  # in MWh
-capacity_sdes = 500   # in MWh
-capacity_hydrogen = 1500  # in MWh
+# Storage technologies: efficiency, energy capacity (MWh), charge/discharge costs (£/MWh)
+# and optional power limits (MW). Add a row to model another technology.
+storage = sr.make_registry([
+    {'name': 'LDES', 'efficiency': 0.85, 'capacity': 1000, 'charge_cost': 5, 'discharge_cost': 7},
+    {'name': 'SDES', 'efficiency': 0.9, 'capacity': 500, 'charge_cost': 3, 'discharge_cost': 5},
+    {'name': 'Hydrogen', 'efficiency': 0.75, 'capacity': 1500, 'charge_cost': 8, 'discharge_cost': 10},
+])
 
 # Costs (example values)
 cost_solar = 10  # £/MWh
 cost_wind = 15  # £/MWh
-cost_ldes_charge = 5  # £/MWh
-cost_ldes_discharge = 7  # £/MWh
-cost_sdes_charge = 3  # £/MWh
-cost_sdes_discharge = 5  # £/MWh
-cost_hydrogen_charge = 8  # £/MWh
-cost_hydrogen_discharge = 10  # £/MWh
 cost_unmet_demand = 100  # £/MWh for unmet demand (high penalty)
 cost_curtailment = 5
 
-# Create the LP problem
-prob = LpProblem("Least_Cost_Dispatch", LpMinimize)
-
-# Add conventional generation to the optimization problem
-Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro = cg.add_conventional_generation(prob, data, time_horizon)
-
-# Add demand response to the optimization problem
-Shift_Down, Shift_Up = cg.add_demand_response(prob, data, time_horizon)
-# Solve the optimization problem
-
-# Define decision variables
-Charge_LDES = LpVariable.dicts("Charge_LDES", range(time_horizon), lowBound=0, cat='Continuous')
-Discharge_LDES = LpVariable.dicts("Discharge_LDES", range(time_horizon), lowBound=0, cat='Continuous')
-
-Charge_SDES = LpVariable.dicts("Charge_SDES", range(time_horizon), lowBound=0, cat='Continuous')
-Discharge_SDES = LpVariable.dicts("Discharge_SDES", range(time_horizon), lowBound=0, cat='Continuous')
-
-Charge_Hydrogen = LpVariable.dicts("Charge_Hydrogen", range(time_horizon), lowBound=0, cat='Continuous')
-Discharge_Hydrogen = LpVariable.dicts("Discharge_Hydrogen", range(time_horizon), lowBound=0, cat='Continuous')
-
-Unmet_Demand = LpVariable.dicts("Unmet_Demand", range(time_horizon), lowBound=0, cat='Continuous')
-Curtailment = LpVariable.dicts("Curtailment", range(time_horizon), lowBound=0, cat='Continuous')
-
-# Objective: Minimize the total cost of generation, charging, discharging, and unmet demand
-prob += lpSum([
-    cost_solar * data['Solar Generation (MW)'][t] +
-    cost_wind * data['Wind Generation (MW)'][t] +
-    cost_ldes_charge * Charge_LDES[t] +
-    cost_ldes_discharge * Discharge_LDES[t] +
-    cost_sdes_charge * Charge_SDES[t] +
-    cost_sdes_discharge * Discharge_SDES[t] +
-    cost_hydrogen_charge * Charge_Hydrogen[t] +
-    cost_hydrogen_discharge * Discharge_Hydrogen[t] +
-    cost_unmet_demand * Unmet_Demand[t] +
-    cost_curtailment * Curtailment[t]
-    for t in range(time_horizon)
-]), "Total_Cost"
-
-# Set the initial state of charge (SOC) for each storage type to zero
-SOC_LDES = {0: 0}
-SOC_SDES = {0: 0}
-SOC_Hydrogen = {0: 0}
-
-# Additional constraint to ensure storage discharge only happens to meet demand
-for t in range(1, time_horizon):
-    # Define the SOC for each storage at time t
-    SOC_LDES[t] = LpVariable(f"SOC_LDES_{t}", lowBound=0, upBound=capacity_ldes)
-    SOC_SDES[t] = LpVariable(f"SOC_SDES_{t}", lowBound=0, upBound=capacity_sdes)
-    SOC_Hydrogen[t] = LpVariable(f"SOC_Hydrogen_{t}", lowBound=0, upBound=capacity_hydrogen)
-
-    # Storage dynamics
-    prob += SOC_LDES[t] == SOC_LDES[t-1] + Charge_LDES[t] * efficiency_ldes - Discharge_LDES[t] * (1 / efficiency_ldes), f"LDES_SOC_{t}"
-    prob += SOC_SDES[t] == SOC_SDES[t-1] + Charge_SDES[t] * efficiency_sdes - Discharge_SDES[t] * (1 / efficiency_sdes), f"SDES_SOC_{t}"
-    prob += SOC_Hydrogen[t] == SOC_Hydrogen[t-1] + Charge_Hydrogen[t] * efficiency_hydrogen - Discharge_Hydrogen[t] * (1 / efficiency_hydrogen), f"Hydrogen_SOC_{t}"
-
-    # Ensure that the discharge from storage does not exceed the available SOC at that time
-    prob += Discharge_LDES[t] <= SOC_LDES[t-1], f"LDES_Discharge_Limit_{t}"
-    prob += Discharge_SDES[t] <= SOC_SDES[t-1], f"SDES_Discharge_Limit_{t}"
-    prob += Discharge_Hydrogen[t] <= SOC_Hydrogen[t-1], f"Hydrogen_Discharge_Limit_{t}"
-
-    # Discharge can only happen to meet demand
-    prob += Discharge_LDES[t] <= data['Demand (MW)'][t], f"LDES_Discharge_Meets_Demand_{t}"
-    prob += Discharge_SDES[t] <= data['Demand (MW)'][t], f"SDES_Discharge_Meets_Demand_{t}"
-    prob += Discharge_Hydrogen[t] <= data['Demand (MW)'][t], f"Hydrogen_Discharge_Meets_Demand_{t}"
-
-    # Capacity constraints
-    prob += SOC_LDES[t] <= capacity_ldes, f"LDES_Capacity_{t}"
-    prob += SOC_SDES[t] <= capacity_sdes, f"SDES_Capacity_{t}"
-    prob += SOC_Hydrogen[t] <= capacity_hydrogen, f"Hydrogen_Capacity_{t}"
-
-    
-
-   # Demand-Supply Constraint with Unmet Demand and Curtailed Energy
-for t in range(time_horizon):
-    prob += (
-        data['Solar Generation (MW)'][t] +
-        data['Wind Generation (MW)'][t] +
-        Discharge_LDES[t] +
-        Discharge_SDES[t] +
-        Discharge_Hydrogen[t] +
-        Gen_Gas[t] +
-        Gen_Coal[t] +
-        Gen_Nuclear[t] +
-        Gen_Hydro[t] +
-        Unmet_Demand[t]
-        == data['Demand (MW)'][t] +
-        Charge_LDES[t] +
-        Charge_SDES[t] +
-        Charge_Hydrogen[t] +
-        Curtailment[t]  # Add curtailment to ensure excess generation is handled
-    ), f"Demand_Supply_Constraint_{t}"
-
-# Final state of charge must be within capacity limits
-prob += SOC_LDES[time_horizon-1] <= capacity_ldes, "Final_LDES_SOC"
-prob += SOC_SDES[time_horizon-1] <= capacity_sdes, "Final_SDES_SOC"
-prob += SOC_Hydrogen[time_horizon-1] <= capacity_hydrogen, "Final_Hydrogen_SOC"
-
-# Solve the optimization problem
-prob.solve()
-
-print("Status:", LpStatus[prob.status])
+# Conventional generation capacities (in MW) and costs (£/MWh)
+capacity_gas = 0
+capacity_coal = 0
+capacity_nuclear = 0
+capacity_hydro = 0
+
+cost_gas = 50
+cost_coal = 60
+cost_nuclear = 70
+cost_hydro = 40
+
+capacities = {
+    'wind': capacity_wind, 'solar': capacity_solar,
+    'gas': capacity_gas, 'coal': capacity_coal, 'nuclear': capacity_nuclear, 'hydro': capacity_hydro
+}
+costs = {
+    'solar': cost_solar, 'wind': cost_wind,
+    'gas': cost_gas, 'coal': cost_coal, 'nuclear': cost_nuclear, 'hydro': cost_hydro,
+    'unmet_demand': cost_unmet_demand, 'curtailment': cost_curtailment
+}
+
+# Rolling-horizon mode: solve windows of rolling_window hours, committing all but the last
+# rolling_overlap hours of each. None solves the whole horizon as one LP.
+rolling_window = None
+rolling_overlap = 168
+
+# Representative-period mode: cluster the days (24 h) or weeks (168 h) of the profiles into
+# this many representative periods and solve the reduced model. None solves every step.
+representative_periods = None
+representative_period_length = 24
+
+# Network mode: a workbook with 'Buses', 'Lines' and optional 'Locations' sheets (see
+# streamlit/network.py) splits demand, renewables and assets between buses linked by lines
+# with capacity limits and losses. None solves one copper-plate bus.
+network_file = None
+
+# Capacity-expansion mode: choose the capacities listed here (keys of `capacities` or
+# storage names) with their annualised cost (£/MW or £/MWh per year) and optional
+# min/max, e.g. {'wind': {'cost': 100000, 'max': 200}, 'LDES': {'cost': 2000}}. The
+# horizon is split into expansion_period-hour subproblems solved in parallel by Benders
+# decomposition on expansion_workers processes (None = every core). None keeps the
+# capacities above fixed.
+expansion = None
+expansion_period = 168
+expansion_workers = None
+
+# Ensemble mode: after the run above, solve the same portfolio against every weather year
+# in ensemble_years ({name: (demand file, generation file)}) in parallel and print the
+# distribution of cost, unmet energy, curtailment and storage cycling. The dispatch of
+# every year is saved to ensemble_store (Parquet) unless it is None.
+ensemble_years = None
+ensemble_store = 'ensemble_dispatch.parquet'
+
+# Unit-commitment mode: solve the whole horizon as a MIP with on/off, start-up and shut-down
+# decisions for gas and coal (minimum stable generation and start-up costs in
+# streamlit/unit_commitment.py), warm-started from its LP relaxation. Stops at the mip_gap
+# below (0.5% when None). False keeps the LP with its simplified commitment rows.
+unit_commitment = False
+
+# Sensitivities of the full-horizon LP, read from the duals of its one solve: hourly prices
+# (with a price duration curve), the value of stored energy, the marginal value of each
+# capacity and cost ranging, printed and saved to sensitivity_report.xlsx
+sensitivity = False
+
+# Solver settings: backend 'highs' (in-process) or any other installed PuLP solver
+# ('cbc', 'glpk', ...); method 'choose', 'simplex' or 'ipm' (interior point); threads
+# (0 = every core, None = solver default); time_limit in seconds; relative mip_gap
+solver = {'backend': 'highs', 'method': 'choose', 'threads': None, 'time_limit': None, 'mip_gap': None}
+
+# Report outputs: 'xlsx' (both sheets in one workbook), 'csv' and/or 'parquet'
+report_formats = ['xlsx']
+
+# The run is summarised on screen; set hourly_file (e.g. 'hourly_breakdown.csv' or
+# '.parquet') to also save the breakdown of every step
+hourly_file = None
+
+# Figures: 'auto' draws one bar per step up to two weeks and thinned stacked areas on longer
+# horizons ('bar', 'area' or 'decimated' to choose). The three PNGs are saved in parallel
+# worker processes without opening windows; show_figures = True draws and shows them here.
+chart_style = 'auto'
+show_figures = False
+
+# Build the model with the vectorised builder and solve it
+if expansion is not None:
+    model, status, solution = ex.run_expansion(
+        data, time_horizon, costs, capacities, expansion, storage=storage, period=expansion_period,
+        n_periods=representative_periods, time_step=time_step, solver=solver, workers=expansion_workers
+    )
+    print(ex.format_benders(model))
+    print(ex.format_capacities(model))
+    # Report on the chosen capacities
+    data, storage, capacities = model['data'], model['registry'], model['capacity_settings']
+elif representative_periods is not None:
+    model, status, solution = ag.run_aggregated_optimization(
+        data, time_horizon, costs, capacities, storage=storage,
+        n_periods=representative_periods, period=representative_period_length, time_step=time_step,
+        solver=solver
+    )
+elif network_file is not None:
+    network = nw.load_network(network_file)
+    model, status, solution = nw.run_network_optimization(data, time_horizon, costs, capacities, network,
+                                                          storage=storage, time_step=time_step, solver=solver)
+elif unit_commitment:
+    model, status, solution = uc.run_unit_commitment(data, time_horizon, costs, capacities, storage=storage,
+                                                     time_step=time_step, solver=solver)
+    print(uc.commitment_summary(model, solution))
+elif rolling_window is None:
+    model, status, solution = opt.run_optimization(data, time_horizon, costs, capacities, storage=storage,
+                                                   time_step=time_step, solver=solver, sensitivity=sensitivity)
+else:
+    model, status, solution = rh.run_rolling_horizon(
+        data, time_horizon, costs, capacities, storage=storage, window=rolling_window, overlap=rolling_overlap,
+        time_step=time_step, solver=solver
+    )
+
+if model.get('presolve'):
+    print(ps.format_stats(model['presolve']))
+if model.get('aggregation'):
+    print(ag.format_error(model['aggregation']))
+print("Status:", status)
+print(sv.format_stats(model['solver']))
+performance += model['performance']
 
 # Call functions from results_and_plotting.py
-rp.display_results(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                   Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Unmet_Demand, Curtailment, 
-                   Charge_LDES, Charge_SDES, Charge_Hydrogen)
+rp.display_results(time_horizon, data, storage, solution, time_step, bulk_file=hourly_file)
+
+if show_figures:
+    with pf.phase(performance, 'plot', label='plot_results'):
+        rp.plot_results(time_horizon, data, storage, solution, time_step, chart_style)
 
-rp.plot_results(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Unmet_Demand)
+    with pf.phase(performance, 'plot', label='plot_soc'):
+        rp.plot_soc(time_horizon, storage, solution, time_step, chart_style)
 
-rp.plot_soc(time_horizon, SOC_LDES, SOC_SDES, SOC_Hydrogen)
+    with pf.phase(performance, 'plot', label='plot_energy_flow'):
+        rp.plot_energy_flow(time_horizon, data, storage, solution, time_step, chart_style)
+else:
+    # Non-interactive backend: nothing blocks waiting for a window to be closed
+    plt.switch_backend('Agg')
+    with pf.phase(performance, 'plot', label='render_figures'):
+        rp.render_figures(time_horizon, data, storage, solution, time_step, chart_style)
 
-rp.plot_energy_flow(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                    Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Charge_LDES, Charge_SDES, 
-                    Charge_Hydrogen, Unmet_Demand)
 # Generate the comprehensive report
-rp.generate_report(
-    filename='optimization_report.xlsx',
-    time_horizon=time_horizon,
-    data=data,
-    Discharge_LDES=Discharge_LDES,
-    Discharge_SDES=Discharge_SDES,
-    Discharge_Hydrogen=Discharge_Hydrogen,
-    Gen_Gas=Gen_Gas,
-    Gen_Coal=Gen_Coal,
-    Gen_Nuclear=Gen_Nuclear,
-    Gen_Hydro=Gen_Hydro,
-    Unmet_Demand=Unmet_Demand,
-    Curtailment=Curtailment,
-    Charge_LDES=Charge_LDES,
-    Charge_SDES=Charge_SDES,
-    Charge_Hydrogen=Charge_Hydrogen,
-    cost_solar=cost_solar,
-    cost_wind=cost_wind,
-    cost_ldes_charge=cost_ldes_charge,
-    cost_ldes_discharge=cost_ldes_discharge,
-    cost_sdes_charge=cost_sdes_charge,
-    cost_sdes_discharge=cost_sdes_discharge,
-    cost_hydrogen_charge=cost_hydrogen_charge,
-    cost_hydrogen_discharge=cost_hydrogen_discharge,
-    cost_unmet_demand=cost_unmet_demand,
-    cost_curtailment=cost_curtailment
-)
\ No newline at end of file
+with pf.phase(performance, 'report'):
+    rp.generate_report(
+        filename='optimization_report.xlsx',
+        time_horizon=time_horizon,
+        data=data,
+        storage=storage,
+        solution=solution,
+        costs=costs,
+        formats=report_formats,
+        time_step=time_step
+    )
+
+if model.get('sensitivity'):
+    prices = model['sensitivity']['prices']
+    print(f"Marginal price: average £{prices.mean():.2f}/MWh, peak £{prices.max():.2f}/MWh, "
+          f"at or above £{prices.quantile(0.9):.2f}/MWh for 10% of hours")
+    print(se.format_capacity_values(model['sensitivity']['capacity_values']))
+    with pf.phase(performance, 'report', label='sensitivity'):
+        print(f"Sensitivity report saved to {se.write_report('sensitivity_report.xlsx', model['sensitivity'])}")
+        rp.plot_price_duration(model['sensitivity']['price_duration'], show=show_figures)
+
+if network_file is not None and 'congestion' in model:
+    print(model['congestion'].to_string(index=False, float_format=lambda v: f'{v:.2f}'))
+    print(f"Network report saved to {nw.write_network_report('network_report.xlsx', model, solution, data)}")
+    if network['buses'][['lat', 'lon']].notna().all(axis=None):
+        print(f"Network map saved to {nw.save_map(network, model['congestion'], 'network_map.html')}")
+
+if ensemble_years:
+    with pf.phase(performance, 'load', label='ensemble'):
+        members = en.load_members(ensemble_years, profile_rows)
+    ensemble_info, ensemble_status, ensemble_results = en.run_ensemble(
+        members, time_horizon, costs, capacities, storage=storage, time_step=time_step, input_step=input_time_step,
+        solver=solver, store=ensemble_store
+    )
+    performance += ensemble_info['performance']
+    print(f"Ensemble of {ensemble_info['members']} weather years: {ensemble_status}")
+    print(ensemble_info['statistics'].to_string(index=False, float_format=lambda v: f'{v:,.2f}'))
+    ensemble_results.to_csv('ensemble_members.csv', index=False)
+    print("Per-year results saved to ensemble_members.csv" +
+          (f", dispatch to {ensemble_store}" if ensemble_store else ""))
+
+print(pf.format_record(performance))
+if performance_log:
+    pf.write_json_lines(performance, performance_log, run=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        weeks=number_of_weeks, time_step=time_step, backend=solver['backend'])
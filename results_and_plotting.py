@@ -1,62 +1,95 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-def display_results(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                    Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Unmet_Demand, Curtailment, 
-                    Charge_LDES, Charge_SDES, Charge_Hydrogen):
-    # Display how each hour of demand is met, including all relevant components
-    for t in range(time_horizon):
-        print(f"Hour {t}:")
-        print(f"  Solar Generation: {data['Solar Generation (MW)'][t]:.2f} MW")
-        print(f"  Wind Generation: {data['Wind Generation (MW)'][t]:.2f} MW")
-        print(f"  LDES Discharge: {Discharge_LDES[t].varValue:.2f} MW")
-        print(f"  SDES Discharge: {Discharge_SDES[t].varValue:.2f} MW")
-        print(f"  Hydrogen Discharge: {Discharge_Hydrogen[t].varValue:.2f} MW")
-        print(f"  Gas Generation: {Gen_Gas[t].varValue:.2f} MW")
-        print(f"  Coal Generation: {Gen_Coal[t].varValue:.2f} MW")
-        print(f"  Nuclear Generation: {Gen_Nuclear[t].varValue:.2f} MW")
-        print(f"  Hydro Generation: {Gen_Hydro[t].varValue:.2f} MW")
-        print(f"  Unmet Demand: {Unmet_Demand[t].varValue:.2f} MW")
-        print(f"  Curtailment: {Curtailment[t].varValue:.2f} MW")
-        print(f"  LDES Charge: {Charge_LDES[t].varValue:.2f} MW")
-        print(f"  SDES Charge: {Charge_SDES[t].varValue:.2f} MW")
-        print(f"  Hydrogen Charge: {Charge_Hydrogen[t].varValue:.2f} MW")
-        print(f"  Total Demand: {data['Demand (MW)'][t]:.2f} MW")
-        total_generation = (data['Solar Generation (MW)'][t] + data['Wind Generation (MW)'][t] +
-                            Gen_Gas[t].varValue + Gen_Coal[t].varValue + Gen_Nuclear[t].varValue + Gen_Hydro[t].varValue)
-        total_discharge = (Discharge_LDES[t].varValue + Discharge_SDES[t].varValue + Discharge_Hydrogen[t].varValue)
-        total_charge = (Charge_LDES[t].varValue + Charge_SDES[t].varValue + Charge_Hydrogen[t].varValue)
-        total_curtailment = Curtailment[t].varValue
-        total_unmet = Unmet_Demand[t].varValue
-        balance_check = total_generation + total_discharge - total_charge - total_curtailment + total_unmet
-        print(f"  Balance Check (Generation + Discharge - Charge - Curtailment + Unmet): {balance_check:.2f} MW\n")
-
-def plot_results(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                 Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Unmet_Demand):
+import charts as ch
+import report_writer as rw
+
+CONVENTIONAL = ['Gas', 'Coal', 'Nuclear', 'Hydro']
+SOC_COLORS = ['blue', 'green', 'red']
+
+# The solution is a DataFrame indexed by time step with one column per series:
+# Charge_<name>, Discharge_<name>, SOC_<name>, Gen_<gen>, Unmet_Demand, Curtailment, ...
+# time_step is the length of a step in hours; powers are MW averaged over each step.
+# style is one of charts.STYLES: long horizons are drawn as thinned stacked areas rather
+# than one bar per step. show=False closes each figure after saving it (batch runs).
+
+# Figure file written by each plot function
+FIGURES = {'plot_results': 'demand_vs_supply.png', 'plot_soc': 'soc_all_storage.png',
+           'plot_energy_flow': 'energy_flow.png', 'plot_price_duration': 'price_duration.png'}
+
+def _series(solution, time_horizon):
+    # Every column as a NumPy array over the horizon
+    return {name: solution[name].to_numpy(dtype=float)[:time_horizon] for name in solution.columns}
+
+def _profiles(data, time_horizon):
+    return (data['Solar Generation (MW)'].to_numpy(dtype=float)[:time_horizon],
+            data['Wind Generation (MW)'].to_numpy(dtype=float)[:time_horizon],
+            data['Demand (MW)'].to_numpy(dtype=float)[:time_horizon])
+
+def _totals(names, v):
+    # Summed discharge, conventional generation and charge for each hour
+    discharge = sum((v[f'Discharge_{name}'] for name in names), np.zeros_like(v['Unmet_Demand']))
+    generation = sum((v[f'Gen_{gen}'] for gen in CONVENTIONAL), np.zeros_like(v['Unmet_Demand']))
+    charge = sum((v[f'Charge_{name}'] for name in names), np.zeros_like(v['Unmet_Demand']))
+    return discharge, generation, charge
+
+def display_results(time_horizon, data, storage, solution, time_step=1.0, bulk_file=None):
+    # A compact summary rather than every step: energy by flow over the horizon, when demand
+    # went unmet or generation was curtailed and the largest balance error. bulk_file
+    # (.csv, .parquet or .xlsx) gets the whole hourly breakdown.
+    totals = rw.hourly_breakdown(time_horizon, data, storage, solution, time_step, period=time_horizon * time_step)
+    print(f"Results over {time_horizon * time_step:g} hours ({time_horizon} steps of {time_step:g} h):")
+    for column, energy in totals.drop(columns='Hour').iloc[0].items():
+        print(f"  {column.replace(' (MWh)', '')}: {energy:.2f} MWh")
+
+    v = _series(solution, time_horizon)
+    hours = rw.step_hours(time_horizon, time_step)
+    for label, series in [('Unmet demand', v['Unmet_Demand']), ('Curtailment', v['Curtailment'])]:
+        active = np.flatnonzero(series > 1e-6)
+        if len(active):
+            peak = int(np.argmax(series))
+            print(f"  {label} in {len(active)} of {time_horizon} steps, peak {series[peak]:.2f} MW at hour {hours[peak]}")
+        else:
+            print(f"  {label}: none")
+    balance = rw.hourly_breakdown(time_horizon, data, storage, solution, time_step, flows=['Demand & balance'])
+    error = (balance['Balance Check (MW)'] - balance['Total Demand (MW)']).abs().to_numpy()
+    worst = int(np.argmax(error))
+    print(f"  Largest balance error: {error[worst]:.2e} MW at hour {hours[worst]}")
+
+    if bulk_file:
+        rw.write_table(bulk_file, rw.hourly_breakdown(time_horizon, data, storage, solution, time_step),
+                       'Hourly Breakdown')
+        print(f"Hourly breakdown saved to {bulk_file}")
+
+def plot_results(time_horizon, data, storage, solution, time_step=1.0, style='auto', show=True):
+    v = _series(solution, time_horizon)
+    solar, wind, demand = _profiles(data, time_horizon)
     # Prepare data for plotting
     results = {
-        'Solar Generation': [data['Solar Generation (MW)'][t] for t in range(time_horizon)],
-        'Wind Generation': [data['Wind Generation (MW)'][t] for t in range(time_horizon)],
-        'LDES Discharge': [Discharge_LDES[t].varValue for t in range(time_horizon)],
-        'SDES Discharge': [Discharge_SDES[t].varValue for t in range(time_horizon)],
-        'Hydrogen Discharge': [Discharge_Hydrogen[t].varValue for t in range(time_horizon)],
-        'Gas Generation': [Gen_Gas[t].varValue for t in range(time_horizon)],
-        'Coal Generation': [Gen_Coal[t].varValue for t in range(time_horizon)],
-        'Nuclear Generation': [Gen_Nuclear[t].varValue for t in range(time_horizon)],
-        'Hydro Generation': [Gen_Hydro[t].varValue for t in range(time_horizon)],
-        'Unmet Demand': [Unmet_Demand[t].varValue for t in range(time_horizon)]
+        'Solar Generation': solar,
+        'Wind Generation': wind,
     }
+    for name in storage['name']:
+        results[f'{name} Discharge'] = v[f'Discharge_{name}']
+    for gen in CONVENTIONAL:
+        results[f'{gen} Generation'] = v[f'Gen_{gen}']
+    results['Unmet Demand'] = v['Unmet_Demand']
 
-    df_results = pd.DataFrame(results)
+    df_results = pd.DataFrame(results, index=rw.step_hours(time_horizon, time_step))
 
     # Plot the stacked bar chart
     fig, ax = plt.subplots(figsize=(14, 8))
 
-    # Create a stacked bar chart
-    df_results.plot(kind='bar', stacked=True, ax=ax, width=1)
+    # Create a stacked bar chart (thinned stacked areas on long horizons)
+    style = ch.chart_style(style, time_horizon)
+    x = ch.draw_stacked(ax, df_results, style, time_step)
 
     # Plot the demand line
-    ax.plot(df_results.index, data['Demand (MW)'][:time_horizon], label='Demand', linestyle='--', color='black', linewidth=2)
+    ch.draw_line(ax, x, demand, style, label='Demand', linestyle='--', color='black', linewidth=2)
 
     # Customize the plot
     ax.set_title('How Demand is Met at Each Interval')
@@ -68,27 +101,26 @@ def plot_results(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_H
     plt.tight_layout()
 
     # Save the figure to a file
-    plt.savefig('demand_vs_supply.png')
+    plt.savefig(FIGURES['plot_results'])
 
     # Optionally, you can also display the plot if running in a notebook
-    plt.show()
+    _finish(fig, show)
 
-def plot_soc(time_horizon, SOC_LDES, SOC_SDES, SOC_Hydrogen):
+def plot_soc(time_horizon, storage, solution, time_step=1.0, style='auto', show=True):
+    v = _series(solution, time_horizon)
     # Prepare data for SOC plotting
-    soc_results = {
-        'LDES SOC': [SOC_LDES[t].varValue for t in range(1, time_horizon)],
-        'SDES SOC': [SOC_SDES[t].varValue for t in range(1, time_horizon)],
-        'Hydrogen SOC': [SOC_Hydrogen[t].varValue for t in range(1, time_horizon)]
-    }
+    soc_results = {f'{name} SOC': v[f'SOC_{name}'][1:] for name in storage['name']}
 
-    df_soc_results = pd.DataFrame(soc_results)
+    df_soc_results = pd.DataFrame(soc_results, index=rw.step_hours(time_horizon - 1, time_step))
 
     # Plot the SOCs on the same graph
-    plt.figure(figsize=(14, 8))
+    fig = plt.figure(figsize=(14, 8))
 
-    plt.plot(df_soc_results.index, df_soc_results['LDES SOC'], label='LDES SOC', color='blue', linewidth=2)
-    plt.plot(df_soc_results.index, df_soc_results['SDES SOC'], label='SDES SOC', color='green', linewidth=2)
-    plt.plot(df_soc_results.index, df_soc_results['Hydrogen SOC'], label='Hydrogen SOC', color='red', linewidth=2)
+    style = ch.chart_style(style, time_horizon)
+    for k, column in enumerate(df_soc_results.columns):
+        color = SOC_COLORS[k] if k < len(SOC_COLORS) else None
+        ch.draw_line(plt.gca(), df_soc_results.index, df_soc_results[column].to_numpy(), style,
+                     drawstyle='default', label=column, color=color, linewidth=2)
 
     # Customize the plot
     plt.title('State of Charge (SOC) for All Storage Systems')
@@ -100,36 +132,32 @@ def plot_soc(time_horizon, SOC_LDES, SOC_SDES, SOC_Hydrogen):
     plt.tight_layout()
 
     # Save the figure to a file
-    plt.savefig('soc_all_storage.png')
+    plt.savefig(FIGURES['plot_soc'])
 
     # Optionally, display the plot if running in a notebook
-    plt.show()
+    _finish(fig, show)
 
-def plot_energy_flow(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                     Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Charge_LDES, Charge_SDES, Charge_Hydrogen, Unmet_Demand):
+def plot_energy_flow(time_horizon, data, storage, solution, time_step=1.0, style='auto', show=True):
+    names = list(storage['name'])
+    v = _series(solution, time_horizon)
+    solar, wind, demand = _profiles(data, time_horizon)
+    discharge, generation, charge = _totals(names, v)
     # Prepare data for energy flow plotting
     energy_flow_results = {
-        'Demand': [data['Demand (MW)'][t] - Unmet_Demand[t].varValue for t in range(time_horizon)],
-        'Charge LDES': [Charge_LDES[t].varValue for t in range(time_horizon)],
-        'Charge SDES': [Charge_SDES[t].varValue for t in range(time_horizon)],
-        'Charge Hydrogen': [Charge_Hydrogen[t].varValue for t in range(time_horizon)],
-        'Curtailed Energy': [
-            max(0, data['Solar Generation (MW)'][t] + data['Wind Generation (MW)'][t] +
-                Gen_Gas[t].varValue + Gen_Coal[t].varValue + Gen_Nuclear[t].varValue + Gen_Hydro[t].varValue -
-                (Discharge_LDES[t].varValue + Discharge_SDES[t].varValue + Discharge_Hydrogen[t].varValue +
-                 Charge_LDES[t].varValue + Charge_SDES[t].varValue + Charge_Hydrogen[t].varValue +
-                 (data['Demand (MW)'][t] - Unmet_Demand[t].varValue)))
-            for t in range(time_horizon)
-        ]
+        'Demand': demand - v['Unmet_Demand'],
     }
+    for name in names:
+        energy_flow_results[f'Charge {name}'] = v[f'Charge_{name}']
+    energy_flow_results['Curtailed Energy'] = np.maximum(
+        0, solar + wind + generation - (discharge + charge + (demand - v['Unmet_Demand'])))
 
-    df_energy_flow = pd.DataFrame(energy_flow_results)
+    df_energy_flow = pd.DataFrame(energy_flow_results, index=rw.step_hours(time_horizon, time_step))
 
     # Plot the energy flow
     fig, ax = plt.subplots(figsize=(14, 8))
 
-    # Create a stacked bar chart
-    df_energy_flow.plot(kind='bar', stacked=True, ax=ax, width=1)
+    # Create a stacked bar chart (thinned stacked areas on long horizons)
+    ch.draw_stacked(ax, df_energy_flow, ch.chart_style(style, time_horizon), time_step)
 
     # Customize the plot
     ax.set_title('Energy Flow at Each Interval')
@@ -141,92 +169,64 @@ def plot_energy_flow(time_horizon, data, Discharge_LDES, Discharge_SDES, Dischar
     plt.tight_layout()
 
     # Save the figure to a file
-    plt.savefig('energy_flow.png')
+    plt.savefig(FIGURES['plot_energy_flow'])
 
     # Optionally, display the plot if running in a notebook
-    plt.show()
-
-
-def generate_report(filename, time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                    Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Unmet_Demand, Curtailment, 
-                    Charge_LDES, Charge_SDES, Charge_Hydrogen, cost_solar, cost_wind, 
-                    cost_ldes_charge, cost_ldes_discharge, cost_sdes_charge, cost_sdes_discharge, 
-                    cost_hydrogen_charge, cost_hydrogen_discharge, cost_unmet_demand, cost_curtailment):
-    report = []
-
-    total_cost = 0
-    for t in range(time_horizon):
-        solar_cost = cost_solar * data['Solar Generation (MW)'][t]
-        wind_cost = cost_wind * data['Wind Generation (MW)'][t]
-        ldes_charge_cost = cost_ldes_charge * Charge_LDES[t].varValue
-        ldes_discharge_cost = cost_ldes_discharge * Discharge_LDES[t].varValue
-        sdes_charge_cost = cost_sdes_charge * Charge_SDES[t].varValue
-        sdes_discharge_cost = cost_sdes_discharge * Discharge_SDES[t].varValue
-        hydrogen_charge_cost = cost_hydrogen_charge * Charge_Hydrogen[t].varValue
-        hydrogen_discharge_cost = cost_hydrogen_discharge * Discharge_Hydrogen[t].varValue
-        unmet_demand_cost = cost_unmet_demand * Unmet_Demand[t].varValue
-        curtailment_cost = cost_curtailment * Curtailment[t].varValue
-
-        total_cost += (solar_cost + wind_cost + ldes_charge_cost + ldes_discharge_cost +
-                       sdes_charge_cost + sdes_discharge_cost + hydrogen_charge_cost + 
-                       hydrogen_discharge_cost + unmet_demand_cost + curtailment_cost)
-
-        report.append({
-            'Hour': t,
-            'Solar Generation (MW)': data['Solar Generation (MW)'][t],
-            'Wind Generation (MW)': data['Wind Generation (MW)'][t],
-            'LDES Discharge (MW)': Discharge_LDES[t].varValue,
-            'SDES Discharge (MW)': Discharge_SDES[t].varValue,
-            'Hydrogen Discharge (MW)': Discharge_Hydrogen[t].varValue,
-            'Gas Generation (MW)': Gen_Gas[t].varValue,
-            'Coal Generation (MW)': Gen_Coal[t].varValue,
-            'Nuclear Generation (MW)': Gen_Nuclear[t].varValue,
-            'Hydro Generation (MW)': Gen_Hydro[t].varValue,
-            'Unmet Demand (MW)': Unmet_Demand[t].varValue,
-            'Curtailment (MW)': Curtailment[t].varValue,
-            'LDES Charge (MW)': Charge_LDES[t].varValue,
-            'SDES Charge (MW)': Charge_SDES[t].varValue,
-            'Hydrogen Charge (MW)': Charge_Hydrogen[t].varValue,
-            'Total Generation (MW)': (data['Solar Generation (MW)'][t] + data['Wind Generation (MW)'][t] +
-                                       Gen_Gas[t].varValue + Gen_Coal[t].varValue + Gen_Nuclear[t].varValue + 
-                                       Gen_Hydro[t].varValue),
-            'Total Demand (MW)': data['Demand (MW)'][t],
-            'Balance Check (MW)': (data['Solar Generation (MW)'][t] + data['Wind Generation (MW)'][t] +
-                                   Discharge_LDES[t].varValue + Discharge_SDES[t].varValue + Discharge_Hydrogen[t].varValue +
-                                   Gen_Gas[t].varValue + Gen_Coal[t].varValue + Gen_Nuclear[t].varValue + 
-                                   Gen_Hydro[t].varValue - Charge_LDES[t].varValue - Charge_SDES[t].varValue - 
-                                   Charge_Hydrogen[t].varValue - Curtailment[t].varValue + Unmet_Demand[t].varValue)
-        })
-
-    average_cost = total_cost / time_horizon
-    report.append({'Average Cost (£/MWh)': average_cost})
-    
-    df_report = pd.DataFrame(report)
-    
-    with pd.ExcelWriter(filename) as writer:
-        df_report.to_excel(writer, sheet_name='Detailed Report', index=False)
-        
-        summary = {
-            'Total Solar Generation (MWh)': [df_report['Solar Generation (MW)'].sum()],
-            'Total Wind Generation (MWh)': [df_report['Wind Generation (MW)'].sum()],
-            'Total LDES Discharge (MWh)': [df_report['LDES Discharge (MW)'].sum()],
-            'Total SDES Discharge (MWh)': [df_report['SDES Discharge (MW)'].sum()],
-            'Total Hydrogen Discharge (MWh)': [df_report['Hydrogen Discharge (MW)'].sum()],
-            'Total Gas Generation (MWh)': [df_report['Gas Generation (MW)'].sum()],
-            'Total Coal Generation (MWh)': [df_report['Coal Generation (MW)'].sum()],
-            'Total Nuclear Generation (MWh)': [df_report['Nuclear Generation (MW)'].sum()],
-            'Total Hydro Generation (MWh)': [df_report['Hydro Generation (MW)'].sum()],
-            'Total Unmet Demand (MWh)': [df_report['Unmet Demand (MW)'].sum()],
-            'Total Curtailment (MWh)': [df_report['Curtailment (MW)'].sum()],
-            'Total LDES Charge (MWh)': [df_report['LDES Charge (MW)'].sum()],
-            'Total SDES Charge (MWh)': [df_report['SDES Charge (MW)'].sum()],
-            'Total Hydrogen Charge (MWh)': [df_report['Hydrogen Charge (MW)'].sum()],
-            'Total Generation (MWh)': [df_report['Total Generation (MW)'].sum()],
-            'Total Demand (MWh)': [df_report['Total Demand (MW)'].sum()],
-            'Average Cost (£/MWh)': [average_cost]
-        }
-        
-        df_summary = pd.DataFrame(summary)
-        df_summary.to_excel(writer, sheet_name='Summary', index=False)
-
-    print(f"Report generated and saved to {filename}")
\ No newline at end of file
+    _finish(fig, show)
+
+def plot_price_duration(price_duration, show=True):
+    # Marginal price against the hours it is reached (sensitivity.price_duration)
+    fig, ax = plt.subplots(figsize=(14, 8))
+    ax.plot(price_duration['Hours'], price_duration['Price (£/MWh)'], drawstyle='steps-post', linewidth=2)
+
+    ax.set_title('Price Duration Curve')
+    ax.set_xlabel('Hours at or Above Price')
+    ax.set_ylabel('Marginal Price (£/MWh)')
+    ax.grid(True)
+
+    plt.tight_layout()
+    plt.savefig(FIGURES['plot_price_duration'])
+    _finish(fig, show)
+
+def _finish(fig, show):
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
+
+def render_figures(time_horizon, data, storage, solution, time_step=1.0, style='auto', workers=3):
+    """
+    Saves the three figures without displaying them, each in its own worker process with
+    the non-interactive Agg backend. Returns the file names. Workers are forked so the
+    calling script is not run again in them; with workers=1, or where fork is not
+    available (Windows), the figures are drawn one after another in this process.
+    """
+    args = {
+        'plot_results': (time_horizon, data, storage, solution, time_step, style),
+        'plot_soc': (time_horizon, storage, solution, time_step, style),
+        'plot_energy_flow': (time_horizon, data, storage, solution, time_step, style),
+    }
+    if workers <= 1 or 'fork' not in mp.get_all_start_methods():
+        for name, plot_args in args.items():
+            _render(name, plot_args)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(args)), mp_context=mp.get_context('fork'),
+                                 initializer=_use_agg) as pool:
+            for future in [pool.submit(_render, name, plot_args) for name, plot_args in args.items()]:
+                future.result()
+    return [FIGURES[name] for name in args]
+
+def _use_agg():
+    plt.switch_backend('Agg')
+
+def _render(name, plot_args):
+    globals()[name](*plot_args, show=False)
+
+
+
+def generate_report(filename, time_horizon, data, storage, solution, costs, formats=None, time_step=1.0):
+    # formats: any of 'xlsx', 'csv', 'parquet'; by default the extension of filename
+    df_report, df_summary = rw.build_report(time_horizon, data, storage, solution, costs, time_step)
+    paths = rw.write_report(filename, df_report, df_summary, formats)
+
+    print(f"Report generated and saved to {', '.join(paths)}")
\ No newline at end of file
@@ -0,0 +1,322 @@
+import numpy as np
+import pandas as pd
+
+import model_builder as mb
+import presolve as ps
+import solvers as sv
+import storage as sr
+import performance as pf
+
+PROFILE_COLUMNS = ['Demand (MW)', 'Solar Generation (MW)', 'Wind Generation (MW)']
+
+
+def cluster_periods(data, time_horizon, n_periods, period=24, method='kmeans', seed=0):
+    """
+    Groups the periods (of `period` steps, e.g. 24 hourly steps for days) of the demand, solar and wind
+    profiles into n_periods clusters. Each cluster is represented by its mean profile
+    (method='kmeans') or by its most central member period (method='kmedoids').
+
+    Returns {'period', 'assignment': cluster of every original period, 'weights': number
+    of periods in each cluster, 'profiles': representative profiles, one period per cluster}.
+    """
+    if time_horizon % period:
+        raise ValueError(f"The time horizon ({time_horizon} steps) must be a whole number of {period}-step periods")
+    if method not in ('kmeans', 'kmedoids'):
+        raise ValueError(f"Unknown clustering method: {method}")
+    n_total = time_horizon // period
+    k = min(n_periods, n_total)
+
+    # One row per period with the hourly values of every profile, each profile scaled to
+    # its peak so that demand does not dominate the distances
+    values = np.stack([data[name].to_numpy(dtype=float)[:time_horizon].reshape(n_total, period)
+                       for name in PROFILE_COLUMNS], axis=1)
+    scale = np.abs(values).max(axis=(0, 2))
+    X = (values / np.where(scale > 0, scale, 1.0)[None, :, None]).reshape(n_total, -1)
+
+    rng = np.random.default_rng(seed)
+    if method == 'kmeans':
+        labels = _kmeans(X, k, rng)
+        profiles = np.stack([values[labels == j].mean(axis=0) for j in range(labels.max() + 1)])
+    else:
+        labels, medoids = _kmedoids(X, k, rng)
+        profiles = values[medoids]
+
+    return {
+        'period': period,
+        'method': method,
+        'assignment': labels,
+        'weights': np.bincount(labels).astype(float),
+        'profiles': pd.DataFrame({name: profiles[:, j].ravel() for j, name in enumerate(PROFILE_COLUMNS)}),
+    }
+
+
+def _initial_centres(X, k, rng):
+    # k-means++ seeding: each new centre is drawn with probability proportional to the
+    # squared distance to the nearest centre already chosen
+    chosen = [int(rng.integers(len(X)))]
+    nearest = ((X - X[chosen[0]]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        p = nearest / nearest.sum() if nearest.sum() > 0 else None
+        chosen.append(int(rng.choice(len(X), p=p)))
+        nearest = np.minimum(nearest, ((X - X[chosen[-1]]) ** 2).sum(axis=1))
+    return np.array(chosen)
+
+
+def _relabel(labels):
+    # Number clusters by first appearance and drop empty ones
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(np.argsort(first))
+    return order[inverse]
+
+
+def _kmeans(X, k, rng, n_init=5, max_iter=100):
+    best, best_inertia = None, np.inf
+    for _ in range(n_init):
+        centres = X[_initial_centres(X, k, rng)]
+        for _ in range(max_iter):
+            distance = ((X[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+            labels = distance.argmin(axis=1)
+            updated = np.array([X[labels == j].mean(axis=0) if np.any(labels == j) else centres[j]
+                                for j in range(k)])
+            if np.allclose(updated, centres):
+                break
+            centres = updated
+        inertia = distance[np.arange(len(X)), labels].sum()
+        if inertia < best_inertia:
+            best, best_inertia = labels, inertia
+    return _relabel(best)
+
+
+def _kmedoids(X, k, rng, max_iter=100):
+    distance = ((X[:, None, :] - X[None, :, :]) ** 2).sum(axis=2)
+    medoids = _initial_centres(X, k, rng)
+    for _ in range(max_iter):
+        labels = distance[:, medoids].argmin(axis=1)
+        updated = medoids.copy()
+        for j in range(k):
+            members = np.flatnonzero(labels == j)
+            if len(members):
+                updated[j] = members[distance[np.ix_(members, members)].sum(axis=1).argmin()]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    labels = distance[:, medoids].argmin(axis=1)
+    relabelled = _relabel(labels)
+    # Medoid of each relabelled cluster, in the new cluster order
+    order = np.empty(relabelled.max() + 1, dtype=int)
+    order[relabelled] = labels
+    return relabelled, medoids[order]
+
+
+def build_aggregated_model(clusters, costs, capacities, storage, time_step=1.0):
+    """
+    Dispatch LP over the representative periods. Each period is a block built by
+    model_builder.build_model with its storage SOC measured relative to the start of the
+    period, and its costs weighted by the number of periods it represents. Inter-period
+    SOC columns follow the original sequence of periods, so long-duration storage can
+    still move energy between seasons; absolute SOC (inter-period SOC plus the highest and
+    lowest intra-period SOC) must stay within [0, capacity].
+    """
+    P = clusters['period']
+    weights = clusters['weights']
+    assignment = clusters['assignment']
+    k, D = len(weights), len(assignment)
+    names = list(storage['name'])
+    K = len(names)
+    energy_capacity = storage['capacity'].to_numpy(dtype=float)
+
+    # One block per representative period; hour 0 is linked to a zero starting SOC
+    start = {'soc': np.zeros(K), 'generation': {}}
+    blocks = []
+    for j in range(k):
+        profile = clusters['profiles'].iloc[j * P:(j + 1) * P].reset_index(drop=True)
+        blocks.append(mb.build_model(profile, P, costs, capacities, storage=storage, initial_state=start,
+                                     time_step=time_step))
+    template = blocks[0]
+    n_block = template['A'].shape[1]
+
+    # Relative SOC may go below zero; the absolute limits are added below instead
+    keep = np.ones(template['A'].shape[0], dtype=bool)
+    for name in ('Storage_Discharge_Limit', 'Storage_Capacity', 'Final_Storage_SOC'):
+        first, last = template['row_blocks'][name]
+        keep[first:last] = False
+
+    soc = np.array([[template['offsets'][f'SOC_{name}'] for name in names]])  # (1, K)
+    hours = np.arange(P)
+
+    def intra(j, t):
+        # Columns of the intra-period SOC of every technology in block j at hours t: (K, len(t))
+        return j * n_block + soc.T + np.atleast_1d(t)[None, :]
+
+    base_inter = k * n_block
+    base_max = base_inter + K * (D + 1)
+    base_min = base_max + k * K
+    n_cols = base_min + k * K
+
+    def inter(d):
+        return base_inter + np.arange(K)[:, None] * (D + 1) + np.atleast_1d(d)[None, :]
+
+    col_lower = np.concatenate([b['col_lower'] for b in blocks] + [np.zeros(K * (D + 1)), np.full(2 * k * K, -np.inf)])
+    col_upper = np.concatenate([b['col_upper'] for b in blocks] + [np.repeat(energy_capacity, D + 1), np.full(2 * k * K, np.inf)])
+    for j in range(k):
+        col_lower[intra(j, hours).ravel()] = -np.repeat(energy_capacity, P)
+    col_upper[inter(0).ravel()] = 0  # Storage starts empty, as in the hourly model
+    c = np.concatenate([w * b['c'] for w, b in zip(weights, blocks)] + [np.zeros(n_cols - base_inter)])
+
+    rows = mb._RowBlocks(n_cols)
+    for j, b in enumerate(blocks):
+        A = b['A'][keep].tocoo()
+        rows.add(f'Period_{j}', A.shape[0], [(j * n_block + A.col, A.data, A.row)],
+                 b['row_lower'][keep], b['row_upper'][keep])
+
+    # Ramp and minimum up/down rows that would reach back before the first step of a
+    # period wrap around to the end of the same period
+    first_hour = np.arange(k) * n_block
+    for name in mb.RAMPED:
+        gen = first_hour + template['offsets'][f'Gen_{name}']
+        rows.add(f'{name}_Ramp_Up_Cyclic', k, [(gen, 1.0), (gen + P - 1, -1.0)], -np.inf, mb.RAMP_RATE * time_step)
+        rows.add(f'{name}_Ramp_Down_Cyclic', k, [(gen + P - 1, 1.0), (gen, -1.0)], -np.inf, mb.RAMP_RATE * time_step)
+    up_steps, down_steps = mb.steps(mb.MIN_UP_TIME, time_step), mb.steps(mb.MIN_DOWN_TIME, time_step)
+    for name in mb.COMMITTED:
+        gen = first_hour + template['offsets'][f'Gen_{name}']
+        cap = capacities[name.lower()]
+        for label, width, coef, lower, upper in [('Min_Up', up_steps, mb.MIN_UP_TIME / up_steps, cap, np.inf),
+                                                 ('Min_Down', down_steps, 1.0, -np.inf, down_steps * cap)]:
+            times = np.arange(min(width, P))
+            terms = [(np.repeat(gen, len(times)) + np.tile((times - i) % P, k), coef) for i in range(1, width + 1)]
+            rows.add(f'{name}_{label}_Cyclic', k * len(times), terms, lower, upper)
+
+    # Highest and lowest intra-period SOC of each block and technology
+    period_max = (base_max + np.arange(k)[:, None] * K + np.arange(K)[None, :])  # (k, K)
+    period_min = (base_min + np.arange(k)[:, None] * K + np.arange(K)[None, :])
+    all_intra = np.concatenate([intra(j, hours).ravel() for j in range(k)])
+    rows.add('SOC_Period_Max', k * K * P, [(all_intra, 1.0), (np.repeat(period_max.ravel(), P), -1.0)], -np.inf, 0.0)
+    rows.add('SOC_Period_Min', k * K * P, [(all_intra, 1.0), (np.repeat(period_min.ravel(), P), -1.0)], 0.0, np.inf)
+
+    # SOC at the start of period d + 1 is the start of period d plus the change over its
+    # representative period
+    periods = np.arange(D)
+    end_of_period = (assignment[None, :] * n_block + soc.T + P - 1).ravel()
+    rows.add('SOC_Linking', K * D, [
+        (inter(periods + 1).ravel(), 1.0),
+        (inter(periods).ravel(), -1.0),
+        (end_of_period, -1.0),
+    ], 0.0, 0.0)
+    rows.add('SOC_Inter_Upper', K * D, [(inter(periods).ravel(), 1.0), (period_max[assignment].T.ravel(), 1.0)],
+             -np.inf, np.repeat(energy_capacity, D))
+    rows.add('SOC_Inter_Lower', K * D, [(inter(periods).ravel(), 1.0), (period_min[assignment].T.ravel(), 1.0)],
+             0.0, np.inf)
+
+    A, row_lower, row_upper = rows.matrix()
+    return {
+        'time_horizon': k * P,
+        'time_step': time_step,
+        'storage': names,
+        'blocks': blocks,
+        'inter_offset': base_inter,
+        'c': c,
+        'objective_constant': float(np.dot(weights, [b['objective_constant'] for b in blocks])),
+        'A': A,
+        'row_lower': row_lower,
+        'row_upper': row_upper,
+        'row_blocks': rows.blocks,
+        'col_lower': col_lower,
+        'col_upper': col_upper,
+    }
+
+
+def expand_solution(model, clusters, x):
+    # Hourly values over the full horizon: every original period takes the dispatch of
+    # its representative period, with SOC offset by the inter-period SOC
+    P = clusters['period']
+    assignment = clusters['assignment']
+    blocks = model['blocks']
+    n_block = blocks[0]['A'].shape[1]
+    D = len(assignment)
+    per_block = [mb.extract_values(b, x[j * n_block:(j + 1) * n_block]) for j, b in enumerate(blocks)]
+
+    values = {}
+    for name in per_block[0]:
+        values[name] = np.concatenate([per_block[j][name] for j in assignment])
+    for k, name in enumerate(model['storage']):
+        inter = x[model['inter_offset'] + k * (D + 1):model['inter_offset'] + (k + 1) * (D + 1)]
+        values[f'SOC_{name}'] = values[f'SOC_{name}'] + np.repeat(inter[:D], P)
+    return values
+
+
+def aggregation_error(data, time_horizon, clusters, time_step=1.0):
+    """
+    How well the representative periods reproduce the original profiles: RMSE (MW and
+    relative to the mean) and energy error for each profile, and the absolute net-demand
+    mismatch (MWh) summed over all steps when the aggregated dispatch is mapped back.
+    """
+    P = clusters['period']
+    mapped = {name: clusters['profiles'][name].to_numpy().reshape(-1, P)[clusters['assignment']].ravel()
+              for name in PROFILE_COLUMNS}
+    report = {'hours': time_horizon * time_step, 'representative_hours': len(clusters['profiles']) * time_step,
+              'periods': len(clusters['assignment']), 'representative_periods': len(clusters['weights'])}
+    for name in PROFILE_COLUMNS:
+        original = data[name].to_numpy(dtype=float)[:time_horizon]
+        rmse = float(np.sqrt(np.mean((original - mapped[name]) ** 2)))
+        mean = original.mean()
+        label = name.replace(' (MW)', '')
+        report[f'{label} RMSE (MW)'] = rmse
+        report[f'{label} NRMSE'] = rmse / mean if mean else 0.0
+        report[f'{label} Energy Error (MWh)'] = float(mapped[name].sum() - original.sum()) * time_step
+    net = lambda d: d['Demand (MW)'] - d['Solar Generation (MW)'] - d['Wind Generation (MW)']
+    report['Net Demand Mismatch (MWh)'] = time_step * float(np.abs(
+        net({name: data[name].to_numpy(dtype=float)[:time_horizon] for name in PROFILE_COLUMNS}) - net(mapped)).sum())
+    return report
+
+
+def format_error(report):
+    return (f"Aggregated {report['periods']} periods into {report['representative_periods']} "
+            f"({report['hours']:g} h to {report['representative_hours']:g} h, "
+            f"{report['hours'] / report['representative_hours']:.1f}x smaller); "
+            f"NRMSE demand {report['Demand NRMSE']:.1%}, solar {report['Solar Generation NRMSE']:.1%}, "
+            f"wind {report['Wind Generation NRMSE']:.1%}; "
+            f"net demand mismatch {report['Net Demand Mismatch (MWh)']:.1f} MWh")
+
+
+def run_aggregated_optimization(data, time_horizon, costs, capacities, efficiencies=None, storage=None,
+                                n_periods=12, period=24, method='kmeans', seed=0, presolve=True, time_step=1.0,
+                                solver=None):
+    """
+    Clusters the profiles into n_periods representative periods of `period` hours, solves the reduced
+    model and maps the dispatch back to every hour. Returns (info, status, solution) like
+    run_optimization; info['objective'] is the weighted cost of the representative
+    periods and info['aggregation'] the aggregation error report. solver takes the settings
+    of solvers.DEFAULT_OPTIONS.
+    """
+    if storage is None:
+        storage = sr.registry_from_inputs(capacities, efficiencies, costs)
+
+    performance = []
+    with pf.phase(performance, 'build') as entry:
+        clusters = cluster_periods(data, time_horizon, n_periods, mb.steps(period, time_step), method, seed)
+        model = build_aggregated_model(clusters, costs, capacities, storage, time_step)
+        entry.update(pf.model_size(model))
+    if presolve:
+        with pf.phase(performance, 'presolve') as entry:
+            model = ps.reduce_model(model)
+            entry.update(pf.model_size(model))
+    with pf.phase(performance, 'solve', **pf.model_size(model)) as entry:
+        status, x, objective, stats = sv.solve_model(model, solver)
+        entry.update(iterations=stats['iterations'], solver_seconds=stats['solve_time'])
+
+    error = aggregation_error(data, time_horizon, clusters, time_step)
+
+    info = {
+        'time_horizon': time_horizon,
+        'time_step': time_step,
+        'storage': list(storage['name']),
+        'objective': objective,
+        'presolve': model.get('presolve'),
+        'solver': stats,
+        'aggregation': error,
+        'clusters': clusters,
+        'performance': performance,
+    }
+    with pf.phase(performance, 'extract'):
+        solution = mb.make_solution(expand_solution(model, clusters, x) if x is not None else {})
+    return info, status, solution
@@ -1,39 +1,107 @@
-import streamlit as st
+import os
+import time
+
 import streamlit as st
 import pandas as pd
 import results_and_plotting2 as rp
-import optimisation as opt
-import time
+import storage as sr
+import presolve as ps
+import result_cache as rc
+import model_builder as mb
+import background_solve as bs
+import aggregation as ag
+import profile_loader as pl
+import solvers as sv
+import performance as pf
+import charts as ch
 
 st.title("Dispatch Optimisation Modelling")
 
+# Phases timed in this rerun of the page (profile loading, plots, report); the solve phases
+# come with the result
+page_performance = []
+
+
+def read_profile(uploaded_file, columns):
+    # Parsed and validated once per file content, then memory-mapped from the profile
+    # cache on every rerun; bad data stops here rather than in the solver
+    try:
+        with pf.phase(page_performance, 'load', label=uploaded_file.name):
+            return pl.load_profile(uploaded_file.getvalue(), columns, name=uploaded_file.name)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+
+@st.cache_resource
+def get_result_cache():
+    # Shared by all sessions; set DISPATCH_CACHE_DIR to spill evicted results to disk
+    return rc.ResultCache(spill_dir=os.environ.get('DISPATCH_CACHE_DIR'))
+
+
 # Sidebar for input parameters
 st.sidebar.header("Input Parameters")
 
 # Group inputs into sections for better organization
 st.sidebar.subheader("Upload Data Files")
 # File uploader for demand profile
-demand_file = st.sidebar.file_uploader("Upload Demand Profile", type=["xlsx"])
+demand_file = st.sidebar.file_uploader("Upload Demand Profile", type=["xlsx", "csv"])
 if demand_file is not None:
-    demand_profile = pd.read_excel(demand_file)
+    demand_profile = read_profile(demand_file, pl.DEMAND_COLUMNS)
 else:
     st.error("Please upload a demand profile file.")
 
 # File uploader for generation profiles
-generation_file = st.sidebar.file_uploader("Upload Generation Profile", type=["xlsx"])
+generation_file = st.sidebar.file_uploader("Upload Generation Profile", type=["xlsx", "csv"])
 if generation_file is not None:
-    generation_profiles = pd.read_excel(generation_file)
+    generation_profiles = read_profile(generation_file, pl.GENERATION_COLUMNS)
 else:
     st.error("Please upload a generation profile file.")
 
 if demand_file is not None and generation_file is not None:
+    if len(demand_profile) != len(generation_profiles):
+        st.error(f"The demand profile has {len(demand_profile)} rows but the generation profiles have "
+                 f"{len(generation_profiles)}; both must cover the same hours")
+        st.stop()
+
     st.sidebar.subheader("Simulation Settings")
     # Number of weeks
     number_of_weeks = st.sidebar.slider("Number of Weeks", min_value=1, max_value=52, value=1)
 
-    # Extend the data for the number of weeks
-    demand_profile = pd.concat([demand_profile] * number_of_weeks, ignore_index=True)
-    generation_profiles = pd.concat([generation_profiles] * number_of_weeks, ignore_index=True)
+    # Model time step: coarser steps solve long horizons faster, finer steps resolve
+    # sub-hourly profiles. The profiles are averaged or repeated to match.
+    step_options = {"15 min": 0.25, "30 min": 0.5, "1 hour": 1.0, "2 hours": 2.0, "4 hours": 4.0, "1 day": 24.0}
+    time_step = step_options[st.sidebar.selectbox("Time Step", list(step_options), index=2)]
+    input_time_step = step_options[st.sidebar.selectbox("Profile Resolution", list(step_options)[:3], index=2)]
+
+    # Rolling horizon bounds memory on long runs by solving overlapping windows in sequence
+    # Representative periods cluster the days or weeks of the profiles and solve a much
+    # smaller model, with storage still linked across the whole horizon
+    solve_mode = st.sidebar.radio("Solve Mode", ["Full horizon", "Rolling horizon", "Representative periods"])
+    if solve_mode == "Rolling horizon":
+        window_weeks = st.sidebar.number_input("Window (weeks)", min_value=1, max_value=52, value=2)
+        overlap_hours = st.sidebar.number_input("Overlap (hours)", min_value=0, max_value=168 * window_weeks - 1, value=168)
+    elif solve_mode == "Representative periods":
+        period_hours = {"Day": 24, "Week": 168}[st.sidebar.selectbox("Period Length", ["Day", "Week"])]
+        n_periods = st.sidebar.number_input("Number of Representative Periods", min_value=1, value=12)
+        cluster_method = st.sidebar.selectbox("Clustering Method", ["kmeans", "kmedoids"])
+    # Prices and storage and capacity values from the duals of a full-horizon solve; off by
+    # default, as the capacity values rebuild the model once per asset and slow re-solves
+    sensitivity = solve_mode == "Full horizon" and st.sidebar.checkbox("Sensitivity Analysis", value=False)
+
+    # Wall-clock limit for the solve; 0 means no limit
+    time_limit = st.sidebar.number_input("Time Limit (seconds)", min_value=0, value=0, step=30)
+
+    st.sidebar.subheader("Solver")
+    # Any installed backend; HiGHS solves in-process and keeps the basis for warm starts.
+    # Blank threads and gap leave the solver defaults.
+    method_labels = {'choose': "Automatic", 'simplex': "Simplex", 'ipm': "Interior point"}
+    solver_options = {
+        'backend': st.sidebar.selectbox("Backend", sv.available_backends()),
+        'method': st.sidebar.selectbox("LP Algorithm", sv.METHODS, format_func=method_labels.get),
+        'threads': st.sidebar.number_input("Threads (0 = all cores)", min_value=0, value=None, step=1),
+        'mip_gap': st.sidebar.number_input("Relative MIP Gap", min_value=0.0, max_value=1.0, value=None, format="%.4f"),
+    }
 
     st.sidebar.subheader("Generation Capacities (MW)")
     # Generation capacities
@@ -43,19 +111,25 @@ if demand_file is not None and generation_file is not None:
         'gas': st.sidebar.number_input("Capacity of Gas (MW)", min_value=0.0, value=20.0),
         'coal': st.sidebar.number_input("Capacity of Coal (MW)", min_value=0.0, value=20.0),
         'nuclear': st.sidebar.number_input("Capacity of Nuclear (MW)", min_value=0.0, value=20.0),
-        'hydro': st.sidebar.number_input("Capacity of Hydro (MW)", min_value=0.0, value=20.0),
-        'ldes': st.sidebar.number_input("Capacity of LDES (MWh)", min_value=0.0, value=1000.0),
-        'sdes': st.sidebar.number_input("Capacity of SDES (MWh)", min_value=0.0, value=500.0),
-        'hydrogen': st.sidebar.number_input("Capacity of Hydrogen Storage (MWh)", min_value=0.0, value=1500.0)
+        'hydro': st.sidebar.number_input("Capacity of Hydro (MW)", min_value=0.0, value=20.0)
     }
 
-    st.sidebar.subheader("Storage Efficiencies")
-    # Storage efficiencies
-    efficiencies = {
-        'ldes': st.sidebar.number_input("Efficiency of LDES", min_value=0.0, max_value=1.0, value=0.85),
-        'sdes': st.sidebar.number_input("Efficiency of SDES", min_value=0.0, max_value=1.0, value=0.9),
-        'hydrogen': st.sidebar.number_input("Efficiency of Hydrogen Storage", min_value=0.0, max_value=1.0, value=0.75)
-    }
+    st.sidebar.subheader("Storage Technologies")
+    # Storage registry: one row per technology, add rows to model more assets
+    storage_table = st.sidebar.data_editor(
+        pd.DataFrame([
+            {'name': 'LDES', 'efficiency': 0.85, 'capacity': 1000.0, 'charge_cost': 5.0, 'discharge_cost': 7.0},
+            {'name': 'SDES', 'efficiency': 0.9, 'capacity': 500.0, 'charge_cost': 3.0, 'discharge_cost': 5.0},
+            {'name': 'Hydrogen', 'efficiency': 0.75, 'capacity': 1500.0, 'charge_cost': 8.0, 'discharge_cost': 10.0},
+        ], columns=sr.STORAGE_COLUMNS),
+        num_rows="dynamic",
+        hide_index=True
+    )
+    try:
+        storage = sr.make_registry(storage_table.dropna(subset=['name']))
+    except ValueError as e:
+        st.error(f"Invalid storage table: {e}")
+        st.stop()
 
     st.sidebar.subheader("Cost Inputs (£/MWh)")
     # Cost inputs
@@ -66,120 +140,151 @@ if demand_file is not None and generation_file is not None:
         'coal': st.sidebar.number_input("Cost of Coal", min_value=0.0, value=60.0),
         'nuclear': st.sidebar.number_input("Cost of Nuclear", min_value=0.0, value=70.0),
         'hydro': st.sidebar.number_input("Cost of Hydro", min_value=0.0, value=40.0),
-        'ldes_charge': st.sidebar.number_input("Cost of LDES Charge", min_value=0.0, value=5.0),
-        'ldes_discharge': st.sidebar.number_input("Cost of LDES Discharge", min_value=0.0, value=7.0),
-        'sdes_charge': st.sidebar.number_input("Cost of SDES Charge", min_value=0.0, value=3.0),
-        'sdes_discharge': st.sidebar.number_input("Cost of SDES Discharge", min_value=0.0, value=5.0),
-        'hydrogen_charge': st.sidebar.number_input("Cost of Hydrogen Charge", min_value=0.0, value=8.0),
-        'hydrogen_discharge': st.sidebar.number_input("Cost of Hydrogen Discharge", min_value=0.0, value=10.0),
         'unmet_demand': st.sidebar.number_input("Cost of Unmet Demand", min_value=0.0, value=100.0),
         'curtailment': st.sidebar.number_input("Cost of Curtailment", min_value=0.0, value=5.0)
     }
 
-    if st.button('Run Simulation'):
-        with st.spinner('Running the optimization...'):
-            time.sleep(1)  # Simulate delay for progress indication
+    # Generation is capacity x capacity factor. Profiles shorter than the horizon (e.g. one
+    # week) repeat cyclically; full-year profiles are used as they are.
+    profile_rows = mb.steps(168 * number_of_weeks, input_time_step)
+    with pf.phase(page_performance, 'load', label='model input'):
+        data = pl.build_data(demand_profile, generation_profiles, capacities, profile_rows)
+
+        # Ensure the data is in the correct format (168 * number_of_weeks hours in steps of time_step)
+        time_horizon = mb.steps(168 * number_of_weeks, time_step)
+        data = mb.resample_profiles(data, time_step, input_time_step)
+
+    # Results are cached by a fingerprint of every input, so scenarios that were already
+    # run are shown straight away without building or solving the model
+    settings = {'solve_mode': solve_mode, 'time_step': time_step, 'solver': solver_options, 'sensitivity': sensitivity}
+    if solve_mode == "Rolling horizon":
+        settings.update({'window': 168 * window_weeks, 'overlap': overlap_hours})
+    elif solve_mode == "Representative periods":
+        settings.update({'period': period_hours, 'n_periods': n_periods, 'method': cluster_method})
+    result_key = rc.fingerprint(data, time_horizon, costs, capacities, storage, settings)
+    result_cache = get_result_cache()
+    result = result_cache.get(result_key)
 
-            # Calculate the actual generation profiles by multiplying capacity factors by the defined capacities
-            solar_generation = generation_profiles['Solar Capacity Factor'] * capacities['solar']
-            wind_generation = generation_profiles['Wind Capacity Factor'] * capacities['wind']
+    # The solve runs in a worker process kept for this session, so the app stays responsive
+    # and the run can be cancelled. The worker also keeps the last full-horizon model, so a
+    # re-solve after changing only costs starts from the previous basis.
+    worker = st.session_state.get('solve_worker')
+    if worker is None:
+        worker = bs.SolveWorker()
+        st.session_state['solve_worker'] = worker
 
-            # Extract the demand profile
-            demand = demand_profile['Demand']
+    if result is not None and not worker.running():
+        st.caption("Showing cached results for these inputs")
+    elif worker.running() or st.button('Run Simulation'):
+        if not worker.running():
+            mode = {"Full horizon": 'full', "Rolling horizon": 'rolling', "Representative periods": 'aggregated'}
+            job = {'mode': mode[solve_mode], 'data': data, 'time_horizon': time_horizon, 'costs': costs,
+                   'capacities': capacities, 'storage': storage, 'time_limit': time_limit or None, **settings}
+            worker.start(job)
+            st.session_state['solve_key'] = result_key
 
-            # Ensure the data is in the correct format (168 * number_of_weeks hourly intervals)
-            time_horizon = 168 * number_of_weeks
-            data = pd.DataFrame({
-                'Solar Generation (MW)': solar_generation,
-                'Wind Generation (MW)': wind_generation,
-                'Demand (MW)': demand
-            })
+        if st.button('Cancel'):
+            worker.cancel()
+            st.warning("Optimization cancelled")
+        else:
+            progress_box = st.empty()
+            while (result := worker.poll()) is None:
+                message = f"Running the optimization... {worker.elapsed():.0f}s elapsed"
+                progress = worker.progress()
+                if progress is not None:
+                    message += f" (iteration {progress['iterations']}, objective {progress['objective']:,.2f})"
+                progress_box.info(message)
+                time.sleep(0.5)
+            progress_box.empty()
 
-            # Run the optimization
-            prob, status, decision_vars = opt.run_optimization(
-                data, time_horizon, costs, capacities, efficiencies
-            )
+            if result['status'] == 'Optimal':
+                result_cache.put(st.session_state['solve_key'], result)
+            if st.session_state['solve_key'] != result_key:
+                # Inputs were changed while the solve was running
+                st.caption("Inputs changed during the run: press Run Simulation to solve for the current inputs")
+                result = None
+            elif result.get('warm_start'):
+                st.caption("Inputs other than costs were unchanged: re-solved from the previous basis")
 
+    if result is not None:
+        status = result['status']
+        solution = mb.make_solution(result['values'])
+
+        if status == 'Optimal':
             st.success(f"Optimization completed with status: {status}")
+        elif status == 'Time Limit' and result['values']:
+            st.warning("Time limit reached: showing the best solution found so far, which may not be optimal")
+        else:
+            st.warning(f"Optimization completed with status: {status}")
+        if result.get('presolve'):
+            st.caption(ps.format_stats(result['presolve']))
+        if result.get('solver'):
+            st.caption(sv.format_stats(result['solver']))
+        if result.get('aggregation'):
+            st.caption(ag.format_error(result['aggregation']))
 
-            # Unpack the decision variables dictionary for easier access in results and plotting
-            Charge_LDES = decision_vars['Charge_LDES']
-            Discharge_LDES = decision_vars['Discharge_LDES']
-            Charge_SDES = decision_vars['Charge_SDES']
-            Discharge_SDES = decision_vars['Discharge_SDES']
-            Charge_Hydrogen = decision_vars['Charge_Hydrogen']
-            Discharge_Hydrogen = decision_vars['Discharge_Hydrogen']
-            Unmet_Demand = decision_vars['Unmet_Demand']
-            Curtailment = decision_vars['Curtailment']
-            SOC_LDES = decision_vars['SOC_LDES']
-            SOC_SDES = decision_vars['SOC_SDES']
-            SOC_Hydrogen = decision_vars['SOC_Hydrogen']
-            Gen_Gas = decision_vars['Gen_Gas']
-            Gen_Coal = decision_vars['Gen_Coal']
-            Gen_Nuclear = decision_vars['Gen_Nuclear']
-            Gen_Hydro = decision_vars['Gen_Hydro']
+        if result['values']:
+            # Long horizons are drawn as thinned stacked areas unless bars are chosen
+            style_labels = {'auto': "Automatic", 'bar': "Bar per step", 'area': "Stacked area",
+                            'decimated': "Thinned bars"}
+            chart_style = st.selectbox("Chart Style", ch.STYLES, format_func=style_labels.get)
 
             # Display results in tabs
-            tab1, tab2, tab3, tab4, tab5 = st.tabs(["Overview", "Hourly Breakdown", "Demand vs Supply", "SOC", "Energy Flow"])
+            tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Overview", "Hourly Breakdown", "Demand vs Supply", "SOC",
+                                                          "Energy Flow", "Performance"])
 
             with tab1:
                 st.write("Overview")
-                rp.display_overview(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                                    Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Unmet_Demand, Curtailment, 
-                                    Charge_LDES, Charge_SDES, Charge_Hydrogen, costs['solar'], costs['wind'], 
-                                    costs['ldes_charge'], costs['ldes_discharge'], costs['sdes_charge'], 
-                                    costs['sdes_discharge'], costs['hydrogen_charge'], costs['hydrogen_discharge'], 
-                                    costs['unmet_demand'], costs['curtailment'])
+                rp.display_overview(time_horizon, data, storage, solution, costs, time_step)
+                if result.get('sensitivity'):
+                    rp.display_sensitivity(result['sensitivity'], time_step)
 
             with tab2:
                 st.write("Hourly Breakdown")
-                hourly_df = rp.create_hourly_breakdown(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                                                       Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Unmet_Demand, Curtailment, 
-                                                       Charge_LDES, Charge_SDES, Charge_Hydrogen)
-                st.dataframe(hourly_df)
+                rp.hourly_explorer(time_horizon, data, storage, solution, time_step)
 
             with tab3:
                 st.write("Demand vs Supply")
-                rp.plot_results(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                                Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Unmet_Demand)
+                with pf.phase(page_performance, 'plot', label='Demand vs Supply'):
+                    rp.plot_results(time_horizon, data, storage, solution, time_step, chart_style)
 
             with tab4:
                 st.write("State of Charge (SOC) for Storage Systems")
-                rp.plot_soc(time_horizon, SOC_LDES, SOC_SDES, SOC_Hydrogen)
+                with pf.phase(page_performance, 'plot', label='SOC'):
+                    rp.plot_soc(time_horizon, storage, solution, time_step, chart_style)
 
             with tab5:
                 st.write("Energy Flow")
-                rp.plot_energy_flow(time_horizon, data, Discharge_LDES, Discharge_SDES, Discharge_Hydrogen, 
-                                    Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro, Charge_LDES, Charge_SDES, 
-                                    Charge_Hydrogen, Unmet_Demand)
+                with pf.phase(page_performance, 'plot', label='Energy Flow'):
+                    rp.plot_energy_flow(time_horizon, data, storage, solution, time_step, chart_style)
 
             # Button to download the report
+            report_format = st.selectbox("Report Format", ['xlsx', 'csv', 'parquet'])
             if st.button('Download Report'):
-                rp.generate_report(
-                    filename='optimization_report.xlsx',
-                    time_horizon=time_horizon,
-                    data=data,
-                    Discharge_LDES=Discharge_LDES,
-                    Discharge_SDES=Discharge_SDES,
-                    Discharge_Hydrogen=Discharge_Hydrogen,
-                    Gen_Gas=Gen_Gas,
-                    Gen_Coal=Gen_Coal,
-                    Gen_Nuclear=Gen_Nuclear,
-                    Gen_Hydro=Gen_Hydro,
-                    Unmet_Demand=Unmet_Demand,
-                    Curtailment=Curtailment,
-                    Charge_LDES=Charge_LDES,
-                    Charge_SDES=Charge_SDES,
-                    Charge_Hydrogen=Charge_Hydrogen,
-                    cost_solar=costs['solar'],
-                    cost_wind=costs['wind'],
-                    cost_ldes_charge=costs['ldes_charge'],
-                    cost_ldes_discharge=costs['ldes_discharge'],
-                    cost_sdes_charge=costs['sdes_charge'],
-                    cost_sdes_discharge=costs['sdes_discharge'],
-                    cost_hydrogen_charge=costs['hydrogen_charge'],
-                    cost_hydrogen_discharge=costs['hydrogen_discharge'],
-                    cost_unmet_demand=costs['unmet_demand'],
-                    cost_curtailment=costs['curtailment']
-                )
-                st.success('Report generated: optimization_report.xlsx')
+                with pf.phase(page_performance, 'report', label=report_format):
+                    rp.generate_report(
+                        filename='optimization_report.xlsx',
+                        time_horizon=time_horizon,
+                        data=data,
+                        storage=storage,
+                        solution=solution,
+                        costs=costs,
+                        formats=[report_format],
+                        time_step=time_step
+                    )
+                st.success(f'Report generated: optimization_report.{report_format}')
+
+            # Filled in last so it includes the plots and report of this rerun. The solve
+            # phases are from the run that produced the result, which may have been cached.
+            with tab6:
+                record = (result.get('performance') or []) + page_performance
+                summary = pf.summarize(record)
+                st.write("Time and memory by phase")
+                st.dataframe(summary, hide_index=True, column_config={
+                    'seconds': st.column_config.NumberColumn("Seconds", format="%.3f"),
+                    'share': st.column_config.NumberColumn("Share", format="percent"),
+                    'peak_rss_delta_mb': st.column_config.NumberColumn("Peak RSS Δ (MB)", format="%.1f"),
+                })
+                st.bar_chart(summary.set_index('phase')['seconds'])
+                with st.expander("Every phase"):
+                    st.dataframe(pf.to_frame(record), hide_index=True)
@@ -0,0 +1,178 @@
+import multiprocessing as mp
+import os
+import re
+import tempfile
+import time
+
+import result_cache as rc
+
+# HiGHS simplex log line: iteration count, objective and phase, e.g. "  1503  6.35e+05 Pr: 0(0) 0s"
+PROGRESS_LINE = re.compile(r'^\s*(\d+)\s+([-+.\deE]+)\s+(Ph1|Ph2|Pr|Du)\b')
+
+# Extra time given to the worker to return its best solution after the solver time limit
+GRACE_PERIOD = 10
+
+
+def _worker_loop(conn):
+    # Runs in the worker process; keeps the warm-start solver between jobs
+    import aggregation as ag
+    import optimisation as opt
+    import rolling_horizon as rh
+    import sensitivity as se
+    import warm_start as ws
+
+    solver = None
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        time_step = job.get('time_step', 1.0)
+        options = {**job.get('solver', {}), 'time_limit': job.get('time_limit'), 'log_file': job.get('log_file')}
+        try:
+            if job['mode'] == 'rolling':
+                prob, status, solution = rh.run_rolling_horizon(
+                    job['data'], job['time_horizon'], job['costs'], job['capacities'],
+                    storage=job['storage'], window=job['window'], overlap=job['overlap'], time_step=time_step,
+                    solver=options
+                )
+                warm = False
+            elif job['mode'] == 'aggregated':
+                prob, status, solution = ag.run_aggregated_optimization(
+                    job['data'], job['time_horizon'], job['costs'], job['capacities'], storage=job['storage'],
+                    n_periods=job['n_periods'], period=job['period'], method=job['method'], time_step=time_step,
+                    solver=options
+                )
+                warm = False
+            elif options.get('backend', 'highs') != 'highs':
+                # Only the in-process HiGHS model can be kept for a warm start
+                prob, status, solution = opt.run_optimization(
+                    job['data'], job['time_horizon'], job['costs'], job['capacities'], storage=job['storage'],
+                    time_step=time_step, solver=options, sensitivity=job.get('sensitivity', False)
+                )
+                warm = False
+            else:
+                warm = solver is not None and solver.matches(job['data'], job['time_horizon'],
+                                                            job['capacities'], job['storage'], time_step)
+                if not warm:
+                    solver = ws.WarmStartSolver(job['data'], job['time_horizon'], job['costs'],
+                                                job['capacities'], job['storage'], time_step=time_step)
+                prob, status, solution = solver.solve(job['costs'], job['storage'], options,
+                                                         sensitivity=job.get('sensitivity', False))
+            result = rc.compact_result(status, prob.get('objective'), solution, presolve=prob.get('presolve'),
+                                       aggregation=prob.get('aggregation'), solver=prob.get('solver'),
+                                       performance=prob.get('performance'), warm_start=warm,
+                                       sensitivity=se.compact(prob.get('sensitivity')))
+            conn.send(('done', result))
+        except Exception as e:
+            conn.send(('error', f'{type(e).__name__}: {e}'))
+
+
+class SolveWorker:
+    """
+    Solves the dispatch model in a separate process so the app stays responsive. The
+    process is kept between runs so full-horizon re-solves can start from the previous
+    basis; cancelling a run terminates it and the next run starts a fresh one.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        self.log_dir = tempfile.mkdtemp(prefix='dispatch_')
+        self.log_file = None
+        self.jobs = 0
+        self.started = None
+        self.time_limit = None
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def running(self):
+        return self.started is not None
+
+    def start(self, job):
+        if self.running():
+            raise RuntimeError("A solve is already running")
+        if not self.alive():
+            # spawn rather than fork: the Streamlit server process is multi-threaded
+            ctx = mp.get_context('spawn')
+            self.conn, child = ctx.Pipe()
+            self.process = ctx.Process(target=_worker_loop, args=(child,), daemon=True)
+            self.process.start()
+            child.close()
+        # Each job logs to a new file, as the previous job's HiGHS instance may still hold its own
+        self.jobs += 1
+        self.log_file = os.path.join(self.log_dir, f'highs_{self.jobs}.log')
+        open(self.log_file, 'w').close()
+        self.conn.send({**job, 'log_file': self.log_file})
+        self.started = time.time()
+        self.time_limit = job.get('time_limit')
+
+    def elapsed(self):
+        return time.time() - self.started if self.running() else 0.0
+
+    def poll(self):
+        """
+        Returns the compact result once the solve has finished, otherwise None. A worker
+        that overruns its time limit by more than GRACE_PERIOD is killed.
+        """
+        if not self.running():
+            return None
+        try:
+            if self.conn.poll():
+                kind, payload = self.conn.recv()
+                self.started = None
+                if kind == 'error':
+                    raise RuntimeError(payload)
+                return payload
+        except (EOFError, OSError):
+            pass
+        if not self.alive():
+            # The worker exited without a result, e.g. it ran out of memory
+            self.cancel()
+            return {'status': 'Not Solved', 'objective': None, 'values': {}}
+        if self.time_limit and self.elapsed() > self.time_limit + GRACE_PERIOD:
+            self.cancel()
+            return {'status': 'Time Limit', 'objective': None, 'values': {}}
+        return None
+
+    def progress(self):
+        # Latest iteration and objective from the solver log, or None before the first line
+        if self.log_file is None:
+            return None
+        try:
+            with open(self.log_file) as f:
+                lines = f.readlines()[-50:]
+        except OSError:
+            return None
+        for line in reversed(lines):
+            match = PROGRESS_LINE.match(line)
+            if match:
+                return {'iterations': int(match.group(1)), 'objective': float(match.group(2)),
+                        'phase': match.group(3)}
+        return None
+
+    def log_tail(self, n=10):
+        if self.log_file is None:
+            return ''
+        try:
+            with open(self.log_file) as f:
+                return ''.join(f.readlines()[-n:])
+        except OSError:
+            return ''
+
+    def cancel(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.process = None
+        self.conn = None
+        self.started = None
+
+    def close(self):
+        if self.alive() and not self.running():
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        self.cancel()
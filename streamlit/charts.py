@@ -0,0 +1,72 @@
+import numpy as np
+
+# Stacked dispatch charts draw one bar per step and series up to BAR_LIMIT steps. Longer
+# horizons are drawn as stacked step areas (or bars) over at most MAX_POINTS steps, picked
+# so that the lowest and highest point of every stretch of the horizon is kept.
+STYLES = ['auto', 'bar', 'area', 'decimated']
+BAR_LIMIT = 336
+MAX_POINTS = 2000
+
+
+def chart_style(style, n_steps):
+    # 'auto' is 'bar' up to BAR_LIMIT steps and 'area' above
+    if style not in STYLES:
+        raise ValueError(f"Unknown chart style: {style} (use one of {', '.join(STYLES)})")
+    if style == 'auto':
+        return 'bar' if n_steps <= BAR_LIMIT else 'area'
+    return style
+
+
+def extreme_indices(values, max_points=MAX_POINTS):
+    """
+    Indices (in time order) of the smallest and largest value in each of max_points / 2
+    equal stretches of values, plus the first and last step, so peaks and troughs survive
+    the downsampling. Every index is returned when values is short enough already.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    size = -(-n // max(1, max_points // 2))
+    n_buckets = -(-n // size)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = values
+    blocks = padded.reshape(n_buckets, size)
+    starts = np.arange(n_buckets) * size
+    return np.unique(np.concatenate([starts + np.nanargmin(blocks, axis=1), starts + np.nanargmax(blocks, axis=1),
+                                     [0, n - 1]]))
+
+
+def draw_stacked(ax, frame, style, time_step=1.0, max_points=MAX_POINTS):
+    """
+    Draws the columns of frame (one row per step, indexed by hour) stacked on ax in the
+    given chart_style. Returns the x positions of the steps, for lines drawn on top: bar
+    charts are categorical (0, 1, 2, ...), the other styles use the hour.
+    """
+    if style == 'bar':
+        frame.plot(kind='bar', stacked=True, ax=ax, width=1)
+        return np.arange(len(frame))
+
+    hours = frame.index.to_numpy(dtype=float)
+    keep = extreme_indices(frame.sum(axis=1).to_numpy(), max_points)
+    x = hours[keep]
+    layers = frame.to_numpy(dtype=float)[keep].T
+    if style == 'area':
+        ax.stackplot(x, layers, labels=frame.columns, step='post', linewidth=0)
+    else:
+        # Each kept step is drawn as wide as the stretch it stands for
+        width = np.diff(np.append(x, hours[-1] + time_step))
+        bottom = np.zeros(len(x))
+        for column, layer in zip(frame.columns, layers):
+            ax.bar(x, layer, width=width, bottom=bottom, align='edge', label=column, linewidth=0)
+            bottom += layer
+    ax.set_xlim(hours[0], hours[-1] + time_step)
+    return hours
+
+
+def draw_line(ax, x, values, style, max_points=MAX_POINTS, drawstyle='steps-post', **kwargs):
+    # A line over the steps, thinned like the stacked layers when they are
+    if style == 'bar':
+        return ax.plot(x, values, **kwargs)
+    keep = extreme_indices(values, max_points)
+    return ax.plot(np.asarray(x)[keep], np.asarray(values)[keep], drawstyle=drawstyle, **kwargs)
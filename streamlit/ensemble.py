@@ -0,0 +1,209 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import model_builder as mb
+import performance as pf
+import profile_loader as pl
+import solvers as sv
+import storage as sr
+
+# An ensemble runs one portfolio against many weather years (members). The profiles of
+# every member are stacked as one (members x rows) array per profile column.
+PROFILE_COLUMNS = pl.DEMAND_COLUMNS + pl.GENERATION_COLUMNS
+PERCENTILES = [10, 50, 90]
+
+# Template model and member profiles of the running ensemble, set in each worker process
+# (or in this one when members are solved serially), and the process's HiGHS instance,
+# which keeps the template loaded and starts each member from the last member's basis
+_template = None
+_members = None
+_settings = None
+_highs = None
+
+
+def load_members(sources, n_rows, cache_dir=None):
+    """
+    Loads {member name: (demand, generation) files} (or a list of file pairs, named by the
+    demand file) into {'names': member names, column: (members x n_rows) array} for the
+    columns of PROFILE_COLUMNS. Shorter files repeat and longer ones (leap years) are cut
+    to n_rows, as in pl.build_data. Each file goes through the profile cache, so a
+    repeated run does not parse it again.
+    """
+    if not isinstance(sources, dict):
+        sources = {os.path.splitext(os.path.basename(str(pair[0])))[0]: pair for pair in sources}
+    stack = {column: np.empty((len(sources), n_rows)) for column in PROFILE_COLUMNS}
+    for m, (demand_source, generation_source) in enumerate(sources.values()):
+        demand, generation = pl.load_profiles(demand_source, generation_source, cache_dir=cache_dir)
+        for column in PROFILE_COLUMNS:
+            stack[column][m] = pl.tile((demand if column in pl.DEMAND_COLUMNS else generation)[column], n_rows)
+    return {'names': list(sources), **stack}
+
+
+def member_data(members, m, capacities, time_step=1.0, input_step=1.0):
+    # The model input table of member m
+    frame = lambda columns: pd.DataFrame({column: members[column][m] for column in columns})
+    data = pl.build_data(frame(pl.DEMAND_COLUMNS), frame(pl.GENERATION_COLUMNS), capacities,
+                         members[PROFILE_COLUMNS[0]].shape[1])
+    return mb.resample_profiles(data, time_step, input_step)
+
+
+def _init_worker(template, members, settings, forked=True):
+    global _template, _members, _settings, _highs
+    if forked:
+        sv.reset_scheduler()
+    _template, _members, _settings, _highs = template, members, settings, None
+
+
+def _solve_member(m, values=False):
+    """
+    Solves member m on the template and returns its summary (cost, unmet energy,
+    curtailment, storage cycles, solver status and effort) and, with values, its dispatch
+    as float32 arrays.
+    """
+    global _highs
+    model, settings = _template, _settings
+    data = member_data(_members, m, settings['capacities'], model['time_step'], settings['input_step'])
+    row_lower, row_upper, constant = mb.profile_bounds(model, data, settings['costs'])
+    if _highs is None:
+        _highs = sv.load_highs({**model, 'row_lower': row_lower, 'row_upper': row_upper})
+        sv.set_highs_options(_highs, settings['options'])
+    else:
+        rows = settings['rows']
+        _highs.changeRowsBounds(len(rows), rows, row_lower[rows], row_upper[rows])
+    start_time = _highs.getRunTime()
+    _highs.run()
+    status, x, objective = sv.highs_result(_highs, constant)
+    stats = sv.highs_stats(_highs, settings['options'], objective, start_time)
+
+    summary = {'Member': _members['names'][m], 'Status': status, 'Cost': objective,
+               'Iterations': stats['iterations'], 'Solve Time (s)': stats['solve_time']}
+    dispatch = None
+    if x is not None:
+        dt = model['time_step']
+        solved = mb.extract_values(model, x)
+        unmet = solved['Unmet_Demand']
+        summary.update({
+            'Unmet Energy (MWh)': unmet.sum() * dt,
+            'Unmet Steps': int((unmet > 1e-6).sum()),
+            'Peak Unmet (MW)': unmet.max(),
+            'Curtailment (MWh)': solved['Curtailment'].sum() * dt,
+        })
+        # Equivalent full cycles: energy discharged over the energy capacity
+        for tech in settings['storage'].itertuples():
+            discharged = solved[f'Discharge_{tech.name}'].sum() * dt
+            summary[f'{tech.name} Cycles'] = discharged / tech.capacity if tech.capacity > 0 else 0.0
+        if values:
+            dispatch = {name: series.astype(np.float32) for name, series in solved.items()}
+    return summary, dispatch
+
+
+def statistics(members, percentiles=PERCENTILES):
+    """
+    Distribution of every numeric member result over the optimal members: mean, min,
+    max and the percentiles (P90 is the value 90% of members stay at or below).
+    """
+    values = members[members['Status'] == 'Optimal'].drop(columns=['Member', 'Status', 'Iterations',
+                                                                   'Solve Time (s)'])
+    table = pd.DataFrame({'Mean': values.mean(), 'Min': values.min(),
+                          **{f'P{p}': values.quantile(p / 100) for p in percentiles}, 'Max': values.max()})
+    table.index.name = 'Result'
+    return table.reset_index()
+
+
+class _DispatchStore:
+    # Parquet file with Member, Hour and one float32 column per series, one row group per member
+    def __init__(self, path):
+        import pyarrow as pa  # only needed for the store
+        import pyarrow.parquet as pq
+        self.pa, self.pq, self.path, self.writer = pa, pq, path, None
+
+    def write(self, name, dispatch, time_step):
+        n = len(next(iter(dispatch.values())))
+        columns = {'Member': self.pa.array([name] * n).dictionary_encode(),
+                   'Hour': self.pa.array(np.arange(n) * time_step),
+                   **{series: self.pa.array(values) for series, values in dispatch.items()}}
+        table = self.pa.table(columns)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema, compression='zstd')
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def run_ensemble(members, time_horizon, costs, capacities, efficiencies=None, storage=None, time_step=1.0,
+                 input_step=1.0, solver=None, workers=None, store=None):
+    """
+    Solves the dispatch for every member of a stack from load_members with the same
+    portfolio. The model is built once from the first member; each member only swaps the
+    row bounds and cost constant that depend on the profiles (mb.profile_bounds) and is
+    solved from the previous member's basis. Members are solved in `workers` forked
+    processes (default every core; serially with workers=1 or where fork is not available).
+
+    Returns (info, status, results): results has one row per member, info['statistics']
+    their distribution (see statistics) and info['performance'] the phase record. With
+    store (a .parquet path) the dispatch of every member is written there as well.
+    """
+    if storage is None:
+        storage = sr.registry_from_inputs(capacities, efficiencies, costs)
+    n_members = len(members['names'])
+    performance = []
+    with pf.phase(performance, 'build') as entry:
+        model = mb.build_model(member_data(members, 0, capacities, time_step, input_step), time_horizon, costs,
+                               capacities, storage=storage, time_step=time_step)
+        entry.update(pf.model_size(model))
+    blocks = model['row_blocks']
+    rows = np.concatenate([np.arange(*blocks['Demand_Supply_Constraint']),
+                           np.arange(*blocks['Storage_Discharge_Meets_Demand'])]).astype(np.int32)
+    options = sv.solver_options({**(solver or {}), 'backend': 'highs'})
+    workers = workers or os.cpu_count()
+    if options['threads'] is None and workers > 1:
+        options['threads'] = 1  # the parallelism is across members
+    settings = {'costs': costs, 'capacities': capacities, 'storage': storage, 'input_step': input_step,
+                'options': options, 'rows': rows}
+
+    serial = workers <= 1 or 'fork' not in mp.get_all_start_methods()
+    writer = _DispatchStore(store) if store else None
+    summaries = []
+    with pf.phase(performance, 'solve', label='members', **pf.model_size(model)) as entry:
+        solve = partial(_solve_member, values=writer is not None)
+        if serial:
+            _init_worker(model, members, settings, forked=False)
+            results = map(solve, range(n_members))
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=min(workers, n_members), mp_context=mp.get_context('fork'),
+                                       initializer=_init_worker, initargs=(model, members, settings))
+            results = pool.map(solve, range(n_members))
+        try:
+            # Members arrive in order, so each one's dispatch is written and dropped in turn
+            for summary, dispatch in results:
+                summaries.append(summary)
+                if dispatch is not None:
+                    writer.write(summary['Member'], dispatch, time_step)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if writer is not None:
+                writer.close()
+        table = pd.DataFrame(summaries)
+        entry.update(iterations=int(table['Iterations'].sum()), solver_seconds=table['Solve Time (s)'].sum())
+
+    failed = int((table['Status'] != 'Optimal').sum())
+    status = 'Optimal' if not failed else f'{failed} of {n_members} members not optimal'
+    info = {
+        'time_horizon': time_horizon,
+        'time_step': time_step,
+        'storage': list(storage['name']),
+        'members': n_members,
+        'statistics': statistics(table),
+        'store': store,
+        'performance': performance,
+    }
+    return info, status, table
@@ -0,0 +1,360 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import highspy
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import aggregation as ag
+import model_builder as mb
+import performance as pf
+import solvers as sv
+import storage as sr
+
+# Capacity expansion: the capacities of the assets in `investment` become decision
+# variables with an annualised cost, e.g.
+#   {'wind': {'cost': 100000, 'max': 200}, 'LDES': {'cost': 2000, 'min': 500}}
+# Keys are the capacities keys (wind, solar, gas, coal, nuclear, hydro; MW) or storage
+# technology names (energy capacity, MWh); cost is £ per MW (or MWh) per year and min/max
+# bound the capacity (default 0 and unlimited). Other assets keep their fixed capacity.
+GENERATION = ['wind', 'solar'] + [name.lower() for name in mb.CONVENTIONAL]
+RENEWABLES = {'solar': 'Solar Generation (MW)', 'wind': 'Wind Generation (MW)'}
+HOURS_PER_YEAR = 8760
+
+# Period subproblems of the running expansion, set in each worker process (or in this one
+# when the subproblems are solved serially), and the HiGHS instance of every period the
+# process has solved, kept so the next iteration starts from its basis
+_templates = None
+_options = None
+_loaded = {}
+
+
+def set_capacities(capacities, storage, values):
+    # Copies of the capacities dict and storage registry with the candidate values set
+    capacities, storage = dict(capacities), storage.copy()
+    for name, value in values.items():
+        if name in RENEWABLES or name in GENERATION:
+            capacities[name] = value
+        else:
+            storage.loc[storage['name'] == name, 'capacity'] = value
+    return capacities, storage
+
+
+def scale_profiles(data, reference, values):
+    # Renewable generation at the given capacities, from the profiles at the reference ones
+    data = data.copy()
+    for name, column in RENEWABLES.items():
+        if name in values:
+            data[column] = data[column] * (values[name] / reference[name])
+    return data
+
+
+def stacked_bounds(model):
+    # Row and column bounds of a model as one vector
+    return np.concatenate([model['row_lower'], model['row_upper'], model['col_lower'], model['col_upper']])
+
+
+def bound_change(base, changed):
+    # Change of every bound per unit of capacity; unbounded sides (inf - inf) do not change
+    with np.errstate(invalid='ignore'):
+        d = changed - base
+    d[~np.isfinite(d)] = 0.0
+    return d
+
+
+def _templates_for(periods, costs, capacities, storage, candidates, time_step):
+    """
+    One subproblem template per period: the dispatch model with every candidate at zero
+    and the change of its bounds and objective constant per MW (MWh) of each candidate.
+    Capacities only enter bounds and the renewable cost constant, so the subproblem at any
+    capacities is template bounds + gradient @ capacities. Only the renewable gradients
+    depend on the period's profiles; the others are differenced once and shared.
+    """
+    T = len(periods[0])
+    zero = {name: 0.0 for name in candidates}
+
+    def build(data, values):
+        caps, registry = set_capacities(capacities, storage, values)
+        return mb.build_model(scale_profiles(data, capacities, values), T, costs, caps, storage=registry,
+                              time_step=time_step)
+
+    shared = {}
+    base = build(periods[0], zero)
+    for name in candidates:
+        if name not in RENEWABLES:
+            model = build(periods[0], {**zero, name: 1.0})
+            if (model['A'] != base['A']).nnz:
+                raise ValueError(f"The {name} capacity enters the constraint matrix and cannot be expanded")
+            shared[name] = (bound_change(stacked_bounds(base), stacked_bounds(model)), 0.0)
+
+    templates = []
+    for data in periods:
+        base = build(data, zero)
+        columns, constants = [], []
+        for name in candidates:
+            if name in RENEWABLES:
+                model = build(data, {**zero, name: 1.0})
+                gradient = (bound_change(stacked_bounds(base), stacked_bounds(model)),
+                            model['objective_constant'] - base['objective_constant'])
+            else:
+                gradient = shared[name]
+            columns.append(gradient[0])
+            constants.append(gradient[1])
+        gradient = sp.csc_matrix(np.column_stack(columns))
+        changed = np.flatnonzero(np.diff(gradient.tocsr().indptr))
+        n_rows, n_cols = base['A'].shape
+        templates.append({
+            'model': base,
+            'bounds': stacked_bounds(base),
+            'gradient': gradient,
+            'constant_gradient': np.array(constants),
+            'rows': (np.unique(changed[changed < 2 * n_rows] % n_rows)).astype(np.int32),
+            'cols': (np.unique((changed[changed >= 2 * n_rows] - 2 * n_rows) % n_cols)).astype(np.int32),
+        })
+    return templates
+
+
+def _init_worker(templates, options, forked=True):
+    global _templates, _options
+    if forked:
+        sv.reset_scheduler()
+    _templates, _options = templates, options
+    _loaded.clear()
+
+
+def _solve_period(p, capacities, values=False):
+    """
+    Solves period p at the given candidate capacities. Returns its operating cost, the
+    cost gradient with respect to the capacities (from the row duals and reduced costs of
+    the bounds they move), the solver iterations and, with values, the dispatch.
+    """
+    template = _templates[p]
+    model = template['model']
+    n_rows, n_cols = model['A'].shape
+    bounds = template['bounds'] + template['gradient'] @ capacities
+    row_lower, row_upper, col_lower, col_upper = np.split(bounds, [n_rows, 2 * n_rows, 2 * n_rows + n_cols])
+    constant = model['objective_constant'] + template['constant_gradient'] @ capacities
+
+    highs = _loaded.get(p)
+    if highs is None:
+        highs = sv.load_highs({**model, 'row_lower': row_lower, 'row_upper': row_upper, 'col_lower': col_lower,
+                               'col_upper': col_upper})
+        sv.set_highs_options(highs, _options)
+        _loaded[p] = highs
+    else:
+        rows, cols = template['rows'], template['cols']
+        highs.changeRowsBounds(len(rows), rows, row_lower[rows], row_upper[rows])
+        highs.changeColsBounds(len(cols), cols, col_lower[cols], col_upper[cols])
+    start_time = highs.getRunTime()
+    highs.run()
+    status, x, objective = sv.highs_result(highs, constant)
+    duals = sv.highs_duals(highs)
+    if status != 'Optimal' or duals is None:
+        raise RuntimeError(f"Period {p} subproblem finished with status {status}")
+
+    # A positive dual prices the lower bound, a negative one the upper bound
+    row, column = duals['row'], duals['column']
+    weights = np.concatenate([np.maximum(row, 0), np.minimum(row, 0), np.maximum(column, 0), np.minimum(column, 0)])
+    stats = sv.highs_stats(highs, _options, objective, start_time)
+    return {
+        'objective': objective,
+        'gradient': template['gradient'].T @ weights + template['constant_gradient'],
+        'iterations': stats['iterations'],
+        'solve_time': stats['solve_time'],
+        'x': x if values else None,
+    }
+
+
+def _split_periods(data, time_horizon, period, n_periods):
+    # (period profiles, weights, period of every original period) for the subproblems
+    if n_periods is not None:
+        clusters = ag.cluster_periods(data, time_horizon, n_periods, period)
+        profiles = clusters['profiles']
+        periods = [profiles.iloc[j * period:(j + 1) * period].reset_index(drop=True)
+                   for j in range(len(clusters['weights']))]
+        return periods, clusters['weights'], clusters['assignment']
+    if time_horizon % period:
+        raise ValueError(f"The time horizon ({time_horizon} steps) must be a whole number of {period}-step periods")
+    n = time_horizon // period
+    periods = [data.iloc[j * period:(j + 1) * period].reset_index(drop=True) for j in range(n)]
+    return periods, np.ones(n), np.arange(n)
+
+
+class _Master:
+    # Investment LP: capacities and one operating-cost estimate per cut group, raised by cuts.
+    # The cuts carry the period weights, so each estimate enters the objective unweighted.
+    def __init__(self, investment_cost, lower, upper, n_theta):
+        self.n = len(investment_cost)
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        # Operating costs are never negative, so 0 bounds each estimate before its first cut
+        self.highs.addCols(self.n + n_theta, np.concatenate([investment_cost, np.ones(n_theta)]),
+                           np.concatenate([lower, np.zeros(n_theta)]), np.concatenate([upper, np.full(n_theta, np.inf)]),
+                           0, np.zeros(self.n + n_theta, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0))
+        self.iterations = 0
+
+    def add_cut(self, group, objective, gradient, capacities):
+        # theta_group >= objective + gradient . (x - capacities)
+        indices = np.append(np.arange(self.n), self.n + group).astype(np.int32)
+        values = np.append(-gradient, 1.0)
+        self.highs.addRow(objective - gradient @ capacities, np.inf, len(indices), indices, values)
+
+    def solve(self):
+        self.highs.run()
+        if self.highs.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError(f"Benders master problem finished with status {sv.highs_status(self.highs)}")
+        self.iterations += max(0, self.highs.getInfo().simplex_iteration_count)
+        x = np.array(self.highs.getSolution().col_value)
+        return x[:self.n], self.highs.getInfo().objective_function_value
+
+
+def run_expansion(data, time_horizon, costs, capacities, investment, efficiencies=None, storage=None, period=168,
+                  n_periods=None, time_step=1.0, solver=None, workers=None, tolerance=1e-4, max_iterations=50,
+                  multi_cut=False):
+    """
+    Chooses the capacities of the assets in `investment` (see above) together with the
+    dispatch, minimising annualised investment (scaled to the modelled hours) plus
+    operating cost, by Benders decomposition.
+
+    The horizon is split into periods of `period` steps (a week by default), or clustered
+    into n_periods representative periods weighted by the periods they stand for (see
+    aggregation.cluster_periods). Each period is an independent dispatch subproblem, with
+    storage starting empty, solved in parallel in `workers` forked processes (default every
+    core; serially with workers=1 or where fork is not available). Every iteration the
+    master LP proposes capacities, the subproblems are solved at them, and their costs and
+    gradients are added to the master as one aggregated cut, or one cut per period with
+    multi_cut. The run stops when the gap between the best cost found and the master's
+    lower bound is within `tolerance` (relative) or after max_iterations.
+
+    Returns (info, status, solution) like the other runners. info['capacities'] holds the
+    chosen capacity of every candidate; info['capacity_settings'], info['registry'] and
+    info['data'] the capacities dict, storage registry and profiles at those capacities;
+    info['benders'] the bounds of every iteration. The solution stitches the period
+    dispatches at the chosen capacities over the horizon.
+    """
+    if storage is None:
+        storage = sr.registry_from_inputs(capacities, efficiencies, costs)
+    candidates = list(investment)
+    unknown = [name for name in candidates if name not in GENERATION and name not in set(storage['name'])]
+    if unknown:
+        raise ValueError(f"Unknown capacities to expand: {', '.join(unknown)}")
+    for name in candidates:
+        if name in RENEWABLES and not capacities[name] > 0:
+            raise ValueError(f"The {name} profile is scaled from capacities['{name}'], which must be positive")
+    lower = np.array([float(investment[name].get('min', 0.0)) for name in candidates])
+    upper = np.array([float(investment[name].get('max', np.inf)) for name in candidates])
+    current = dict(capacities, **dict(zip(storage['name'], storage['capacity'])))
+    capacity = np.clip([float(current[name]) for name in candidates], lower, upper)
+
+    period_steps = mb.steps(period, time_step)
+    options = sv.solver_options({**(solver or {}), 'backend': 'highs'})
+    if options['threads'] is None:
+        options['threads'] = 1  # the parallelism is across subproblems
+    performance = []
+    with pf.phase(performance, 'build') as entry:
+        periods, weights, assignment = _split_periods(data, time_horizon, period_steps, n_periods)
+        templates = _templates_for(periods, costs, capacities, storage, candidates, time_step)
+        entry.update(rows=sum(t['model']['A'].shape[0] for t in templates),
+                     columns=sum(t['model']['A'].shape[1] for t in templates),
+                     nonzeros=sum(t['model']['A'].nnz for t in templates))
+
+    scale = time_horizon * time_step / HOURS_PER_YEAR
+    investment_cost = np.array([float(investment[name]['cost']) for name in candidates]) * scale
+    groups = np.arange(len(periods)) if multi_cut else np.zeros(len(periods), dtype=int)
+    master = _Master(investment_cost, lower, upper, len(np.unique(groups)))
+
+    workers = workers or os.cpu_count()
+    serial = workers <= 1 or 'fork' not in mp.get_all_start_methods()
+    if serial:
+        _init_worker(templates, options, forked=False)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(periods)), mp_context=mp.get_context('fork'),
+                                   initializer=_init_worker, initargs=(templates, options))
+    chunksize = max(1, len(periods) // (4 * workers))
+
+    def solve_periods(values=False):
+        solve = partial(_solve_period, capacities=capacity, values=values)
+        if pool is None:
+            return [solve(p) for p in range(len(periods))]
+        return list(pool.map(solve, range(len(periods)), chunksize=chunksize))
+
+    history, best, best_cost, bound, iterations, solve_time = [], capacity, np.inf, -np.inf, 0, 0.0
+    status = 'Iteration Limit'
+    try:
+        for iteration in range(1, max_iterations + 1):
+            with pf.phase(performance, 'solve', label=f'iteration {iteration}') as entry:
+                results = solve_periods()
+                operating = sum(w * r['objective'] for w, r in zip(weights, results))
+                total = investment_cost @ capacity + operating
+                if total < best_cost:
+                    best, best_cost = capacity, total
+
+                for group in np.unique(groups):
+                    members = np.flatnonzero(groups == group)
+                    master.add_cut(group, sum(weights[p] * results[p]['objective'] for p in members),
+                                   sum(weights[p] * results[p]['gradient'] for p in members), capacity)
+                capacity, bound = master.solve()
+                capacity = np.clip(capacity, lower, upper)
+                gap = (best_cost - bound) / max(1.0, abs(best_cost))
+                if gap < -tolerance:
+                    # The cuts under-estimate the operating cost, so the bound can only exceed a
+                    # feasible cost through a wrong cut
+                    raise RuntimeError(f"Benders lower bound {bound:,.2f} exceeds the best cost {best_cost:,.2f}")
+
+                sub_iterations = sum(r['iterations'] for r in results)
+                iterations += sub_iterations
+                solve_time += sum(r['solve_time'] for r in results)
+                entry.update(iterations=sub_iterations, solver_seconds=sum(r['solve_time'] for r in results))
+            history.append({'iteration': iteration, 'lower_bound': bound, 'upper_bound': best_cost, 'gap': gap,
+                            'seconds': entry['seconds'], **dict(zip(candidates, best))})
+            if gap <= tolerance:
+                status = 'Optimal'
+                break
+
+        with pf.phase(performance, 'extract'):
+            capacity = best
+            results = solve_periods(values=True)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    chosen = dict(zip(candidates, best))
+    values = {name: float(value) for name, value in chosen.items()}
+    capacity_settings, registry = set_capacities(capacities, storage, values)
+    period_values = [mb.extract_values(templates[p]['model'], results[p]['x']) for p in range(len(periods))]
+    solution = mb.make_solution({name: np.concatenate([period_values[j][name] for j in assignment])
+                                 for name in templates[0]['model']['series']})
+
+    info = {
+        'time_horizon': time_horizon,
+        'time_step': time_step,
+        'storage': list(registry['name']),
+        'registry': registry,
+        'objective': best_cost,
+        'investment_cost': float(investment_cost @ best),
+        'capacities': values,
+        'capacity_settings': capacity_settings,
+        'data': scale_profiles(data, capacities, values),
+        'benders': pd.DataFrame(history),
+        'solver': {'backend': 'highs', 'method': options['method'], 'status': status,
+                   'iterations': iterations + master.iterations, 'solve_time': solve_time,
+                   'objective': best_cost, 'bound': bound},
+        'performance': performance,
+    }
+    return info, status, solution
+
+
+def format_capacities(info):
+    lines = [f"{name}: {value:,.2f} {'MW' if name in GENERATION else 'MWh'}" for name, value in info['capacities'].items()]
+    lines.append(f"Investment cost: {info['investment_cost']:,.2f}, total cost {info['objective']:,.2f}")
+    return '\n'.join(lines)
+
+
+def format_benders(info):
+    # One line per Benders iteration: the master's lower bound, the best cost so far and the gap
+    return '\n'.join(f"Benders iteration {row.iteration}: lower bound {row.lower_bound:,.2f}, "
+                     f"best {row.upper_bound:,.2f}, gap {row.gap:.2%}" for row in info['benders'].itertuples())
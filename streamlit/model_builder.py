@@ -0,0 +1,373 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import storage as sr
+
+# Operational constraints for conventional generation
+MIN_UP_TIME = 3  # Minimum up-time in hours
+MIN_DOWN_TIME = 3  # Minimum down-time in hours
+RAMP_RATE = 10  # MW per hour
+MAX_SHIFT = 10  # MW per hour of demand response that can be shifted
+
+CONVENTIONAL = ['Gas', 'Coal', 'Nuclear', 'Hydro']
+RAMPED = ['Gas', 'Coal', 'Hydro']
+COMMITTED = ['Gas', 'Coal']
+
+
+def steps(hours, time_step):
+    # Number of model steps covering a duration in hours (at least one)
+    return max(1, int(round(hours / time_step)))
+
+
+def resample_profiles(data, time_step, input_step=1.0):
+    """
+    Converts profiles in MW from input_step to time_step hours. Coarser steps average
+    each group of input rows (so energy is preserved); finer steps repeat each row.
+    Both steps must divide one another.
+    """
+    ratio = time_step / input_step
+    if ratio >= 1:
+        n = int(round(ratio))
+        if abs(ratio - n) > 1e-9:
+            raise ValueError(f"A {time_step} h step is not a whole number of {input_step} h input steps")
+        if n == 1:
+            return data.reset_index(drop=True)
+        usable = len(data) // n * n
+        return data.iloc[:usable].groupby(np.arange(usable) // n).mean().reset_index(drop=True)
+    n = int(round(1 / ratio))
+    if abs(1 / ratio - n) > 1e-9:
+        raise ValueError(f"A {input_step} h input step is not a whole number of {time_step} h steps")
+    return data.loc[data.index.repeat(n)].reset_index(drop=True)
+
+
+class _RowBlocks:
+    # Collects constraint rows as COO triplets, one named block at a time
+    def __init__(self, n_cols):
+        self.n_cols = n_cols
+        self.n_rows = 0
+        self.rows, self.cols, self.vals = [], [], []
+        self.lower, self.upper = [], []
+        self.blocks = {}
+
+    def add(self, name, n_rows, terms, lower, upper):
+        # terms is a list of (column indices, coefficients) with one entry per row, or
+        # (column indices, coefficients, local rows) for a term that only some rows have
+        start = self.n_rows
+        for cols, coef, *subset in terms:
+            local = np.asarray(subset[0]) if subset else np.arange(n_rows)
+            self.rows.append(start + local)
+            self.cols.append(np.asarray(cols))
+            self.vals.append(np.broadcast_to(np.asarray(coef, dtype=float), (len(local),)))
+        self.lower.append(np.broadcast_to(np.asarray(lower, dtype=float), (n_rows,)))
+        self.upper.append(np.broadcast_to(np.asarray(upper, dtype=float), (n_rows,)))
+        self.blocks[name] = (start, start + n_rows)
+        self.n_rows += n_rows
+
+    def matrix(self):
+        rows = np.concatenate(self.rows) if self.rows else np.zeros(0, dtype=int)
+        cols = np.concatenate(self.cols) if self.cols else np.zeros(0, dtype=int)
+        vals = np.concatenate(self.vals) if self.vals else np.zeros(0)
+        A = sp.coo_matrix((vals, (rows, cols)), shape=(self.n_rows, self.n_cols)).tocsr()
+        lower = np.concatenate(self.lower) if self.lower else np.zeros(0)
+        upper = np.concatenate(self.upper) if self.upper else np.zeros(0)
+        return A, lower, upper
+
+
+def build_model(data, time_horizon, costs, capacities, efficiencies=None, storage=None, initial_state=None,
+                time_step=1.0):
+    """
+    Builds the least-cost dispatch LP as arrays: objective vector, CSR constraint matrix
+    with row bounds, and column bounds. Mirrors the rows created by run_optimization.
+    Storage technologies come from the registry table (see storage.py); without one the
+    LDES/SDES/Hydrogen entries of the legacy dicts are used.
+
+    initial_state continues the model from an earlier solve: {'soc': SOC per storage
+    technology before hour 0, 'generation': {'Gas': recent outputs, oldest first, ...}}.
+    Without it storage starts empty and hour 0 has no storage dynamics or ramp limits.
+
+    time_horizon counts steps of time_step hours. Flows stay in MW; storage dynamics,
+    costs and ramp limits are scaled by the step, and minimum up/down windows cover the
+    same number of hours at any step.
+    """
+    if storage is None:
+        storage = sr.registry_from_inputs(capacities, efficiencies, costs)
+    names = list(storage['name'])
+    K = len(names)
+
+    T = time_horizon
+    dt = time_step
+    demand = data['Demand (MW)'].to_numpy(dtype=float)[:T]
+    solar = data['Solar Generation (MW)'].to_numpy(dtype=float)[:T]
+    wind = data['Wind Generation (MW)'].to_numpy(dtype=float)[:T]
+
+    # Every series gets one contiguous block of T columns. Storage series are grouped by
+    # kind so that each kind forms a single (technology x hour) block.
+    series = [f'{kind}_{name}' for kind in ('Charge', 'Discharge', 'SOC') for name in names]
+    series += [f'Gen_{name}' for name in CONVENTIONAL]
+    series += ['Unmet_Demand', 'Curtailment', 'Shift_Down', 'Shift_Up']
+    offsets = {name: k * T for k, name in enumerate(series)}
+    n_cols = len(series) * T
+    storage_offsets = {'Charge': 0, 'Discharge': K * T, 'SOC': 2 * K * T}
+
+    def col(name, t):
+        return offsets[name] + t
+
+    def block(kind, t):
+        # Column indices of a storage kind over all technologies, flattened technology-major
+        return (storage_offsets[kind] + np.arange(K)[:, None] * T + t[None, :]).ravel()
+
+    def per_tech(values, n):
+        # Repeat one value per technology over n hours, matching block()
+        return np.repeat(np.asarray(values, dtype=float), n)
+
+    hours = np.arange(T)
+    efficiency = storage['efficiency'].to_numpy()
+    energy_capacity = storage['capacity'].to_numpy()
+
+    # Column bounds
+    col_lower = np.zeros(n_cols)
+    col_upper = np.full(n_cols, np.inf)
+    col_upper[block('SOC', hours)] = per_tech(energy_capacity, T)
+    if initial_state is None:
+        col_upper[block('SOC', np.array([0]))] = 0  # Initial state of charge is zero
+    col_upper[block('Charge', hours)] = per_tech(sr.power_limit(storage, 'max_charge'), T)
+    col_upper[block('Discharge', hours)] = per_tech(sr.power_limit(storage, 'max_discharge'), T)
+    for name in CONVENTIONAL:
+        col_upper[col(f'Gen_{name}', hours)] = capacities[name.lower()]
+    col_upper[col('Shift_Down', hours)] = MAX_SHIFT
+    col_upper[col('Shift_Up', hours)] = MAX_SHIFT
+
+    # Objective
+    layout = {'time_horizon': T, 'time_step': dt, 'series': series, 'offsets': offsets}
+    c, objective_constant = objective_coefficients(layout, data, costs, storage)
+
+    rows = _RowBlocks(n_cols)
+
+    # With a carried-over state hour 0 is linked to the previous solve; otherwise the
+    # coupling rows start at hour 1 as in the PuLP formulation
+    carry = initial_state is not None
+    ts = np.arange(0 if carry else 1, T)
+    n = len(ts)
+    nk = K * n
+    linked = np.flatnonzero(ts >= 1)
+    linked_rows = (np.arange(K)[:, None] * n + linked[None, :]).ravel()
+    soc_start = np.zeros(nk)
+    if carry:
+        soc_start[np.arange(K) * n] = initial_state['soc']
+
+    # Storage dynamics, one row per technology and hour
+    rows.add('Storage_SOC', nk, [
+        (block('SOC', ts), 1.0),
+        (block('SOC', ts[linked] - 1), -1.0, linked_rows),
+        (block('Charge', ts), -per_tech(efficiency * dt, n)),
+        (block('Discharge', ts), per_tech(dt / efficiency, n)),
+    ], soc_start, soc_start)
+    # Discharge cannot exceed the SOC available at the start of the step
+    rows.add('Storage_Discharge_Limit', nk, [
+        (block('Discharge', ts), dt),
+        (block('SOC', ts[linked] - 1), -1.0, linked_rows),
+    ], -np.inf, soc_start)
+    # Discharge can only happen to meet demand
+    rows.add('Storage_Discharge_Meets_Demand', nk, [(block('Discharge', ts), 1.0)], -np.inf, np.tile(demand[ts], K))
+    # Capacity constraints
+    rows.add('Storage_Capacity', nk, [(block('SOC', ts), 1.0)], -np.inf, per_tech(energy_capacity, n))
+
+    # Demand-Supply Constraint with Unmet Demand and Curtailed Energy
+    supply = [f'Discharge_{name}' for name in names] + [f'Gen_{name}' for name in CONVENTIONAL] + ['Unmet_Demand']
+    withdrawal = [f'Charge_{name}' for name in names] + ['Curtailment']
+    net_demand = demand - solar - wind
+    rows.add('Demand_Supply_Constraint', T,
+             [(col(name, hours), 1.0) for name in supply] + [(col(name, hours), -1.0) for name in withdrawal],
+             net_demand, net_demand)
+
+    # Final state of charge must be within capacity limits
+    rows.add('Final_Storage_SOC', K, [(block('SOC', np.array([T - 1])), 1.0)], -np.inf, energy_capacity)
+
+    def history(name):
+        if not carry:
+            return np.zeros(0)
+        return np.asarray(initial_state['generation'].get(name, []), dtype=float)
+
+    def window(gen, times, width, past, coef=1.0):
+        # Terms for coef times the output summed over [t - width, t); steps before 0 come from past
+        terms, constant = [], np.zeros(len(times))
+        for k in range(1, width + 1):
+            idx = times - k
+            inside = idx >= 0
+            terms.append((col(gen, idx[inside]), coef, np.flatnonzero(inside)))
+            constant[~inside] += coef * past[len(past) + idx[~inside]]
+        return terms, constant
+
+    # Ramp rate constraints
+    for name in RAMPED:
+        gen, past = f'Gen_{name}', history(name)
+        times = np.arange(0 if len(past) else 1, T)
+        [(prev_cols, _, prev_rows)], prev = window(gen, times, 1, past)
+        rows.add(f'{name}_Ramp_Up', len(times), [(col(gen, times), 1.0), (prev_cols, -1.0, prev_rows)],
+                 -np.inf, RAMP_RATE * dt + prev)
+        rows.add(f'{name}_Ramp_Down', len(times), [(prev_cols, 1.0, prev_rows), (col(gen, times), -1.0)],
+                 -np.inf, RAMP_RATE * dt - prev)
+
+    # Minimum up/down time constraints (simplified, on the energy produced over the window).
+    # The window is rounded to whole steps, so its sum is scaled back to MIN_UP_TIME steps
+    # to keep the same minimum average output at any time step.
+    up_steps, down_steps = steps(MIN_UP_TIME, dt), steps(MIN_DOWN_TIME, dt)
+    for name in COMMITTED:
+        gen, cap, past = f'Gen_{name}', capacities[name.lower()], history(name)
+        up = np.arange(max(1, up_steps - len(past)), T)
+        down = np.arange(max(1, down_steps - len(past)), T)
+        terms, constant = window(gen, up, up_steps, past, MIN_UP_TIME / up_steps)
+        rows.add(f'{name}_Min_Up', len(up), terms, cap - constant, np.inf)
+        terms, constant = window(gen, down, down_steps, past)
+        rows.add(f'{name}_Min_Down', len(down), terms, -np.inf, down_steps * cap - constant)
+
+    # Demand response
+    shift = [(col('Shift_Up', hours), 1.0), (col('Shift_Down', hours), -1.0)]
+    rows.add('Demand_Response_Balance', T, shift, -np.inf, MAX_SHIFT)
+    rows.add('Demand_Response', T, shift, -np.inf, 0.0)
+
+    A, row_lower, row_upper = rows.matrix()
+
+    return {
+        'time_horizon': T,
+        'time_step': dt,
+        'storage': names,
+        'series': series,
+        'offsets': offsets,
+        'c': c,
+        'objective_constant': objective_constant,
+        'A': A,
+        'row_lower': row_lower,
+        'row_upper': row_upper,
+        'row_blocks': rows.blocks,
+        'col_lower': col_lower,
+        'col_upper': col_upper,
+    }
+
+
+def drop_blocks(model, names):
+    # Copy of a model without the named row blocks, for formulations that replace them;
+    # the blocks after them move up
+    blocks = model['row_blocks']
+    keep = np.ones(model['A'].shape[0], dtype=bool)
+    for name in names:
+        start, stop = blocks[name]
+        keep[start:stop] = False
+    position = np.concatenate([[0], np.cumsum(keep)])
+    return {
+        **model,
+        'A': model['A'][keep],
+        'row_lower': model['row_lower'][keep],
+        'row_upper': model['row_upper'][keep],
+        'row_blocks': {name: (int(position[start]), int(position[stop]))
+                       for name, (start, stop) in blocks.items() if name not in names},
+    }
+
+
+def objective_coefficients(model, data, costs, storage):
+    """
+    Returns the objective vector and constant for a model's column layout. Costs only enter
+    the objective, so this is all that changes when only costs are edited. Costs are per
+    MWh, so every coefficient is scaled by the step length.
+    """
+    T = model['time_horizon']
+    dt = model.get('time_step', 1.0)
+    offsets = model['offsets']
+    hours = np.arange(T)
+
+    c = np.zeros(len(model['series']) * T)
+    for tech in storage.itertuples():
+        c[offsets[f'Charge_{tech.name}'] + hours] = tech.charge_cost
+        c[offsets[f'Discharge_{tech.name}'] + hours] = tech.discharge_cost
+    for name in CONVENTIONAL:
+        c[offsets[f'Gen_{name}'] + hours] = costs[name.lower()]
+    c[offsets['Unmet_Demand'] + hours] = costs['unmet_demand']
+    c[offsets['Curtailment'] + hours] = costs['curtailment']
+
+    # Renewable generation is fixed, so its cost is a constant
+    objective_constant = (costs['solar'] * data['Solar Generation (MW)'].to_numpy(dtype=float)[:T].sum() +
+                          costs['wind'] * data['Wind Generation (MW)'].to_numpy(dtype=float)[:T].sum())
+    return c * dt, objective_constant * dt
+
+
+def profile_bounds(model, data, costs):
+    """
+    Returns (row_lower, row_upper, objective_constant) of a model built by build_model for
+    other demand, solar and wind profiles. The profiles only enter the demand balance, the
+    discharge-meets-demand limits and the renewable cost, so this is all that changes
+    between weather years. Not for presolved models, whose row blocks are reduced.
+    """
+    T = model['time_horizon']
+    demand = data['Demand (MW)'].to_numpy(dtype=float)[:T]
+    solar = data['Solar Generation (MW)'].to_numpy(dtype=float)[:T]
+    wind = data['Wind Generation (MW)'].to_numpy(dtype=float)[:T]
+    row_lower, row_upper = model['row_lower'].copy(), model['row_upper'].copy()
+
+    start, stop = model['row_blocks']['Demand_Supply_Constraint']
+    row_lower[start:stop] = row_upper[start:stop] = demand - solar - wind
+    start, stop = model['row_blocks']['Storage_Discharge_Meets_Demand']
+    K = len(model['storage'])
+    if K:
+        n = (stop - start) // K
+        row_upper[start:stop] = np.tile(demand[T - n:], K)
+
+    constant = (costs['solar'] * solar.sum() + costs['wind'] * wind.sum()) * model.get('time_step', 1.0)
+    return row_lower, row_upper, constant
+
+
+def extract_values(model, x):
+    # One array per series; the column layout makes this a reshape
+    T = model['time_horizon']
+    block = x.reshape(len(model['series']), T)
+    return {name: block[k] for k, name in enumerate(model['series'])}
+
+
+def extract_duals(model, row_dual, column_dual=None):
+    """
+    Row duals (the change in total cost per unit change of each row's bound) as one array
+    per row block, in the row layout of build_model. Of the rows presolve removed, those
+    it turned into column bounds can still be binding: their dual is the reduced cost of
+    the column over the row's coefficient, recovered when column_dual is given (a row
+    whose bound ties with the column's own bound, or with another row's, gets 0). The
+    other removed rows were implied by the column bounds, or merged into a duplicate row
+    that carries their dual, and get 0.
+    """
+    blocks = model.get('original_row_blocks', model['row_blocks'])
+    if 'kept_rows' in model:
+        full = np.zeros(max(stop for _, stop in blocks.values()))
+        full[model['kept_rows']] = row_dual
+        folded = model.get('folded_rows')
+        if column_dual is not None and folded is not None and len(folded['row']):
+            column_dual = column_dual.copy()
+            substituted = model['substituted_cols']
+            if len(substituted):
+                # The reduced cost over the kept rows of the full matrix, as for the other columns
+                column_dual[substituted] = model['c'][substituted] - model['substituted_matrix'].T @ full
+            cols = folded['col'].astype(int)
+            d = column_dual[cols]
+            # A positive reduced cost prices the lower bound, a negative one the upper bound;
+            # the row is binding where its implied bound is the column's final bound and is
+            # tighter than the column's bound before presolve
+            with np.errstate(invalid='ignore'):
+                at_lower = (d > 0) & np.isclose(folded['lower'], model['col_lower'][cols]) & (
+                    folded['lower'] > model['original_col_lower'][cols] + 1e-9)
+                at_upper = (d < 0) & np.isclose(folded['upper'], model['col_upper'][cols]) & (
+                    folded['upper'] < model['original_col_upper'][cols] - 1e-9)
+            binding = np.flatnonzero(at_lower | at_upper)
+            # One row per column takes the reduced cost
+            binding = binding[np.unique(cols[binding], return_index=True)[1]]
+            full[folded['row'][binding].astype(int)] = d[binding] / folded['coef'][binding]
+        row_dual = full
+    return {name: row_dual[start:stop] for name, (start, stop) in blocks.items()}
+
+
+def make_solution(values):
+    """
+    Solved values as a DataFrame indexed by hour with one column per series (Charge_*,
+    Discharge_*, SOC_*, Gen_*, Unmet_Demand, Curtailment, Shift_Down, Shift_Up). Empty
+    when there is no solution.
+    """
+    solution = pd.DataFrame({name: np.asarray(series, dtype=float) for name, series in values.items()})
+    solution.index.name = 'Hour'
+    return solution
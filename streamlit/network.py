@@ -0,0 +1,357 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import model_builder as mb
+import performance as pf
+import presolve as ps
+import report_writer as rw
+import solvers as sv
+
+# A network splits the copper-plate balance into one balance per bus, linked by lines.
+#   buses      name, shares of the system demand, solar and wind profiles (each share column
+#              sums to 1) and optional lat/lon for the map
+#   lines      name, from_bus, to_bus, capacity (MW in each direction), loss (fraction of the
+#              flow lost in transit) and cost (£/MWh carried, e.g. a wheeling charge)
+#   locations  bus of each storage technology and conventional generator (Gas, Coal, ...);
+#              assets that are not listed sit at the first bus
+BUS_COLUMNS = ['name', 'demand_share', 'solar_share', 'wind_share', 'lat', 'lon']
+LINE_COLUMNS = ['name', 'from_bus', 'to_bus', 'capacity', 'loss', 'cost']
+SHARE_COLUMNS = ['demand_share', 'solar_share', 'wind_share']
+CONGESTED = 1e-6  # a line is congested when its flow is within this fraction of capacity
+
+
+def make_network(buses, lines, locations=None):
+    """
+    Validated network dict from the bus and line tables (records or DataFrames) and the
+    asset locations ({asset name: bus name}). Raises ValueError for unknown buses, shares
+    that do not sum to 1, negative capacities or losses outside [0, 1).
+    """
+    buses = pd.DataFrame(buses).reindex(columns=BUS_COLUMNS)
+    if buses.empty:
+        raise ValueError("A network needs at least one bus")
+    buses['name'] = buses['name'].astype(str)
+    buses[BUS_COLUMNS[1:]] = buses[BUS_COLUMNS[1:]].astype(float)
+    buses[SHARE_COLUMNS] = buses[SHARE_COLUMNS].fillna(0.0)
+    if buses['name'].duplicated().any():
+        raise ValueError("Bus names must be unique")
+    if (buses[SHARE_COLUMNS] < 0).any().any():
+        raise ValueError("Bus shares cannot be negative")
+    for column in SHARE_COLUMNS:
+        total = buses[column].sum()
+        if abs(total - 1) > 1e-6:
+            raise ValueError(f"Bus {column} must sum to 1 (it sums to {total:g})")
+
+    lines = pd.DataFrame(lines).reindex(columns=LINE_COLUMNS)
+    lines[['name', 'from_bus', 'to_bus']] = lines[['name', 'from_bus', 'to_bus']].astype(str)
+    lines[['capacity', 'loss', 'cost']] = lines[['capacity', 'loss', 'cost']].astype(float)
+    lines[['loss', 'cost']] = lines[['loss', 'cost']].fillna(0.0)
+    if lines['name'].duplicated().any():
+        raise ValueError("Line names must be unique")
+    unknown = (set(lines['from_bus']) | set(lines['to_bus'])) - set(buses['name'])
+    if unknown:
+        raise ValueError(f"Lines connect unknown buses: {', '.join(sorted(unknown))}")
+    if (lines['from_bus'] == lines['to_bus']).any():
+        raise ValueError("A line must connect two different buses")
+    if lines['capacity'].isna().any() or (lines['capacity'] < 0).any():
+        raise ValueError("Line capacities must be given and non-negative")
+    if ((lines['loss'] < 0) | (lines['loss'] >= 1)).any():
+        raise ValueError("Line losses must be in [0, 1)")
+
+    locations = {str(asset): str(bus) for asset, bus in (locations or {}).items()}
+    unknown = set(locations.values()) - set(buses['name'])
+    if unknown:
+        raise ValueError(f"Assets are located at unknown buses: {', '.join(sorted(unknown))}")
+
+    return {'buses': buses.reset_index(drop=True), 'lines': lines.reset_index(drop=True), 'locations': locations}
+
+
+def load_network(path):
+    # Workbook with 'Buses' and 'Lines' sheets and an optional 'Locations' sheet (asset, bus)
+    sheets = pd.read_excel(path, sheet_name=None)
+    locations = sheets.get('Locations')
+    locations = {} if locations is None else dict(zip(locations['asset'], locations['bus']))
+    return make_network(sheets['Buses'], sheets['Lines'], locations)
+
+
+def incidence_matrix(network, forward=True):
+    """
+    Sparse bus x line incidence of the flow in one direction: the sending bus gets -1 and
+    the receiving bus 1 - loss. forward=False is the flow from to_bus to from_bus.
+    """
+    buses, lines = network['buses'], network['lines']
+    index = pd.Index(buses['name'])
+    send, receive = index.get_indexer(lines['from_bus']), index.get_indexer(lines['to_bus'])
+    if not forward:
+        send, receive = receive, send
+    L = len(lines)
+    return sp.csr_matrix((np.concatenate([-np.ones(L), 1 - lines['loss'].to_numpy()]),
+                          (np.concatenate([send, receive]), np.tile(np.arange(L), 2))), shape=(len(buses), L))
+
+
+def asset_matrix(network, model):
+    """
+    Sparse bus x series matrix putting each storage and generator series of a model at its
+    bus: +1 for output (Discharge_*, Gen_*), -1 for withdrawal (Charge_*).
+    """
+    index = pd.Index(network['buses']['name'])
+    locations = network['locations']
+    first = network['buses']['name'].iloc[0]
+    rows, cols, vals = [], [], []
+    for k, name in enumerate(model['series']):
+        kind, _, asset = name.partition('_')
+        if kind in ('Discharge', 'Gen', 'Charge'):
+            rows.append(index.get_loc(locations.get(asset, first)))
+            cols.append(k)
+            vals.append(-1.0 if kind == 'Charge' else 1.0)
+    return sp.csr_matrix((vals, (rows, cols)), shape=(len(index), len(model['series'])))
+
+
+def build_network_model(data, time_horizon, costs, capacities, network, efficiencies=None, storage=None,
+                        time_step=1.0):
+    """
+    Extends mb.build_model to a network: the copper-plate Demand_Supply_Constraint becomes
+    one Nodal_Balance row per bus and step (row b * T + t), and every bus gets its own
+    unmet demand and curtailment series (Unmet_Demand_<bus>, Curtailment_<bus>). The system
+    Unmet_Demand and Curtailment series stay as their totals, so costs, reports and plots
+    work unchanged. Each line has a Flow_Forward_<line> and Flow_Backward_<line> series in
+    [0, capacity], entered through the incidence matrices.
+
+    All network rows are Kronecker products of a bus-level sparse matrix with the T x T
+    identity, so the build is a handful of sparse array operations at any number of buses,
+    lines and steps.
+
+    With losses and a curtailment cost, free lines let the LP burn surplus by sending it
+    both ways; a line cost of at least loss x curtailment cost rules that out.
+    """
+    base = mb.build_model(data, time_horizon, costs, capacities, efficiencies, storage, time_step=time_step)
+    T, dt = base['time_horizon'], base['time_step']
+    buses, lines = network['buses'], network['lines']
+    B, L = len(buses), len(lines)
+    I = sp.identity(T, format='csr')
+
+    bus_names, line_names = list(buses['name']), list(lines['name'])
+    new_series = ([f'Unmet_Demand_{bus}' for bus in bus_names] + [f'Curtailment_{bus}' for bus in bus_names] +
+                  [f'Flow_Forward_{line}' for line in line_names] + [f'Flow_Backward_{line}' for line in line_names])
+    series = base['series'] + new_series
+    n_base, n_cols = base['A'].shape[1], len(series) * T
+
+    # Nodal balance: assets at the bus + unmet - curtailment + net inflow = net demand
+    A_nodal = sp.hstack([
+        sp.kron(asset_matrix(network, base), I),
+        sp.identity(B * T),
+        -sp.identity(B * T),
+        sp.kron(incidence_matrix(network, forward=True), I),
+        sp.kron(incidence_matrix(network, forward=False), I),
+    ], format='csr')
+    profiles = {column: data[name].to_numpy(dtype=float)[:T] for column, name in
+                [('demand_share', 'Demand (MW)'), ('solar_share', 'Solar Generation (MW)'),
+                 ('wind_share', 'Wind Generation (MW)')]}
+    net_demand = (np.outer(buses['demand_share'], profiles['demand_share']) -
+                  np.outer(buses['solar_share'], profiles['solar_share']) -
+                  np.outer(buses['wind_share'], profiles['wind_share'])).ravel()
+
+    # System totals equal the sum over the buses
+    def total(name, start):
+        system = sp.csr_matrix((np.ones(T), (np.arange(T), base['offsets'][name] + np.arange(T))), shape=(T, n_base))
+        parts = sp.kron(sp.csr_matrix(-np.ones((1, B))), I)
+        before = sp.csr_matrix((T, start * T))
+        after = sp.csr_matrix((T, (len(new_series) - start - B) * T))
+        return sp.hstack([system, before, parts, after], format='csr')
+
+    reduced = mb.drop_blocks(base, ['Demand_Supply_Constraint'])
+    A, row_lower, row_upper, blocks = reduced['A'], reduced['row_lower'], reduced['row_upper'], reduced['row_blocks']
+    n_rows = A.shape[0]
+    blocks['Nodal_Balance'] = (n_rows, n_rows + B * T)
+    blocks['Unmet_Demand_Total'] = (n_rows + B * T, n_rows + B * T + T)
+    blocks['Curtailment_Total'] = (n_rows + B * T + T, n_rows + B * T + 2 * T)
+    A = sp.vstack([sp.hstack([A, sp.csr_matrix((n_rows, n_cols - n_base))]), A_nodal,
+                   total('Unmet_Demand', 0), total('Curtailment', B)], format='csr')
+
+    capacity = np.repeat(lines['capacity'].to_numpy(), T)
+    line_cost = np.repeat(lines['cost'].to_numpy(), T) * dt
+    return {
+        **base,
+        'series': series,
+        'offsets': {name: k * T for k, name in enumerate(series)},
+        'c': np.concatenate([base['c'], np.zeros(2 * B * T), line_cost, line_cost]),
+        'A': A,
+        'row_lower': np.concatenate([row_lower, net_demand, np.zeros(2 * T)]),
+        'row_upper': np.concatenate([row_upper, net_demand, np.zeros(2 * T)]),
+        'row_blocks': blocks,
+        'col_lower': np.concatenate([base['col_lower'], np.zeros((2 * B + 2 * L) * T)]),
+        'col_upper': np.concatenate([base['col_upper'], np.full(2 * B * T, np.inf), capacity, capacity]),
+        'network': network,
+    }
+
+
+def line_flows(solution, network):
+    # Net flow on each line (MW, positive from from_bus to to_bus), one column per line
+    names = list(network['lines']['name'])
+    forward = solution[[f'Flow_Forward_{line}' for line in names]].to_numpy()
+    backward = solution[[f'Flow_Backward_{line}' for line in names]].to_numpy()
+    return pd.DataFrame(forward - backward, index=solution.index, columns=names)
+
+
+def nodal_prices(model):
+    """
+    Price at each bus and step (£/MWh, one column per bus): the dual of its nodal balance
+    row, per MWh of the step. None when the model has no duals.
+    """
+    duals = model.get('duals')
+    if duals is None:
+        return None
+    rows = mb.extract_duals(model, duals['row'], duals['column'])['Nodal_Balance']
+    buses = model['network']['buses']['name']
+    prices = pd.DataFrame(rows.reshape(len(buses), model['time_horizon']).T / model['time_step'], columns=list(buses))
+    prices.index.name = 'Hour'
+    return prices
+
+
+def congestion_report(solution, network, time_step=1.0, prices=None):
+    """
+    One row per line: capacity, mean and largest absolute flow (MW), energy carried and
+    lost (MWh), utilisation (mean |flow| / capacity), the number and share of steps at the
+    limit and, with nodal prices, the congestion rent (£): the price difference between
+    the ends times the flow.
+    """
+    lines = network['lines']
+    flows = line_flows(solution, network)
+    names = list(lines['name'])
+    capacity = lines['capacity'].to_numpy()
+    magnitude = flows.abs().to_numpy()
+    gross = (solution[[f'Flow_Forward_{line}' for line in names]].to_numpy() +
+             solution[[f'Flow_Backward_{line}' for line in names]].to_numpy())
+    congested = (capacity > 0) & (magnitude >= capacity * (1 - CONGESTED))
+
+    report = pd.DataFrame({
+        'Line': names,
+        'From': lines['from_bus'],
+        'To': lines['to_bus'],
+        'Capacity (MW)': capacity,
+        'Mean Flow (MW)': magnitude.mean(axis=0),
+        'Max Flow (MW)': magnitude.max(axis=0) if len(flows) else np.zeros(len(names)),
+        'Energy (MWh)': gross.sum(axis=0) * time_step,
+        'Losses (MWh)': gross.sum(axis=0) * time_step * lines['loss'].to_numpy(),
+        'Utilisation': np.divide(magnitude.mean(axis=0), capacity, out=np.zeros(len(names)), where=capacity > 0),
+        'Congested Steps': congested.sum(axis=0),
+        'Congested Share': congested.mean(axis=0) if len(flows) else np.zeros(len(names)),
+    })
+    if prices is not None:
+        spread = prices[list(lines['to_bus'])].to_numpy() - prices[list(lines['from_bus'])].to_numpy()
+        report['Congestion Rent (£)'] = (spread * flows.to_numpy()).sum(axis=0) * time_step
+    return report
+
+
+def bus_balance(solution, network, data, time_step=1.0):
+    """
+    Energy balance of each bus over the horizon (MWh): demand, local solar and wind, asset
+    output and withdrawal, imports and exports (after losses), unmet demand and curtailment.
+    """
+    buses, lines = network['buses'], network['lines']
+    T = len(solution)
+    energy = {
+        'Demand': buses['demand_share'] * data['Demand (MW)'].to_numpy(dtype=float)[:T].sum(),
+        'Solar': buses['solar_share'] * data['Solar Generation (MW)'].to_numpy(dtype=float)[:T].sum(),
+        'Wind': buses['wind_share'] * data['Wind Generation (MW)'].to_numpy(dtype=float)[:T].sum(),
+    }
+    totals = solution.sum()
+    index = pd.Index(buses['name'])
+    assets = np.zeros((len(buses), 2))
+    for name, value in totals.items():
+        kind, _, asset = name.partition('_')
+        if kind in ('Discharge', 'Gen', 'Charge'):
+            bus = index.get_loc(network['locations'].get(asset, buses['name'].iloc[0]))
+            assets[bus, int(kind == 'Charge')] += value
+
+    names = list(lines['name'])
+    forward = totals[[f'Flow_Forward_{line}' for line in names]].to_numpy()
+    backward = totals[[f'Flow_Backward_{line}' for line in names]].to_numpy()
+    # Imports are counted after losses at the receiving bus, exports before them
+    imports = (incidence_matrix(network, True).maximum(0) @ forward +
+               incidence_matrix(network, False).maximum(0) @ backward)
+    exports = (-incidence_matrix(network, True).minimum(0) @ forward -
+               incidence_matrix(network, False).minimum(0) @ backward)
+
+    balance = pd.DataFrame({
+        'Bus': buses['name'],
+        **{name: values.to_numpy() for name, values in energy.items()},
+        'Storage/Generation Output': assets[:, 0],
+        'Storage Charging': assets[:, 1],
+        'Imports': imports,
+        'Exports': exports,
+        'Unmet Demand': totals[[f'Unmet_Demand_{bus}' for bus in buses['name']]].to_numpy(),
+        'Curtailment': totals[[f'Curtailment_{bus}' for bus in buses['name']]].to_numpy(),
+    })
+    balance.iloc[:, 1:] *= time_step
+    return balance
+
+
+def run_network_optimization(data, time_horizon, costs, capacities, network, efficiencies=None, storage=None,
+                             presolve=True, time_step=1.0, solver=None):
+    """
+    Builds, presolves and solves the network model like opt.run_matrix_optimization.
+    The model gets the nodal prices ('prices', when the solver returns duals) and the
+    per-line 'congestion' report next to the usual solver stats and performance record.
+    """
+    performance = []
+    with pf.phase(performance, 'build') as entry:
+        model = build_network_model(data, time_horizon, costs, capacities, network, efficiencies, storage, time_step)
+        entry.update(pf.model_size(model))
+    if presolve:
+        with pf.phase(performance, 'presolve') as entry:
+            model = ps.reduce_model(model)
+            entry.update(pf.model_size(model))
+    with pf.phase(performance, 'solve', **pf.model_size(model)) as entry:
+        result = sv.solve_arrays(model, solver)
+        status, x = result['status'], result['x']
+        entry.update(iterations=result['stats']['iterations'], solver_seconds=result['stats']['solve_time'])
+    model['objective'] = result['objective']
+    model['solver'] = result['stats']
+    model['duals'] = result['duals']
+
+    with pf.phase(performance, 'extract'):
+        solution = mb.make_solution(mb.extract_values(model, x) if x is not None else {})
+        if x is not None:
+            model['prices'] = nodal_prices(model)
+            model['congestion'] = congestion_report(solution, network, model['time_step'], model['prices'])
+    model['performance'] = performance
+
+    return model, status, solution
+
+
+def save_map(network, congestion, filename='network_map.html'):
+    """
+    Folium map of the buses (lat/lon) with each line coloured by the share of steps it
+    was congested (green none, red always). Buses without coordinates are left out.
+    """
+    import folium  # only needed for the map
+
+    buses = network['buses'].dropna(subset=['lat', 'lon']).set_index('name')
+    if buses.empty:
+        raise ValueError("No bus has lat/lon coordinates")
+    fmap = folium.Map(location=[buses['lat'].mean(), buses['lon'].mean()], zoom_start=6)
+    for line, start, end, share in zip(congestion['Line'], congestion['From'], congestion['To'],
+                                       congestion['Congested Share']):
+        if start in buses.index and end in buses.index:
+            red, green = int(255 * share), int(255 * (1 - share))
+            folium.PolyLine([buses.loc[start, ['lat', 'lon']].tolist(), buses.loc[end, ['lat', 'lon']].tolist()],
+                            color=f'#{red:02x}{green:02x}00', weight=3,
+                            tooltip=f"{line}: congested {share:.0%} of steps").add_to(fmap)
+    for name, bus in buses.iterrows():
+        folium.CircleMarker([bus['lat'], bus['lon']], radius=5, tooltip=name, fill=True).add_to(fmap)
+    fmap.save(filename)
+    return filename
+
+
+def write_network_report(filename, model, solution, data):
+    # Congestion, bus balance, line flows and nodal prices as sheets of one workbook
+    sheets = {
+        'Congestion': model['congestion'],
+        'Bus Balance': bus_balance(solution, model['network'], data, model['time_step']),
+        'Line Flows': line_flows(solution, model['network']).reset_index(),
+    }
+    if model.get('prices') is not None:
+        sheets['Nodal Prices'] = model['prices'].reset_index()
+    rw.write_excel(filename, sheets)
+    return filename
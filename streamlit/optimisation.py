@@ -1,50 +1,111 @@
 import pandas as pd
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus
+from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus, value
+
+import model_builder as mb
+import storage as sr
+import presolve as ps
+import solvers as sv
+import performance as pf
+import sensitivity as se
+from model_builder import MIN_UP_TIME, MIN_DOWN_TIME, RAMP_RATE, MAX_SHIFT
+
+def run_optimization(data, time_horizon, costs, capacities, efficiencies=None, storage=None, builder='matrix',
+                     presolve=True, time_step=1.0, solver=None, sensitivity=False):
+    # time_horizon is the number of steps of time_step hours (see model_builder.resample_profiles)
+    # solver: backend, method, threads, time_limit and mip_gap (see solvers.DEFAULT_OPTIONS);
+    # the solver statistics are returned in the first result under 'solver' and the time,
+    # memory and model size of each phase under 'performance' (see performance.py)
+    # With sensitivity (matrix builder), the first result also holds 'sensitivity': hourly
+    # prices, storage and capacity values and cost ranging from the duals (see sensitivity.py)
+    # Storage technologies come from the registry table; without one, the LDES/SDES/Hydrogen
+    # entries of capacities, efficiencies and costs are used
+    if storage is None:
+        storage = sr.registry_from_inputs(capacities, efficiencies, costs)
+
+    # The matrix builder creates the whole LP with array operations and solves it in-process;
+    # builder='pulp' keeps the original hour-by-hour PuLP formulation
+    if builder == 'matrix':
+        return run_matrix_optimization(data, time_horizon, costs, capacities, efficiencies, storage, presolve,
+                                       time_step, solver, sensitivity)
+
+    performance = []
+    with pf.phase(performance, 'build') as entry:
+        prob, decision_vars = build_problem(data, time_horizon, costs, capacities, storage, time_step)
+        entry.update(pf.problem_size(prob))
+
+    # Drop redundant rows before handing the model to the solver
+    if presolve:
+        with pf.phase(performance, 'presolve') as entry:
+            prob.presolve = ps.reduce_problem(prob)
+            entry.update(pf.problem_size(prob))
+
+    # Solve the optimization problem; the PuLP formulation defaults to CBC as before. The
+    # phase time includes writing and reading the solver's files, solver_seconds does not.
+    options = sv.solver_options({'backend': 'cbc', **(solver or {})})
+    with pf.phase(performance, 'solve', **pf.problem_size(prob)) as entry:
+        prob.solve(sv.pulp_solver(options))
+        entry['solver_seconds'] = prob.solutionTime
+    objective = value(prob.objective)
+
+    # Read every variable once into the solution table so the LpProblem can be released
+    with pf.phase(performance, 'extract'):
+        solution = mb.make_solution({
+            name: [getattr(var, 'varValue', var) for var in series.values()]
+            for name, series in decision_vars.items()
+        })
+    info = {
+        'time_horizon': time_horizon,
+        'time_step': time_step,
+        'storage': list(storage['name']),
+        'objective': objective,
+        'presolve': getattr(prob, 'presolve', None),
+        'solver': sv.pulp_stats(prob, options, objective),
+        'performance': performance,
+    }
+    return info, LpStatus[prob.status], solution
+
+def build_problem(data, time_horizon, costs, capacities, storage, time_step=1.0):
+    # The hour-by-hour PuLP formulation; returns the problem and its variables by series
+    dt = time_step
 
-def run_optimization(data, time_horizon, costs, capacities, efficiencies):
-    
     # Create the LP problem
     prob = LpProblem("Least_Cost_Dispatch", LpMinimize)
 
     # Add conventional generation to the optimisation problem
     Gen_Gas, Gen_Coal, Gen_Nuclear, Gen_Hydro = add_conventional_generation(
-        prob, data, time_horizon, capacities, costs
+        prob, data, time_horizon, capacities, costs, time_step
     )
 
     # Add demand response to the optimisation problem
     Shift_Down, Shift_Up = add_demand_response(prob, data, time_horizon)
 
     # Define decision variables
-    decision_vars = {
-        'Charge_LDES': LpVariable.dicts("Charge_LDES", range(time_horizon), lowBound=0, cat='Continuous'),
-        'Discharge_LDES': LpVariable.dicts("Discharge_LDES", range(time_horizon), lowBound=0, cat='Continuous'),
-        'Charge_SDES': LpVariable.dicts("Charge_SDES", range(time_horizon), lowBound=0, cat='Continuous'),
-        'Discharge_SDES': LpVariable.dicts("Discharge_SDES", range(time_horizon), lowBound=0, cat='Continuous'),
-        'Charge_Hydrogen': LpVariable.dicts("Charge_Hydrogen", range(time_horizon), lowBound=0, cat='Continuous'),
-        'Discharge_Hydrogen': LpVariable.dicts("Discharge_Hydrogen", range(time_horizon), lowBound=0, cat='Continuous'),
+    decision_vars = {}
+    for tech in storage.itertuples():
+        decision_vars[f'Charge_{tech.name}'] = LpVariable.dicts(
+            f"Charge_{tech.name}", range(time_horizon), lowBound=0, upBound=_limit(tech.max_charge), cat='Continuous')
+        decision_vars[f'Discharge_{tech.name}'] = LpVariable.dicts(
+            f"Discharge_{tech.name}", range(time_horizon), lowBound=0, upBound=_limit(tech.max_discharge), cat='Continuous')
+        decision_vars[f'SOC_{tech.name}'] = {0: 0}
+    decision_vars.update({
         'Unmet_Demand': LpVariable.dicts("Unmet_Demand", range(time_horizon), lowBound=0, cat='Continuous'),
         'Curtailment': LpVariable.dicts("Curtailment", range(time_horizon), lowBound=0, cat='Continuous'),
-        'SOC_LDES': {0: 0},
-        'SOC_SDES': {0: 0},
-        'SOC_Hydrogen': {0: 0},
         'Gen_Gas': Gen_Gas,
         'Gen_Coal': Gen_Coal,
         'Gen_Nuclear': Gen_Nuclear,
         'Gen_Hydro': Gen_Hydro,
         'Shift_Down': Shift_Down,
         'Shift_Up': Shift_Up
-    }
+    })
     # Planning a network model: Cost per MWh of generation etc
     # Objective: Minimise the total cost of generation, charging, discharging, and unmet demand
-    prob += lpSum([
+    # (costs are per MWh, so each step's cost is scaled by its length)
+    prob += dt * lpSum([
         costs['solar'] * data['Solar Generation (MW)'][t] +
         costs['wind'] * data['Wind Generation (MW)'][t] +
-        costs['ldes_charge'] * decision_vars['Charge_LDES'][t] +
-        costs['ldes_discharge'] * decision_vars['Discharge_LDES'][t] +
-        costs['sdes_charge'] * decision_vars['Charge_SDES'][t] +
-        costs['sdes_discharge'] * decision_vars['Discharge_SDES'][t] +
-        costs['hydrogen_charge'] * decision_vars['Charge_Hydrogen'][t] +
-        costs['hydrogen_discharge'] * decision_vars['Discharge_Hydrogen'][t] +
+        lpSum(tech.charge_cost * decision_vars[f'Charge_{tech.name}'][t] +
+              tech.discharge_cost * decision_vars[f'Discharge_{tech.name}'][t]
+              for tech in storage.itertuples()) +
         costs['gas'] * decision_vars['Gen_Gas'][t] +
         costs['coal'] * decision_vars['Gen_Coal'][t] +
         costs['nuclear'] * decision_vars['Gen_Nuclear'][t] +
@@ -55,62 +116,83 @@ def run_optimization(data, time_horizon, costs, capacities, efficiencies):
     ]), "Total_Cost"
 
     # Additional constraint to ensure storage discharge only happens to meet demand
-    for t in range(1, time_horizon):
-        decision_vars['SOC_LDES'][t] = LpVariable(f"SOC_LDES_{t}", lowBound=0, upBound=capacities['ldes'])
-        decision_vars['SOC_SDES'][t] = LpVariable(f"SOC_SDES_{t}", lowBound=0, upBound=capacities['sdes'])
-        decision_vars['SOC_Hydrogen'][t] = LpVariable(f"SOC_Hydrogen_{t}", lowBound=0, upBound=capacities['hydrogen'])
-
-        # Storage dynamics
-        prob += decision_vars['SOC_LDES'][t] == decision_vars['SOC_LDES'][t-1] + decision_vars['Charge_LDES'][t] * efficiencies['ldes'] - decision_vars['Discharge_LDES'][t] * (1 / efficiencies['ldes']), f"LDES_SOC_{t}"
-        prob += decision_vars['SOC_SDES'][t] == decision_vars['SOC_SDES'][t-1] + decision_vars['Charge_SDES'][t] * efficiencies['sdes'] - decision_vars['Discharge_SDES'][t] * (1 / efficiencies['sdes']), f"SDES_SOC_{t}"
-        prob += decision_vars['SOC_Hydrogen'][t] == decision_vars['SOC_Hydrogen'][t-1] + decision_vars['Charge_Hydrogen'][t] * efficiencies['hydrogen'] - decision_vars['Discharge_Hydrogen'][t] * (1 / efficiencies['hydrogen']), f"Hydrogen_SOC_{t}"
-
-        # Ensure that the discharge from storage does not exceed the available SOC at that time
-        prob += decision_vars['Discharge_LDES'][t] <= decision_vars['SOC_LDES'][t-1], f"LDES_Discharge_Limit_{t}"
-        prob += decision_vars['Discharge_SDES'][t] <= decision_vars['SOC_SDES'][t-1], f"SDES_Discharge_Limit_{t}"
-        prob += decision_vars['Discharge_Hydrogen'][t] <= decision_vars['SOC_Hydrogen'][t-1], f"Hydrogen_Discharge_Limit_{t}"
-
-        # Discharge can only happen to meet demand
-        prob += decision_vars['Discharge_LDES'][t] <= data['Demand (MW)'][t], f"LDES_Discharge_Meets_Demand_{t}"
-        prob += decision_vars['Discharge_SDES'][t] <= data['Demand (MW)'][t], f"SDES_Discharge_Meets_Demand_{t}"
-        prob += decision_vars['Discharge_Hydrogen'][t] <= data['Demand (MW)'][t], f"Hydrogen_Discharge_Meets_Demand_{t}"
-
-        # Capacity constraints
-        prob += decision_vars['SOC_LDES'][t] <= capacities['ldes'], f"LDES_Capacity_{t}"
-        prob += decision_vars['SOC_SDES'][t] <= capacities['sdes'], f"SDES_Capacity_{t}"
-        prob += decision_vars['SOC_Hydrogen'][t] <= capacities['hydrogen'], f"Hydrogen_Capacity_{t}"
+    for tech in storage.itertuples():
+        name = tech.name
+        SOC = decision_vars[f'SOC_{name}']
+        Charge = decision_vars[f'Charge_{name}']
+        Discharge = decision_vars[f'Discharge_{name}']
+        for t in range(1, time_horizon):
+            SOC[t] = LpVariable(f"SOC_{name}_{t}", lowBound=0, upBound=tech.capacity)
+
+            # Storage dynamics
+            prob += SOC[t] == SOC[t-1] + dt * (Charge[t] * tech.efficiency - Discharge[t] * (1 / tech.efficiency)), f"{name}_SOC_{t}"
+
+            # Ensure that the discharge from storage does not exceed the available SOC at that time
+            prob += dt * Discharge[t] <= SOC[t-1], f"{name}_Discharge_Limit_{t}"
+
+            # Discharge can only happen to meet demand
+            prob += Discharge[t] <= data['Demand (MW)'][t], f"{name}_Discharge_Meets_Demand_{t}"
+
+            # Capacity constraints
+            prob += SOC[t] <= tech.capacity, f"{name}_Capacity_{t}"
 
     # Demand-Supply Constraint with Unmet Demand and Curtailed Energy
     for t in range(time_horizon):
         prob += (
             data['Solar Generation (MW)'][t] +
             data['Wind Generation (MW)'][t] +
-            decision_vars['Discharge_LDES'][t] +
-            decision_vars['Discharge_SDES'][t] +
-            decision_vars['Discharge_Hydrogen'][t] +
+            lpSum(decision_vars[f'Discharge_{name}'][t] for name in storage['name']) +
             decision_vars['Gen_Gas'][t] +
             decision_vars['Gen_Coal'][t] +
             decision_vars['Gen_Nuclear'][t] +
             decision_vars['Gen_Hydro'][t] +
             decision_vars['Unmet_Demand'][t]
             == data['Demand (MW)'][t] +
-            decision_vars['Charge_LDES'][t] +
-            decision_vars['Charge_SDES'][t] +
-            decision_vars['Charge_Hydrogen'][t] +
+            lpSum(decision_vars[f'Charge_{name}'][t] for name in storage['name']) +
             decision_vars['Curtailment'][t]  # Add curtailment to ensure excess generation is handled
         ), f"Demand_Supply_Constraint_{t}"
 
     # Final state of charge must be within capacity limits
-    prob += decision_vars['SOC_LDES'][time_horizon-1] <= capacities['ldes'], "Final_LDES_SOC"
-    prob += decision_vars['SOC_SDES'][time_horizon-1] <= capacities['sdes'], "Final_SDES_SOC"
-    prob += decision_vars['SOC_Hydrogen'][time_horizon-1] <= capacities['hydrogen'], "Final_Hydrogen_SOC"
-
-    # Solve the optimization problem
-    prob.solve()
-
-    return prob, LpStatus[prob.status], decision_vars
-
-def add_conventional_generation(prob, data, time_horizon, capacities, costs):
+    for tech in storage.itertuples():
+        prob += decision_vars[f'SOC_{tech.name}'][time_horizon-1] <= tech.capacity, f"Final_{tech.name}_SOC"
+
+    return prob, decision_vars
+
+def run_matrix_optimization(data, time_horizon, costs, capacities, efficiencies, storage=None, presolve=True,
+                            time_step=1.0, solver=None, sensitivity=False):
+    performance = []
+    with pf.phase(performance, 'build') as entry:
+        model = mb.build_model(data, time_horizon, costs, capacities, efficiencies, storage, time_step=time_step)
+        entry.update(pf.model_size(model))
+    if presolve:
+        with pf.phase(performance, 'presolve') as entry:
+            model = ps.reduce_model(model)
+            entry.update(pf.model_size(model))
+    with pf.phase(performance, 'solve', **pf.model_size(model)) as entry:
+        result = sv.solve_arrays(model, solver, ranging=sensitivity)
+        status, x, objective, stats = result['status'], result['x'], result['objective'], result['stats']
+        entry.update(iterations=stats['iterations'], solver_seconds=stats['solve_time'])
+    model['objective'] = objective
+    model['solver'] = stats
+    # Row duals and reduced costs of the solved (presolved) model; see mb.extract_duals
+    model['duals'] = result['duals']
+    model['ranging'] = result['ranging']
+    model['sensitivity'] = None
+    if sensitivity and x is not None and model['duals'] is not None:
+        with pf.phase(performance, 'sensitivity'):
+            model['sensitivity'] = se.analyse(model, x, data, costs, capacities, storage)
+
+    with pf.phase(performance, 'extract'):
+        solution = mb.make_solution(mb.extract_values(model, x) if x is not None else {})
+    model['performance'] = performance
+
+    return model, status, solution
+
+def _limit(value):
+    # Optional registry power limit as a PuLP upper bound
+    return None if pd.isna(value) else value
+
+def add_conventional_generation(prob, data, time_horizon, capacities, costs, time_step=1.0):
     # Define decision variables for conventional generation
     Gen_Gas = LpVariable.dicts("Gen_Gas", range(time_horizon), lowBound=0, upBound=capacities['gas'], cat='Continuous')
     Gen_Coal = LpVariable.dicts("Gen_Coal", range(time_horizon), lowBound=0, upBound=capacities['coal'], cat='Continuous')
@@ -118,7 +200,7 @@ def add_conventional_generation(prob, data, time_horizon, capacities, costs):
     Gen_Hydro = LpVariable.dicts("Gen_Hydro", range(time_horizon), lowBound=0, upBound=capacities['hydro'], cat='Continuous')
 
     # Add conventional generation to the objective function
-    prob += lpSum([
+    prob += time_step * lpSum([
         costs['gas'] * Gen_Gas[t] +
         costs['coal'] * Gen_Coal[t] +
         costs['nuclear'] * Gen_Nuclear[t] +
@@ -126,10 +208,10 @@ def add_conventional_generation(prob, data, time_horizon, capacities, costs):
         for t in range(time_horizon)
     ]), "Conventional_Generation_Cost"
 
-    # Operational constraints
-    min_up_time = 3  # Minimum up-time in hours
-    min_down_time = 3  # Minimum down-time in hours
-    ramp_rate = 10  # MW per hour
+    # Operational constraints, converted from hours to steps of time_step hours
+    min_up_time = mb.steps(MIN_UP_TIME, time_step)
+    min_down_time = mb.steps(MIN_DOWN_TIME, time_step)
+    ramp_rate = RAMP_RATE * time_step
 
     # Ramp rate constraints
     for t in range(1, time_horizon):
@@ -142,8 +224,9 @@ def add_conventional_generation(prob, data, time_horizon, capacities, costs):
 
     # Add minimum up/down time constraints (this is a simplified version)
     for t in range(min_up_time, time_horizon):
-        prob += lpSum([Gen_Gas[i] for i in range(t - min_up_time, t)]) >= capacities['gas'], f"Gas_Min_Up_{t}"
-        prob += lpSum([Gen_Coal[i] for i in range(t - min_up_time, t)]) >= capacities['coal'], f"Coal_Min_Up_{t}"
+        # Scaled to a MIN_UP_TIME-step sum when the window is rounded to whole steps
+        prob += MIN_UP_TIME / min_up_time * lpSum([Gen_Gas[i] for i in range(t - min_up_time, t)]) >= capacities['gas'], f"Gas_Min_Up_{t}"
+        prob += MIN_UP_TIME / min_up_time * lpSum([Gen_Coal[i] for i in range(t - min_up_time, t)]) >= capacities['coal'], f"Coal_Min_Up_{t}"
 
     for t in range(min_down_time, time_horizon):
         prob += lpSum([capacities['gas'] - Gen_Gas[i] for i in range(t - min_down_time, t)]) >= 0, f"Gas_Min_Down_{t}"
@@ -153,7 +236,7 @@ def add_conventional_generation(prob, data, time_horizon, capacities, costs):
 
 def add_demand_response(prob, data, time_horizon):
     # Define demand response potential (e.g., load that can be shifted)
-    max_shift = 10  # MW per hour that can be shifted
+    max_shift = MAX_SHIFT
 
     # Define decision variables for demand response
     Shift_Down = LpVariable.dicts("Shift_Down", range(time_horizon), lowBound=0, upBound=max_shift, cat='Continuous')
@@ -170,6 +253,3 @@ def add_demand_response(prob, data, time_horizon):
         ) <= data['Demand (MW)'][t], f"Demand_Response_{t}"
 
     return Shift_Down, Shift_Up
-
-
-
@@ -0,0 +1,140 @@
+import contextlib
+import json
+import sys
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# A performance record is a list of phase entries, one per pipeline step (load, build,
+# presolve, solve, extract, plot, report), each with:
+#   phase              phase name; label distinguishes repeated phases (plots, windows)
+#   seconds            wall time
+#   peak_rss_delta_mb  rise of the process peak resident memory above its value at the start
+#   rows, columns, nonzeros, iterations  model size and solver iterations, where they apply
+PHASES = ['load', 'build', 'presolve', 'solve', 'sensitivity', 'extract', 'plot', 'report']
+CLEAR_REFS = '/proc/self/clear_refs'
+
+
+def _rss_mb(field):
+    # VmRSS (current) or VmHWM (peak since the last reset) from /proc, in MB
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    raise OSError(f"{field} not in /proc/self/status")
+
+
+def _max_rss_mb():
+    # Peak resident memory of the process; ru_maxrss is in KB on Linux and bytes on macOS
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def _start_memory():
+    # On Linux the peak is reset at the start of each phase, so a phase that stays below an
+    # earlier peak still reports its own; elsewhere only growth of the lifetime peak shows
+    try:
+        with open(CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return 'hwm', _rss_mb('VmRSS')
+    except OSError:
+        return 'maxrss', _max_rss_mb()
+
+
+def _peak_delta(start):
+    kind, before = start
+    if before is None:
+        return None
+    try:
+        after = _rss_mb('VmHWM') if kind == 'hwm' else _max_rss_mb()
+    except OSError:
+        return None
+    return max(0.0, after - before)
+
+
+@contextlib.contextmanager
+def phase(record, name, **details):
+    """
+    Times the enclosed block and appends its entry to record (a list; None only times it).
+    Yields the entry so the block can add the model size or solver iterations. Phases are
+    not meant to be nested: an inner phase resets the peak the outer one is measuring.
+    """
+    entry = {'phase': name, **details}
+    memory = _start_memory()
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry['seconds'] = time.perf_counter() - start
+        entry['peak_rss_delta_mb'] = _peak_delta(memory)
+        if record is not None:
+            record.append(entry)
+
+
+def model_size(model):
+    # Rows, columns and nonzeros of a model_builder model
+    A = model['A']
+    return {'rows': A.shape[0], 'columns': A.shape[1], 'nonzeros': A.nnz}
+
+
+def problem_size(prob):
+    # The same for a PuLP problem
+    return {'rows': len(prob.constraints), 'columns': prob.numVariables(),
+            'nonzeros': sum(len(constraint) for constraint in prob.constraints.values())}
+
+
+def to_frame(record):
+    columns = ['phase', 'label', 'seconds', 'peak_rss_delta_mb', 'rows', 'columns', 'nonzeros', 'iterations']
+    frame = pd.DataFrame(record)
+    return frame.reindex(columns=columns + [c for c in frame.columns if c not in columns])
+
+
+def summarize(record):
+    """
+    One row per phase in pipeline order: total seconds and share of the run, the largest
+    peak memory rise, the largest model and the total solver iterations.
+    """
+    frame = to_frame(record)
+    if frame.empty:
+        return frame
+    summary = frame.groupby('phase', sort=False).agg(
+        seconds=('seconds', 'sum'), calls=('seconds', 'size'), peak_rss_delta_mb=('peak_rss_delta_mb', 'max'),
+        rows=('rows', 'max'), columns=('columns', 'max'), nonzeros=('nonzeros', 'max'),
+        iterations=('iterations', lambda s: s.sum(min_count=1)),
+    )
+    summary.insert(1, 'share', summary['seconds'] / summary['seconds'].sum())
+    order = [p for p in PHASES if p in summary.index] + [p for p in summary.index if p not in PHASES]
+    return summary.loc[order].reset_index()
+
+
+def format_record(record):
+    lines = []
+    for row in summarize(record).itertuples():
+        line = f"{row.phase:<11} {row.seconds:8.3f}s {row.share:6.1%}"
+        if pd.notna(row.peak_rss_delta_mb):
+            line += f"  +{row.peak_rss_delta_mb:.1f} MB peak"
+        if pd.notna(row.rows):
+            line += f"  {int(row.rows)} x {int(row.columns)}, {int(row.nonzeros)} nonzeros"
+        if pd.notna(row.iterations):
+            line += f"  {int(row.iterations)} iterations"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def write_json_lines(record, path, **context):
+    # Appends one JSON object per phase; context (e.g. run id, mode, horizon) is added to each
+    with open(path, 'a') as f:
+        for entry in record:
+            f.write(json.dumps({**context, **entry}, default=_json_value) + '\n')
+
+
+def _json_value(value):
+    # NumPy scalars in the entries
+    return value.item() if hasattr(value, 'item') else str(value)
@@ -0,0 +1,245 @@
+import numpy as np
+import scipy.sparse as sp
+
+TOLERANCE = 1e-9
+
+
+def reduce_model(model, max_passes=3):
+    """
+    Removes rows the solver does not need from a model built by model_builder.build_model.
+    Fixed columns are substituted into the row bounds, single-variable rows become column
+    bounds, rows implied by the column bounds are dropped and duplicate rows are merged.
+    Columns are never removed, so solutions map back to the original layout unchanged.
+    """
+    A = model['A'].tocsr(copy=True)
+    A.sum_duplicates()
+    original = A
+    row_lower = model['row_lower'].astype(float)
+    row_upper = model['row_upper'].astype(float)
+    col_lower = model['col_lower'].astype(float)
+    col_upper = model['col_upper'].astype(float)
+
+    n_rows, nnz = A.shape[0], A.nnz
+    keep = np.ones(n_rows, dtype=bool)
+    substituted = np.zeros(A.shape[1], dtype=bool)
+    stats = {'singleton_rows': 0, 'implied_rows': 0, 'duplicate_rows': 0, 'bounds_tightened': 0}
+    folded = []  # (rows, columns, coefficients, implied lower, implied upper) of each pass
+
+    for _ in range(max_passes):
+        removed = keep.sum()
+
+        # Move fixed columns into the row bounds
+        fixed = (col_lower == col_upper) & ~substituted
+        if fixed.any():
+            shift = A[:, fixed] @ col_lower[fixed]
+            row_lower -= shift
+            row_upper -= shift
+            A = A @ sp.diags((~fixed).astype(float))
+            A.eliminate_zeros()
+            substituted |= fixed
+
+        row_nnz = np.diff(A.indptr)
+
+        # Empty rows only need their bounds to admit zero
+        empty = keep & (row_nnz == 0) & (row_lower <= TOLERANCE) & (row_upper >= -TOLERANCE)
+        keep &= ~empty
+        stats['implied_rows'] += int(empty.sum())
+
+        # Single-variable rows become column bounds
+        singleton = np.flatnonzero(keep & (row_nnz == 1))
+        if len(singleton):
+            cols = A.indices[A.indptr[singleton]]
+            coef = A.data[A.indptr[singleton]]
+            with np.errstate(invalid='ignore'):
+                lo = np.where(coef > 0, row_lower[singleton] / coef, row_upper[singleton] / coef)
+                hi = np.where(coef > 0, row_upper[singleton] / coef, row_lower[singleton] / coef)
+            new_lower, new_upper = col_lower.copy(), col_upper.copy()
+            np.maximum.at(new_lower, cols, lo)
+            np.minimum.at(new_upper, cols, hi)
+            # Leave contradictory rows in place so the solver reports the infeasibility
+            consistent = new_lower[cols] <= new_upper[cols] + TOLERANCE
+            ok = np.unique(cols[consistent])
+            stats['bounds_tightened'] += int(np.sum((new_lower[ok] > col_lower[ok]) | (new_upper[ok] < col_upper[ok])))
+            col_lower[ok], col_upper[ok] = new_lower[ok], np.maximum(new_upper[ok], new_lower[ok])
+            keep[singleton[consistent]] = False
+            stats['singleton_rows'] += int(consistent.sum())
+            folded.append((singleton[consistent], cols[consistent], coef[consistent], lo[consistent],
+                           hi[consistent]))
+
+        # Rows whose activity range already lies within their bounds
+        A_pos, A_neg = A.maximum(0), A.minimum(0)
+        with np.errstate(invalid='ignore'):
+            min_activity = A_pos @ col_lower + A_neg @ col_upper
+            max_activity = A_pos @ col_upper + A_neg @ col_lower
+        implied = keep & (min_activity >= row_lower - TOLERANCE) & (max_activity <= row_upper + TOLERANCE)
+        keep &= ~implied
+        stats['implied_rows'] += int(implied.sum())
+
+        # Identical rows: merge their bounds into the first and drop the rest
+        duplicates = _duplicate_rows(A, keep)
+        for first, others in duplicates:
+            row_lower[first] = max(row_lower[first], row_lower[others].max())
+            row_upper[first] = min(row_upper[first], row_upper[others].min())
+            keep[others] = False
+            stats['duplicate_rows'] += len(others)
+
+        if keep.sum() == removed:
+            break
+
+    A_reduced = A[keep]
+    kept = np.concatenate([[0], np.cumsum(keep)])
+    stats.update({
+        'rows_before': n_rows,
+        'rows_after': int(keep.sum()),
+        'rows_removed': int(n_rows - keep.sum()),
+        'nonzeros_before': nnz,
+        'nonzeros_after': A_reduced.nnz,
+        'nonzeros_removed': int(nnz - A_reduced.nnz),
+    })
+
+    return {
+        **model,
+        'A': A_reduced,
+        'row_lower': row_lower[keep],
+        'row_upper': row_upper[keep],
+        'row_blocks': {name: (int(kept[start]), int(kept[stop])) for name, (start, stop) in model['row_blocks'].items()},
+        'original_row_blocks': model['row_blocks'],
+        'kept_rows': np.flatnonzero(keep),
+        # Single-variable rows that became column bounds, for mapping their duals back
+        'folded_rows': {key: np.concatenate([part[k] for part in folded]) if folded else np.zeros(0)
+                        for k, key in enumerate(['row', 'col', 'coef', 'lower', 'upper'])},
+        'original_col_lower': model['col_lower'],
+        'original_col_upper': model['col_upper'],
+        # Fixed columns and their entries before substitution; the solver's reduced cost of
+        # such a column leaves out the rows it was taken out of
+        'substituted_cols': np.flatnonzero(substituted),
+        'substituted_matrix': original[:, np.flatnonzero(substituted)],
+        'col_lower': col_lower,
+        'col_upper': col_upper,
+        'presolve': stats,
+    }
+
+
+def _duplicate_rows(A, keep):
+    # Hash rows with two random projections, then confirm candidates exactly
+    rng = np.random.default_rng(0)
+    h1 = A @ rng.random(A.shape[1])
+    h2 = A @ rng.random(A.shape[1])
+    rows = np.flatnonzero(keep & (np.diff(A.indptr) > 0))
+    order = np.lexsort((h2[rows], h1[rows]))
+    rows = rows[order]
+    same = (h1[rows[1:]] == h1[rows[:-1]]) & (h2[rows[1:]] == h2[rows[:-1]])
+
+    duplicates = []
+    start = 0
+    for i in range(1, len(rows) + 1):
+        if i < len(rows) and same[i - 1]:
+            continue
+        group = rows[start:i]
+        if len(group) > 1:
+            first = group.min()
+            others = [r for r in group if r != first and _same_row(A, first, r)]
+            if others:
+                duplicates.append((first, np.array(others)))
+        start = i
+    return duplicates
+
+
+def _same_row(A, i, j):
+    a = slice(A.indptr[i], A.indptr[i + 1])
+    b = slice(A.indptr[j], A.indptr[j + 1])
+    return np.array_equal(A.indices[a], A.indices[b]) and np.array_equal(A.data[a], A.data[b])
+
+
+def reduce_problem(prob):
+    """
+    The same reduction for a PuLP LpProblem, applied in place before prob.solve():
+    single-variable constraints become variable bounds, constraints implied by the
+    bounds are deleted and duplicate constraints are merged. Unlike reduce_model, no
+    record of the folded constraints is kept, so their duals are not mapped back; the
+    PuLP path reads no duals.
+    """
+    n_rows = len(prob.constraints)
+    nnz = sum(len(c) for c in prob.constraints.values())
+    stats = {'singleton_rows': 0, 'implied_rows': 0, 'duplicate_rows': 0, 'bounds_tightened': 0}
+
+    # Single-variable constraints: a * x + k (sense) 0
+    for name, c in list(prob.constraints.items()):
+        if len(c) == 0 and _satisfied(c.sense, c.constant):
+            del prob.constraints[name]
+            stats['implied_rows'] += 1
+            continue
+        if len(c) != 1:
+            continue
+        var, coef = next(iter(c.items()))
+        bound = -c.constant / coef
+        lower = var.lowBound if var.lowBound is not None else -np.inf
+        upper = var.upBound if var.upBound is not None else np.inf
+        sense = c.sense if coef > 0 else -c.sense
+        new_lower = max(lower, bound) if sense >= 0 else lower
+        new_upper = min(upper, bound) if sense <= 0 else upper
+        if new_lower > new_upper + TOLERANCE:
+            continue
+        if new_lower > lower or new_upper < upper:
+            stats['bounds_tightened'] += 1
+        var.lowBound = None if np.isinf(new_lower) else new_lower
+        var.upBound = None if np.isinf(new_upper) else new_upper
+        del prob.constraints[name]
+        stats['singleton_rows'] += 1
+
+    # Constraints implied by the variable bounds
+    for name, c in list(prob.constraints.items()):
+        min_activity, max_activity = c.constant, c.constant
+        for var, coef in c.items():
+            lower = var.lowBound if var.lowBound is not None else -np.inf
+            upper = var.upBound if var.upBound is not None else np.inf
+            min_activity += coef * (lower if coef > 0 else upper)
+            max_activity += coef * (upper if coef > 0 else lower)
+        if (c.sense <= 0 and max_activity <= TOLERANCE and (c.sense < 0 or min_activity >= -TOLERANCE)) or \
+                (c.sense > 0 and min_activity >= -TOLERANCE):
+            del prob.constraints[name]
+            stats['implied_rows'] += 1
+
+    # Duplicate constraints: same terms and sense, keep the tightest constant
+    seen = {}
+    for name, c in list(prob.constraints.items()):
+        key = (c.sense, frozenset((var.name, coef) for var, coef in c.items()))
+        if key not in seen:
+            seen[key] = name
+            continue
+        first = prob.constraints[seen[key]]
+        if c.sense < 0:
+            first.constant = max(first.constant, c.constant)
+        elif c.sense > 0:
+            first.constant = min(first.constant, c.constant)
+        elif first.constant != c.constant:
+            continue
+        del prob.constraints[name]
+        stats['duplicate_rows'] += 1
+
+    nnz_after = sum(len(c) for c in prob.constraints.values())
+    stats.update({
+        'rows_before': n_rows,
+        'rows_after': len(prob.constraints),
+        'rows_removed': n_rows - len(prob.constraints),
+        'nonzeros_before': nnz,
+        'nonzeros_after': nnz_after,
+        'nonzeros_removed': nnz - nnz_after,
+    })
+    return stats
+
+
+def _satisfied(sense, constant):
+    # Constraint with no variables: constant (sense) 0
+    if sense < 0:
+        return constant <= TOLERANCE
+    if sense > 0:
+        return constant >= -TOLERANCE
+    return abs(constant) <= TOLERANCE
+
+
+def format_stats(stats):
+    return (f"Presolve removed {stats['rows_removed']} of {stats['rows_before']} rows and "
+            f"{stats['nonzeros_removed']} of {stats['nonzeros_before']} nonzeros "
+            f"({stats['singleton_rows']} single-variable, {stats['implied_rows']} implied, "
+            f"{stats['duplicate_rows']} duplicate)")
@@ -0,0 +1,119 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DEMAND_COLUMNS = ['Demand']
+GENERATION_COLUMNS = ['Solar Capacity Factor', 'Wind Capacity Factor']
+
+# Parsed profiles are kept here as .npy files named by the hash of the source file;
+# set DISPATCH_PROFILE_CACHE to move them
+CACHE_DIR = os.environ.get('DISPATCH_PROFILE_CACHE', os.path.join(tempfile.gettempdir(), 'dispatch_profiles'))
+
+
+def read_table(source, columns, name):
+    """
+    Parses only the required columns of an Excel (.xlsx/.xls) or CSV file. source is a
+    path or the file contents as bytes; name gives the extension and is used in errors.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    ext = os.path.splitext(name)[1].lower()
+    wanted = set(columns)
+    if ext == '.csv':
+        table = pd.read_csv(source, usecols=lambda c: c in wanted)
+    elif ext in ('.xlsx', '.xls'):
+        table = pd.read_excel(source, usecols=lambda c: c in wanted)
+    else:
+        raise ValueError(f"{name}: unsupported profile format '{ext}' (use .xlsx or .csv)")
+    return validate_table(table, columns, name)
+
+
+def validate_table(table, columns, name):
+    # Fail on missing columns, empty files and blank or non-numeric cells before any
+    # model is built; rows are reported as spreadsheet rows (header is row 1)
+    missing = [c for c in columns if c not in table.columns]
+    if missing:
+        raise ValueError(f"{name}: missing column(s) {', '.join(missing)}")
+    if table.empty:
+        raise ValueError(f"{name}: no data rows")
+    numeric = table[columns].apply(pd.to_numeric, errors='coerce')
+    for column in columns:
+        bad = np.flatnonzero(numeric[column].isna().to_numpy())
+        if len(bad):
+            rows = ', '.join(str(r + 2) for r in bad[:5]) + (', ...' if len(bad) > 5 else '')
+            raise ValueError(f"{name}: column '{column}' has blank or non-numeric values in row(s) {rows}")
+    return numeric.astype(float)
+
+
+def load_profile(source, columns, name=None, cache_dir=None):
+    """
+    Loads the given columns of a profile file (path or bytes) as a float DataFrame.
+    The first load parses and validates the file and saves the values as .npy, keyed by
+    a hash of the file contents and the columns; later loads memory-map that file.
+    """
+    name = name or str(source)
+    if isinstance(source, bytes):
+        contents = source
+    else:
+        with open(source, 'rb') as f:
+            contents = f.read()
+    key = hashlib.sha256(contents + repr(list(columns)).encode()).hexdigest()
+    cache_dir = cache_dir or CACHE_DIR
+    path = os.path.join(cache_dir, f'{key}.npy')
+
+    try:
+        values = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        values = read_table(contents, columns, name).to_numpy()
+        try:
+            # Written under a temporary name first so a concurrent load never sees half a file
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                np.save(f, values)
+            os.replace(tmp, path)
+            values = np.load(path, mmap_mode='r')
+        except OSError:
+            pass  # Cache not writable: use the parsed values directly
+    return pd.DataFrame(values, columns=list(columns), copy=False)
+
+
+def load_profiles(demand_source, generation_source, demand_name=None, generation_name=None, cache_dir=None):
+    """
+    Loads the demand and generation profiles and checks that they cover the same hours.
+    Returns (demand_profile, generation_profiles).
+    """
+    demand = load_profile(demand_source, DEMAND_COLUMNS, demand_name, cache_dir)
+    generation = load_profile(generation_source, GENERATION_COLUMNS, generation_name, cache_dir)
+    if len(demand) != len(generation):
+        raise ValueError(f"The demand profile has {len(demand)} rows but the generation profiles have "
+                         f"{len(generation)}; both must cover the same hours")
+    return demand, generation
+
+
+def tile(values, length):
+    # Row t is values[t % len(values)]: a base week repeats to fill the horizon, while a
+    # profile that is already long enough (e.g. a full year) is sliced without copying
+    values = np.asarray(values, dtype=float)
+    if len(values) >= length:
+        return values[:length]
+    return np.resize(values, length)
+
+
+def build_data(demand_profile, generation_profiles, capacities, n_rows):
+    """
+    The model input table (solar, wind and demand in MW) over n_rows profile rows.
+    Generation is capacity x capacity factor, computed once on the base profile; the
+    three columns are then tiled to n_rows, so the base frames are never replicated.
+    """
+    solar = generation_profiles['Solar Capacity Factor'].to_numpy(dtype=float) * capacities['solar']
+    wind = generation_profiles['Wind Capacity Factor'].to_numpy(dtype=float) * capacities['wind']
+    return pd.DataFrame({
+        'Solar Generation (MW)': tile(solar, n_rows),
+        'Wind Generation (MW)': tile(wind, n_rows),
+        'Demand (MW)': tile(demand_profile['Demand'], n_rows),
+    }, copy=False)
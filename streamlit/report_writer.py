@@ -0,0 +1,198 @@
+import os
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from model_builder import CONVENTIONAL
+
+REPORT_FORMATS = ['xlsx', 'csv', 'parquet']
+
+# Column groups of the hourly breakdown, for filtering it by flow type
+FLOW_TYPES = ['Renewables', 'Storage discharge', 'Conventional', 'Unmet demand & curtailment', 'Storage charge',
+              'Demand & balance']
+
+
+def step_hours(n_steps, time_step=1.0):
+    # Hour at the start of each step; whole-hour steps stay integers so labels read 0, 1, 2
+    hours = np.arange(n_steps) * time_step
+    return hours.astype(int) if float(time_step).is_integer() else hours
+
+
+def build_report(time_horizon, data, storage, solution, costs, time_step=1.0):
+    """
+    Returns the Detailed Report (one row per time step of time_step hours, with costs per
+    step) and the one-row Summary as DataFrames, computed column by column from the
+    solution table.
+    """
+    dt = time_step
+    names = list(storage['name'])
+    v = {name: solution[name].to_numpy(dtype=float)[:time_horizon] for name in solution.columns}
+    solar = data['Solar Generation (MW)'].to_numpy(dtype=float)[:time_horizon]
+    wind = data['Wind Generation (MW)'].to_numpy(dtype=float)[:time_horizon]
+    demand = data['Demand (MW)'].to_numpy(dtype=float)[:time_horizon]
+    zeros = np.zeros(time_horizon)
+    discharge = sum((v[f'Discharge_{name}'] for name in names), zeros)
+    charge = sum((v[f'Charge_{name}'] for name in names), zeros)
+    generation = sum((v[f'Gen_{gen}'] for gen in CONVENTIONAL), zeros)
+
+    report = {
+        'Hour': step_hours(time_horizon, dt),
+        'Solar Generation (MW)': solar,
+        'Wind Generation (MW)': wind,
+    }
+    for name in names:
+        report[f'{name} Discharge (MW)'] = v[f'Discharge_{name}']
+    for gen in CONVENTIONAL:
+        report[f'{gen} Generation (MW)'] = v[f'Gen_{gen}']
+    report['Unmet Demand (MW)'] = v['Unmet_Demand']
+    report['Curtailment (MW)'] = v['Curtailment']
+    for name in names:
+        report[f'{name} Charge (MW)'] = v[f'Charge_{name}']
+    report['Total Generation (MW)'] = solar + wind + generation
+    report['Total Demand (MW)'] = demand
+    report['Balance Check (MW)'] = solar + wind + discharge + generation - charge - v['Curtailment'] + v['Unmet_Demand']
+    # Powers are MW averaged over the step, so each step costs price x power x dt
+    report['Solar Cost (£)'] = costs['solar'] * solar * dt
+    report['Wind Cost (£)'] = costs['wind'] * wind * dt
+    for tech in storage.itertuples():
+        report[f'{tech.name} Charge Cost (£)'] = tech.charge_cost * v[f'Charge_{tech.name}'] * dt
+        report[f'{tech.name} Discharge Cost (£)'] = tech.discharge_cost * v[f'Discharge_{tech.name}'] * dt
+    report['Unmet Demand Cost (£)'] = costs['unmet_demand'] * v['Unmet_Demand'] * dt
+    report['Curtailment Cost (£)'] = costs['curtailment'] * v['Curtailment'] * dt
+    report['Total Cost (£)'] = (report['Solar Cost (£)'] + report['Wind Cost (£)'] +
+                                sum(report[f'{name} Charge Cost (£)'] + report[f'{name} Discharge Cost (£)'] for name in names) +
+                                report['Unmet Demand Cost (£)'] + report['Curtailment Cost (£)'])
+    df_report = pd.DataFrame(report)
+
+    total_cost = df_report['Total Cost (£)'].sum()
+    summary = {
+        'Total Solar Generation (MWh)': solar.sum() * dt,
+        'Total Wind Generation (MWh)': wind.sum() * dt,
+    }
+    for name in names:
+        summary[f'Total {name} Discharge (MWh)'] = v[f'Discharge_{name}'].sum() * dt
+    for gen in CONVENTIONAL:
+        summary[f'Total {gen} Generation (MWh)'] = v[f'Gen_{gen}'].sum() * dt
+    summary['Total Unmet Demand (MWh)'] = v['Unmet_Demand'].sum() * dt
+    summary['Total Curtailment (MWh)'] = v['Curtailment'].sum() * dt
+    for name in names:
+        summary[f'Total {name} Charge (MWh)'] = v[f'Charge_{name}'].sum() * dt
+    summary['Total Generation (MWh)'] = df_report['Total Generation (MW)'].sum() * dt
+    summary['Total Demand (MWh)'] = demand.sum() * dt
+    summary['Average Cost (£/MWh)'] = total_cost / (time_horizon * dt)
+    summary['Total Cost (£)'] = total_cost
+    df_summary = pd.DataFrame([summary])
+
+    return df_report, df_summary
+
+
+def hourly_breakdown(time_horizon, data, storage, solution, time_step=1.0, start=0, stop=None, flows=None,
+                     period=None):
+    """
+    The hourly breakdown (MW in each step) of steps start to stop. Only those rows of the
+    solution columns are read, and only the columns of the chosen FLOW_TYPES (all by
+    default) are computed. With period in hours (e.g. 24 or 168) the steps are summed
+    into MWh per period, counted from hour 0; Hour is then the start of each period.
+    """
+    dt = time_step
+    stop = time_horizon if stop is None else min(stop, time_horizon)
+    flows = FLOW_TYPES if flows is None else flows
+    names = list(storage['name'])
+    rows = slice(start, stop)
+
+    def series(name):
+        return solution[name].to_numpy(dtype=float)[rows]
+
+    def profile(column):
+        return data[column].to_numpy(dtype=float)[rows]
+
+    table = {'Hour': step_hours(stop, dt)[start:]}
+    if 'Renewables' in flows:
+        table['Solar Generation (MW)'] = profile('Solar Generation (MW)')
+        table['Wind Generation (MW)'] = profile('Wind Generation (MW)')
+    if 'Storage discharge' in flows:
+        for name in names:
+            table[f'{name} Discharge (MW)'] = series(f'Discharge_{name}')
+    if 'Conventional' in flows:
+        for gen in CONVENTIONAL:
+            table[f'{gen} Generation (MW)'] = series(f'Gen_{gen}')
+    if 'Unmet demand & curtailment' in flows:
+        table['Unmet Demand (MW)'] = series('Unmet_Demand')
+        table['Curtailment (MW)'] = series('Curtailment')
+    if 'Storage charge' in flows:
+        for name in names:
+            table[f'{name} Charge (MW)'] = series(f'Charge_{name}')
+    if 'Demand & balance' in flows:
+        supply = (profile('Solar Generation (MW)') + profile('Wind Generation (MW)') +
+                  sum(series(f'Discharge_{name}') for name in names) + sum(series(f'Gen_{gen}') for gen in CONVENTIONAL))
+        charge = sum((series(f'Charge_{name}') for name in names), np.zeros(stop - start))
+        table['Total Demand (MW)'] = profile('Demand (MW)')
+        table['Total Generation (MW)'] = supply
+        table['Balance Check (MW)'] = supply - charge - series('Curtailment') + series('Unmet_Demand')
+    breakdown = pd.DataFrame(table)
+    if period is None:
+        return breakdown
+
+    # MW over each step x dt, summed per period
+    per = max(1, int(round(period / dt)))
+    group = np.arange(start, stop) // per
+    energy = breakdown.drop(columns='Hour').mul(dt).groupby(group).sum()
+    energy.columns = [column.replace('(MW)', '(MWh)') for column in energy.columns]
+    energy.insert(0, 'Hour', step_hours(int(group[-1]) + 1, per * dt)[energy.index] if len(group) else [])
+    return energy.reset_index(drop=True)
+
+
+def write_table(filename, df, sheet_name='Sheet1'):
+    # One table as .xlsx, .csv or .parquet, by the extension of filename
+    ext = os.path.splitext(filename)[1].lstrip('.')
+    if ext == 'xlsx':
+        write_excel(filename, {sheet_name: df})
+    elif ext == 'csv':
+        df.to_csv(filename, index=False)
+    elif ext == 'parquet':
+        df.to_parquet(filename, index=False)
+    else:
+        raise ValueError(f"Unknown table format: {filename} (use .xlsx, .csv or .parquet)")
+
+
+def write_excel(filename, sheets):
+    # constant_memory flushes each row to disk once the next one starts, so rows must be
+    # written in order; pandas' own writer goes column by column and cannot use it
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True, 'nan_inf_to_errors': True})
+    header = workbook.add_format({'bold': True})
+    for sheet_name, df in sheets.items():
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, list(df.columns), header)
+        for r, row in enumerate(df.itertuples(index=False, name=None), 1):
+            worksheet.write_row(r, 0, row)
+    workbook.close()
+
+
+def write_report(filename, df_report, df_summary, formats=None):
+    """
+    Writes the report in each of formats ('xlsx', 'csv', 'parquet'; by default the
+    extension of filename). Excel gets both sheets in one workbook; CSV and Parquet write
+    the detailed report to <name>.<ext> and the summary to <name>_summary.<ext>.
+    Returns the paths written.
+    """
+    stem, ext = os.path.splitext(filename)
+    formats = formats or [ext.lstrip('.') or 'xlsx']
+    paths = []
+    for fmt in formats:
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"Unknown report format: {fmt}")
+        path = f'{stem}.{fmt}'
+        summary_path = f'{stem}_summary.{fmt}'
+        if fmt == 'xlsx':
+            write_excel(path, {'Detailed Report': df_report, 'Summary': df_summary})
+            paths.append(path)
+        elif fmt == 'csv':
+            df_report.to_csv(path, index=False)
+            df_summary.to_csv(summary_path, index=False)
+            paths += [path, summary_path]
+        else:
+            df_report.to_parquet(path, index=False)
+            df_summary.to_parquet(summary_path, index=False)
+            paths += [path, summary_path]
+    return paths
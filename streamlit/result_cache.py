@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+def fingerprint(data, time_horizon, costs, capacities, storage, settings=None):
+    """
+    Content hash of everything that determines a solved result: the profiles, horizon,
+    cost and capacity dicts, the storage registry and any solve settings.
+    """
+    h = hashlib.sha256()
+    h.update(str(time_horizon).encode())
+    h.update(np.ascontiguousarray(data.to_numpy(dtype=float)).tobytes())
+    h.update(json.dumps({'costs': costs, 'capacities': capacities, 'settings': settings or {}},
+                        sort_keys=True, default=str).encode())
+    h.update(storage.to_csv(index=False).encode())
+    return h.hexdigest()
+
+
+def compact_result(status, objective, solution, **extra):
+    # Solved values as one array per series
+    values = {name: solution[name].to_numpy(dtype=float) for name in solution.columns}
+    return {'status': status, 'objective': objective, 'values': values, **extra}
+
+
+def result_nbytes(result):
+    return sum(series.nbytes for series in result['values'].values())
+
+
+class ResultCache:
+    """
+    LRU cache of compact results bounded by the bytes of their arrays. Entries evicted from
+    memory are written to spill_dir (if set) and read back on a later hit.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        result = self._load(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.put(key, result)
+        return result
+
+    def put(self, key, result):
+        if key in self.entries:
+            self.nbytes -= result_nbytes(self.entries.pop(key))
+        self.entries[key] = result
+        self.nbytes += result_nbytes(result)
+        # Evict least recently used entries, but always keep the newest one
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            old_key, old = self.entries.popitem(last=False)
+            self.nbytes -= result_nbytes(old)
+            self._spill(old_key, old)
+
+    def _path(self, key):
+        return os.path.join(self.spill_dir, f'{key}.npz')
+
+    def _spill(self, key, result):
+        if not self.spill_dir or os.path.exists(self._path(key)):
+            return
+        meta = {k: v for k, v in result.items() if k != 'values'}
+        meta['series'] = list(result['values'])
+        tmp = self._path(key) + '.tmp.npz'
+        np.savez(tmp, _meta=np.array(json.dumps(meta, default=str)),
+                 **{f'v{k}': series for k, series in enumerate(result['values'].values())})
+        os.replace(tmp, self._path(key))
+
+    def _load(self, key):
+        if not self.spill_dir or not os.path.exists(self._path(key)):
+            return None
+        with np.load(self._path(key), allow_pickle=False) as npz:
+            meta = json.loads(str(npz['_meta']))
+            values = {name: npz[f'v{k}'] for k, name in enumerate(meta.pop('series'))}
+        return {**meta, 'values': values}
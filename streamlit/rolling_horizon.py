@@ -0,0 +1,97 @@
+import numpy as np
+
+import model_builder as mb
+import presolve as ps
+import solvers as sv
+import performance as pf
+import storage as sr
+from model_builder import MIN_UP_TIME, MIN_DOWN_TIME, RAMPED, COMMITTED
+
+
+def run_rolling_horizon(data, time_horizon, costs, capacities, efficiencies=None, storage=None,
+                        window=336, overlap=168, presolve=True, time_step=1.0, solver=None):
+    """
+    Solves the dispatch problem as a sequence of overlapping windows of `window` hours.
+    Only the first `window - overlap` hours of each window are committed; the end-of-commit
+    SOC of every storage technology and the recent conventional output are carried into
+    the next window. Returns the same (model, status, solution) as run_optimization,
+    with the solution stitched over the whole horizon. window and overlap are in hours;
+    time_horizon counts steps of time_step hours; solver takes the settings of
+    solvers.DEFAULT_OPTIONS and applies to every window.
+    """
+    if storage is None:
+        storage = sr.registry_from_inputs(capacities, efficiencies, costs)
+
+    window, overlap = mb.steps(window, time_step), int(round(overlap / time_step))
+    if window <= overlap:
+        raise ValueError("The rolling-horizon window must be longer than the overlap")
+    step = window - overlap
+    history = max(mb.steps(MIN_UP_TIME, time_step), mb.steps(MIN_DOWN_TIME, time_step), 1)
+    values = {}
+    objective = 0.0
+    status = 'Optimal'
+    windows = []
+    stats = []
+    performance = []
+    state = None
+
+    start = 0
+    while start < time_horizon:
+        end = min(start + window, time_horizon)
+        length = end - start
+        commit = length if end == time_horizon else step
+
+        window_data = data.iloc[start:end].reset_index(drop=True)
+        label = f'window {len(windows) + 1}'
+        with pf.phase(performance, 'build', label=label) as entry:
+            model = mb.build_model(window_data, length, costs, capacities, storage=storage, initial_state=state,
+                                   time_step=time_step)
+            entry.update(pf.model_size(model))
+        if presolve:
+            with pf.phase(performance, 'presolve', label=label) as entry:
+                model = ps.reduce_model(model)
+                entry.update(pf.model_size(model))
+        with pf.phase(performance, 'solve', label=label, **pf.model_size(model)) as entry:
+            window_status, x, _, window_stats = sv.solve_model(model, solver)
+            entry.update(iterations=window_stats['iterations'], solver_seconds=window_stats['solve_time'])
+        stats.append(window_stats)
+        windows.append({'start': start, 'end': end, 'status': window_status,
+                        'rows': model['A'].shape[0], 'columns': model['A'].shape[1],
+                        'solve_time': window_stats['solve_time'], 'iterations': window_stats['iterations']})
+        if x is None:
+            status = window_status
+            break
+        if window_status != 'Optimal' and status == 'Optimal':
+            status = window_status
+
+        # Commit the first hours of the window
+        with pf.phase(performance, 'extract', label=label):
+            for name, series in mb.extract_values(model, x).items():
+                values.setdefault(name, np.zeros(time_horizon))[start:start + commit] = series[:commit]
+        n_series = len(model['series'])
+        objective += float(np.sum(model['c'].reshape(n_series, length)[:, :commit] *
+                                  x.reshape(n_series, length)[:, :commit]))
+        objective += time_step * (costs['solar'] * window_data['Solar Generation (MW)'][:commit].sum() +
+                                  costs['wind'] * window_data['Wind Generation (MW)'][:commit].sum())
+
+        # Carry SOC and recent conventional output into the next window
+        done = start + commit
+        state = {
+            'soc': [values[f'SOC_{name}'][done - 1] for name in storage['name']],
+            'generation': {name: values[f'Gen_{name}'][max(0, done - history):done]
+                           for name in set(RAMPED) | set(COMMITTED)},
+        }
+        start = done
+
+    info = {
+        'time_horizon': time_horizon,
+        'time_step': time_step,
+        'storage': list(storage['name']),
+        'objective': objective if status == 'Optimal' else None,
+        'solver': sv.combine_stats(stats, status, objective if status == 'Optimal' else None),
+        'windows': windows,
+        'performance': performance,
+    }
+    with pf.phase(performance, 'extract', label='stitch'):
+        solution = mb.make_solution(values if status == 'Optimal' else {})
+    return info, status, solution
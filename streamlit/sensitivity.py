@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+import expansion as ex
+import model_builder as mb
+import presolve as ps
+import report_writer as rw
+
+# Sensitivities of a solved dispatch LP, read from its duals instead of re-solving with
+# perturbed inputs. A row dual is the change in total cost per unit increase of the row's
+# bound; a column's reduced cost is the same for its active bound.
+
+
+def hourly_prices(model):
+    """
+    Marginal system cost of each step (£/MWh): the dual of its demand-supply row, per MWh
+    of the step. None when the model has no duals.
+    """
+    duals = model.get('duals')
+    if duals is None:
+        return None
+    rows = mb.extract_duals(model, duals['row'], duals['column'])['Demand_Supply_Constraint']
+    prices = pd.Series(rows / model['time_step'], name='Price (£/MWh)')
+    prices.index.name = 'Hour'
+    return prices
+
+
+def price_duration(prices, time_step=1.0):
+    # Prices from highest to lowest against the hours the price is at or above that level
+    ordered = np.sort(np.asarray(prices, dtype=float))[::-1]
+    return pd.DataFrame({'Hours': np.arange(1, len(ordered) + 1) * time_step, 'Price (£/MWh)': ordered})
+
+
+def storage_values(model):
+    """
+    Value of one more MWh stored in each technology at the end of each step (£/MWh): minus
+    the dual of its state-of-charge balance row, as extra energy lowers the cost; one
+    column per technology (NaN in the first step, whose state is fixed). None when the
+    model has no duals.
+    """
+    duals = model.get('duals')
+    if duals is None:
+        return None
+    rows = mb.extract_duals(model, duals['row'], duals['column'])['Storage_SOC']
+    K, T = len(model['storage']), model['time_horizon']
+    # Without a carried-over state there is no balance row for the first step
+    n = len(rows) // K if K else T
+    values = pd.DataFrame(np.full((T, K), np.nan), columns=model['storage'])
+    values.iloc[T - n:] = -rows.reshape(K, n).T
+    values.index.name = 'Hour'
+    return values
+
+
+def reduced_costs(model):
+    # Reduced cost of every column as one array per series, or None without duals
+    duals = model.get('duals')
+    if duals is None:
+        return None
+    return mb.extract_values(model, duals['column'])
+
+
+def cost_ranging(model):
+    """
+    Cost ranging per series from model['ranging']: the current cost (£/MWh) and the
+    narrowest range any single step of the series allows before the optimal dispatch
+    changes. None when the solver gave no ranging.
+    """
+    ranging = model.get('ranging')
+    if ranging is None:
+        return None
+    dt = model['time_step']
+    cost, down, up = (mb.extract_values(model, values) for values in
+                      (model['c'], ranging['cost_down'], ranging['cost_up']))
+    return pd.DataFrame([
+        {'Series': name, 'Cost (£/MWh)': cost[name].mean() / dt, 'Lowest Cost (£/MWh)': (down[name] / dt).max(),
+         'Highest Cost (£/MWh)': (up[name] / dt).min()}
+        for name in model['series']
+    ])
+
+
+def _same_rows(model, changed):
+    # A presolved model cut down to the rows presolve kept in the solved one, or None when
+    # it dropped any of them. Rows only the changed model keeps were implied, so not
+    # binding, at the solved point.
+    kept, changed_kept = model['kept_rows'], changed['kept_rows']
+    if not np.isin(kept, changed_kept).all():
+        return None
+    rows = np.searchsorted(changed_kept, kept)
+    return {**changed, 'A': changed['A'][rows], 'row_lower': changed['row_lower'][rows],
+            'row_upper': changed['row_upper'][rows]}
+
+
+def capacity_values(model, x, data, costs, capacities, storage, candidates=None):
+    """
+    Marginal value of each capacity (£ per extra MW, or MWh for storage, over the
+    horizon and per year): minus the change in total cost, from the duals of the bounds
+    the capacity moves. candidates are keys of capacities or storage names (default
+    every storage technology and every generator); renewables need a capacity above zero
+    to scale their profiles from.
+
+    The bounds and coefficients are differenced from a model rebuilt with one more unit
+    (presolved the same way as the solved model, whose solution is x), so no extra solve
+    is needed. The value holds while the optimal basis does; a capacity whose change makes
+    presolve drop a row of the solved model gets NaN.
+    """
+    duals = model.get('duals')
+    if duals is None:
+        return None
+    if candidates is None:
+        candidates = list(storage['name']) + [name for name in ex.GENERATION
+                                              if name not in ex.RENEWABLES or capacities[name] > 0]
+    T, dt = model['time_horizon'], model['time_step']
+    # A positive dual prices the lower bound, a negative one the upper bound (as in expansion)
+    row, column = duals['row'], duals['column']
+    weights = np.concatenate([np.maximum(row, 0), np.minimum(row, 0), np.maximum(column, 0), np.minimum(column, 0)])
+    base = ex.stacked_bounds(model)
+
+    records = []
+    for name in candidates:
+        current = (storage.loc[storage['name'] == name, 'capacity'].iloc[0] if name not in ex.GENERATION
+                   else capacities[name])
+        caps, registry = ex.set_capacities(capacities, storage, {name: current + 1.0})
+        changed = mb.build_model(ex.scale_profiles(data, capacities, {name: current + 1.0})
+                                 if name in ex.RENEWABLES else data, T, costs, caps, storage=registry, time_step=dt)
+        if 'kept_rows' in model:
+            changed = _same_rows(model, ps.reduce_model(changed))
+        gradient = np.nan
+        if changed is not None:
+            # A coefficient change moves the cost by -dual * change * value (e.g. the
+            # minimum up/down rows of the committed units carry their capacity)
+            gradient = (ex.bound_change(base, ex.stacked_bounds(changed)) @ weights
+                        - row @ ((changed['A'] - model['A']) @ x)
+                        + changed['objective_constant'] - model['objective_constant'])
+        records.append({'Asset': name, 'Capacity': current, 'Unit': 'MW' if name in ex.GENERATION else 'MWh',
+                        'Marginal Value (£)': -gradient,
+                        'Marginal Value (£/year)': -gradient * ex.HOURS_PER_YEAR / (T * dt)})
+    return pd.DataFrame(records)
+
+
+def analyse(model, x, data, costs, capacities, storage):
+    """
+    Every sensitivity of a dispatch model from optimisation.run_matrix_optimization, solved
+    with solution x: hourly prices and their duration curve, storage energy values,
+    capacity values, cost ranging and the reduced cost of every series, keyed by name.
+    None when the model has no duals.
+    """
+    prices = hourly_prices(model)
+    if prices is None:
+        return None
+    return {
+        'prices': prices,
+        'price_duration': price_duration(prices, model['time_step']),
+        'storage_values': storage_values(model),
+        'capacity_values': capacity_values(model, x, data, costs, capacities, storage),
+        'cost_ranging': cost_ranging(model),
+        'reduced_costs': reduced_costs(model),
+    }
+
+
+def compact(sensitivity):
+    # The prices and capacity values as plain lists, for the result cache (which spills to JSON)
+    if sensitivity is None:
+        return None
+    return {'prices': sensitivity['prices'].tolist(),
+            'capacity_values': sensitivity['capacity_values'].to_dict('records')}
+
+
+def format_capacity_values(table):
+    lines = ["Marginal value of one more unit of capacity:"]
+    for row in table.itertuples(index=False):
+        lines.append(f"  {row.Asset}: £{row[3]:,.2f} over the horizon (£{row[4]:,.2f}/year) per {row.Unit}")
+    return '\n'.join(lines)
+
+
+def write_report(filename, sensitivity):
+    # The sensitivity tables as sheets of one workbook
+    sheets = {'Prices': sensitivity['prices'].reset_index(),
+              'Price Duration': sensitivity['price_duration'],
+              'Storage Values': sensitivity['storage_values'].reset_index(),
+              'Capacity Values': sensitivity['capacity_values']}
+    if sensitivity['cost_ranging'] is not None:
+        sheets['Cost Ranging'] = sensitivity['cost_ranging']
+    rw.write_excel(filename, sheets)
+    return filename
@@ -0,0 +1,306 @@
+import inspect
+import os
+import tempfile
+
+import highspy
+import numpy as np
+import pulp
+
+METHODS = ['choose', 'simplex', 'ipm']
+
+# Solver settings accepted by every solve path:
+#   backend     'highs' solves the model arrays in-process; any other PuLP solver
+#               ('cbc', 'glpk', ...) is handed the model as an MPS file
+#   method      'choose' (solver default), 'simplex' or 'ipm' (interior point)
+#   threads     worker threads, 0 for every core, None for the solver default
+#   time_limit  seconds, None for no limit
+#   mip_gap     relative optimality gap for MIPs, None for the solver default
+#   log_file    HiGHS log file that can be tailed while the solve runs, None for no log
+DEFAULT_OPTIONS = {'backend': 'highs', 'method': 'choose', 'threads': None, 'time_limit': None, 'mip_gap': None,
+                   'log_file': None}
+
+# PuLP solver class behind each backend name
+PULP_SOLVERS = {
+    'highs': 'HiGHS',
+    'cbc': 'PULP_CBC_CMD',
+    'glpk': 'GLPK_CMD',
+    'scip': 'SCIP_CMD',
+    'cplex': 'CPLEX_CMD',
+    'gurobi': 'GUROBI_CMD',
+}
+
+# Command-line switches selecting the LP algorithm of the command-line solvers
+METHOD_FLAGS = {
+    'cbc': {'simplex': ['dualSimplex'], 'ipm': ['barrier']},
+    'glpk': {'simplex': ['--simplex'], 'ipm': ['--interior']},
+}
+
+
+def solver_options(options=None):
+    """
+    The solver settings with defaults filled in; raises ValueError for an unknown
+    backend or method.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if options['backend'] not in PULP_SOLVERS:
+        raise ValueError(f"Unknown solver backend: {options['backend']}")
+    if options['method'] not in METHODS:
+        raise ValueError(f"Unknown solver method: {options['method']}")
+    return options
+
+
+def available_backends():
+    # Backends whose solver is installed here
+    installed = set(pulp.listSolvers(onlyAvailable=True))
+    return [backend for backend, name in PULP_SOLVERS.items() if name in installed]
+
+
+def _threads(options):
+    return os.cpu_count() if options['threads'] == 0 else options['threads']
+
+
+def load_highs(model, log_file=None):
+    # Pass the model arrays to a HiGHS instance without going through a file
+    csc = model['A'].tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_ = csc.shape[1]
+    lp.num_row_ = csc.shape[0]
+    lp.col_cost_ = model['c']
+    lp.col_lower_ = model['col_lower']
+    lp.col_upper_ = model['col_upper']
+    lp.row_lower_ = model['row_lower']
+    lp.row_upper_ = model['row_upper']
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = csc.indptr
+    lp.a_matrix_.index_ = csc.indices
+    lp.a_matrix_.value_ = csc.data
+    if 'integrality' in model:
+        # Columns marked 1 are integer (binary with [0, 1] bounds); HiGHS then solves a MIP
+        lp.integrality_ = [highspy.HighsVarType.kInteger if flag else highspy.HighsVarType.kContinuous
+                           for flag in model['integrality']]
+
+    highs = highspy.Highs()
+    if log_file:
+        # Solver progress goes to a file that can be tailed while the solve runs
+        highs.setOptionValue('log_to_console', False)
+        highs.setOptionValue('log_file', log_file)
+    else:
+        highs.setOptionValue('output_flag', False)
+    highs.passModel(lp)
+    return highs
+
+
+_scheduler_threads = None
+
+
+def set_highs_options(highs, options):
+    global _scheduler_threads
+    highs.setOptionValue('solver', options['method'])
+    threads = _threads(options)
+    if threads is not None:
+        # HiGHS shares one thread pool per process, which has to be rebuilt to resize it
+        if threads != _scheduler_threads:
+            highspy.Highs.resetGlobalScheduler(True)
+            _scheduler_threads = threads
+        highs.setOptionValue('threads', threads)
+        highs.setOptionValue('parallel', 'on' if threads > 1 else 'off')
+    highs.setOptionValue('time_limit', float(options['time_limit']) if options['time_limit'] else highspy.kHighsInf)
+    if options['mip_gap'] is not None:
+        highs.setOptionValue('mip_rel_gap', float(options['mip_gap']))
+    if options['log_file']:
+        # A kept instance (e.g. the warm-start solver) moves on to the log file of each solve
+        highs.setOptionValue('output_flag', True)
+        highs.setOptionValue('log_to_console', False)
+        highs.setOptionValue('log_file', options['log_file'])
+
+
+def reset_scheduler():
+    # A forked worker process inherits the parent's HiGHS thread pool but not its threads
+    global _scheduler_threads
+    highspy.Highs.resetGlobalScheduler(True)
+    _scheduler_threads = None
+
+
+def highs_status(highs):
+    return {
+        highspy.HighsModelStatus.kOptimal: 'Optimal',
+        highspy.HighsModelStatus.kInfeasible: 'Infeasible',
+        highspy.HighsModelStatus.kUnbounded: 'Unbounded',
+        highspy.HighsModelStatus.kUnboundedOrInfeasible: 'Infeasible',
+        highspy.HighsModelStatus.kTimeLimit: 'Time Limit',
+    }.get(highs.getModelStatus(), 'Not Solved')
+
+
+def highs_result(highs, constant=0.0):
+    # (status, x, objective); at the time limit HiGHS stops with its current iterate, which
+    # is returned only when it is primal feasible (a MIP incumbent, or a simplex iterate in
+    # phase 2)
+    status = highs_status(highs)
+    feasible = highs.getInfo().primal_solution_status == highspy.kSolutionStatusFeasible
+    if status == 'Optimal' or (status == 'Time Limit' and feasible):
+        solution = highs.getSolution()
+        return status, np.array(solution.col_value), highs.getInfo().objective_function_value + constant
+    return status, None, None
+
+
+def highs_duals(highs):
+    # Row duals and column reduced costs as arrays, or None when HiGHS has no dual solution
+    solution = highs.getSolution()
+    if not solution.dual_valid:
+        return None
+    return {'row': np.array(solution.row_dual), 'column': np.array(solution.col_dual)}
+
+
+def highs_ranging(highs):
+    """
+    Cost ranging of an LP solved to optimality from a basis: for every column the lowest
+    and highest cost at which the current solution stays optimal, each with the other
+    costs unchanged (-inf or inf where there is no limit). None when HiGHS has no ranging
+    (no basis, e.g. after interior point without crossover, or a MIP).
+    """
+    status, ranging = highs.getRanging()
+    if status != highspy.HighsStatus.kOk or not ranging.valid:
+        return None
+    n = highs.getNumCol()  # the arrays run on over the row slacks
+    return {'cost_down': np.array(ranging.col_cost_dn.value_[:n]), 'cost_up': np.array(ranging.col_cost_up.value_[:n])}
+
+
+def highs_stats(highs, options, objective, start_time=0.0):
+    # start_time: getRunTime() before the solve; the clock keeps running across re-solves
+    info = highs.getInfo()
+    status = highs_status(highs)
+    if info.mip_node_count >= 0:
+        # A MIP: the bound is the best proven lower bound, which the gap measures against
+        return {
+            'backend': 'highs',
+            'method': options['method'],
+            'status': status,
+            'iterations': max(0, info.simplex_iteration_count),
+            'solve_time': highs.getRunTime() - start_time,
+            'objective': objective,
+            # objective includes the model's constant, which HiGHS never sees
+            'bound': info.mip_dual_bound + objective - info.objective_function_value if objective is not None else None,
+            'mip_gap': info.mip_gap if objective is not None else None,
+            'nodes': info.mip_node_count,
+        }
+    return {
+        'backend': 'highs',
+        'method': options['method'],
+        'status': status,
+        'iterations': sum(max(0, n) for n in (info.simplex_iteration_count, info.ipm_iteration_count,
+                                               info.crossover_iteration_count)),
+        'solve_time': highs.getRunTime() - start_time,
+        'objective': objective,
+        # An optimal LP's dual objective equals its primal objective
+        'bound': objective if status == 'Optimal' else None,
+    }
+
+
+def pulp_solver(options=None, msg=True):
+    """
+    PuLP solver object for options['backend'] with the method, threads, time limit and
+    gap applied where that solver supports them.
+    """
+    options = solver_options(options)
+    backend = options['backend']
+    cls = getattr(pulp, PULP_SOLVERS[backend])
+    accepted = inspect.signature(cls.__init__).parameters
+    kwargs = {'timeLimit': options['time_limit'], 'gapRel': options['mip_gap'], 'threads': _threads(options)}
+    kwargs = {key: value for key, value in kwargs.items() if value is not None and key in accepted}
+    if options['method'] != 'choose':
+        if backend == 'highs':
+            kwargs['solver'] = options['method']
+        elif backend in METHOD_FLAGS:
+            kwargs['options'] = METHOD_FLAGS[backend][options['method']]
+    return cls(msg=msg, **kwargs)
+
+
+def pulp_stats(prob, options, objective):
+    status = pulp.LpStatus[prob.status]
+    return {
+        'backend': options['backend'],
+        'method': options['method'],
+        'status': status,
+        'iterations': None,  # Not reported by the command-line solvers
+        'solve_time': prob.solutionTime,
+        'objective': objective,
+        'bound': objective if status == 'Optimal' else None,
+    }
+
+
+def solve_model(model, options=None, log_file=None):
+    """
+    Solves a model from model_builder.build_model with the configured backend and returns
+    (status, x, objective, stats). x is None when there is no solution.
+    """
+    result = solve_arrays(model, options, log_file)
+    return result['status'], result['x'], result['objective'], result['stats']
+
+
+def solve_arrays(model, options=None, log_file=None, ranging=False):
+    """
+    Like solve_model, but returns a dict with 'status', 'x', 'objective', 'stats',
+    'duals' ({'row': ..., 'column': ...} arrays in the model's row and column order, or
+    None) and 'ranging' (highs_ranging of an optimal solve when ranging is set, otherwise
+    None). HiGHS takes the model arrays and hands the solution back as arrays, with no
+    files or variable names involved; other backends go through PuLP as a fallback.
+    """
+    options = solver_options(options)
+    if options['backend'] != 'highs':
+        return _solve_with_pulp(model, options)
+    highs = load_highs(model, log_file)
+    set_highs_options(highs, options)
+    highs.run()
+    status, x, objective = highs_result(highs, model['objective_constant'])
+    return {'status': status, 'x': x, 'objective': objective, 'stats': highs_stats(highs, options, objective),
+            'duals': highs_duals(highs) if x is not None else None,
+            'ranging': highs_ranging(highs) if ranging and status == 'Optimal' else None}
+
+
+def _solve_with_pulp(model, options):
+    # Other solvers read the model from an MPS file written by HiGHS, with columns c0, c1, ...
+    # and the rows in model order
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.mps')
+        load_highs(model).writeModel(path)
+        variables, prob = pulp.LpProblem.fromMPS(path)
+        prob.solve(pulp_solver(options, msg=False))
+    status = pulp.LpStatus[prob.status]
+    x = objective = duals = None
+    if status == 'Optimal':
+        columns = [variables[f'c{j}'] for j in range(model['A'].shape[1])]
+        x = np.array([var.varValue or 0.0 for var in columns])
+        objective = pulp.value(prob.objective) + model['objective_constant']
+        # Not every solver reports duals (CBC does for LPs)
+        row_dual = [constraint.pi for constraint in prob.constraints.values()]
+        if len(row_dual) == model['A'].shape[0] and None not in row_dual:
+            duals = {'row': np.array(row_dual, dtype=float),
+                     'column': np.array([var.dj or 0.0 for var in columns])}
+    return {'status': status, 'x': x, 'objective': objective, 'stats': pulp_stats(prob, options, objective),
+            'duals': duals, 'ranging': None}
+
+
+def combine_stats(stats, status, objective):
+    # One record for a sequence of solves (e.g. rolling-horizon windows)
+    iterations = [s['iterations'] for s in stats]
+    return {
+        **stats[0],
+        'status': status,
+        'iterations': None if None in iterations else sum(iterations),
+        'solve_time': sum(s['solve_time'] for s in stats),
+        'objective': objective,
+        'bound': objective if status == 'Optimal' else None,
+    }
+
+
+def format_stats(stats):
+    parts = [f"Solved with {stats['backend']} ({stats['method']}): {stats['status']} in {stats['solve_time']:.2f}s"]
+    if stats.get('iterations') is not None:
+        parts.append(f"{stats['iterations']} iterations")
+    if stats.get('objective') is not None:
+        parts.append(f"objective {stats['objective']:,.2f}")
+    if stats.get('bound') is not None:
+        parts.append(f"bound {stats['bound']:,.2f}")
+    if stats.get('mip_gap') is not None:
+        parts.append(f"gap {stats['mip_gap']:.2%} after {stats['nodes']} nodes")
+    return ', '.join(parts)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+# One row per storage technology. Power limits are optional (NaN means unlimited).
+STORAGE_COLUMNS = ['name', 'efficiency', 'capacity', 'charge_cost', 'discharge_cost', 'max_charge', 'max_discharge']
+
+# Technologies described by the legacy capacities/efficiencies/costs dicts
+DEFAULT_STORAGE = ['LDES', 'SDES', 'Hydrogen']
+
+
+def make_registry(rows):
+    """
+    Builds a storage registry table from a list of dicts (or a DataFrame) and validates it.
+    """
+    registry = pd.DataFrame(rows).reindex(columns=STORAGE_COLUMNS)
+    registry['name'] = registry['name'].astype(str)
+    numeric = STORAGE_COLUMNS[1:]
+    registry[numeric] = registry[numeric].astype(float)
+
+    if registry['name'].duplicated().any():
+        raise ValueError("Storage technology names must be unique")
+    if registry[['efficiency', 'capacity', 'charge_cost', 'discharge_cost']].isna().any().any():
+        raise ValueError("Storage efficiency, capacity and costs must be set for every technology")
+    if ((registry['efficiency'] <= 0) | (registry['efficiency'] > 1)).any():
+        raise ValueError("Storage efficiencies must be in (0, 1]")
+
+    return registry.reset_index(drop=True)
+
+
+def registry_from_inputs(capacities, efficiencies, costs, names=DEFAULT_STORAGE):
+    # Read LDES/SDES/Hydrogen from the legacy keyed dicts, e.g. capacities['ldes'], costs['ldes_charge']
+    return make_registry([
+        {
+            'name': name,
+            'efficiency': efficiencies[name.lower()],
+            'capacity': capacities[name.lower()],
+            'charge_cost': costs[f'{name.lower()}_charge'],
+            'discharge_cost': costs[f'{name.lower()}_discharge'],
+        }
+        for name in names
+    ])
+
+
+def load_registry(path):
+    # Storage table from a CSV or Excel file with the STORAGE_COLUMNS headers
+    if str(path).endswith('.csv'):
+        return make_registry(pd.read_csv(path))
+    return make_registry(pd.read_excel(path))
+
+
+def power_limit(registry, column):
+    # Power limits as an array with np.inf where no limit is set
+    return registry[column].fillna(np.inf).to_numpy()
@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import optimisation as opt
+import profile_loader as pl
+import storage as sr
+
+# Sweep parameters are named by what they change:
+#   capacity.<key>          e.g. capacity.wind     -> capacities['wind'], capacity.ldes ->
+#                           the LDES capacity in the storage registry
+#   cost.<key>              e.g. cost.unmet_demand -> costs['unmet_demand'], cost.ldes_charge ->
+#                           the LDES charge cost in the storage registry
+#   storage.<name>.<column> e.g. storage.LDES.capacity, storage.SDES.efficiency
+
+# Base case used by the command line, matching the app defaults
+BASE_CAPACITIES = {'wind': 20.0, 'solar': 20.0, 'gas': 20.0, 'coal': 20.0, 'nuclear': 20.0, 'hydro': 20.0}
+BASE_COSTS = {'solar': 10.0, 'wind': 15.0, 'gas': 50.0, 'coal': 60.0, 'nuclear': 70.0, 'hydro': 40.0,
+              'unmet_demand': 100.0, 'curtailment': 5.0}
+BASE_STORAGE = [
+    {'name': 'LDES', 'efficiency': 0.85, 'capacity': 1000.0, 'charge_cost': 5.0, 'discharge_cost': 7.0},
+    {'name': 'SDES', 'efficiency': 0.9, 'capacity': 500.0, 'charge_cost': 3.0, 'discharge_cost': 5.0},
+    {'name': 'Hydrogen', 'efficiency': 0.75, 'capacity': 1500.0, 'charge_cost': 8.0, 'discharge_cost': 10.0},
+]
+
+
+def grid(axes):
+    # Full factorial design: one scenario per combination of the listed values
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def sample(ranges, n, seed=0):
+    """
+    Latin hypercube design of n scenarios. ranges maps each parameter to (low, high);
+    every parameter range is split into n strata and each stratum is used exactly once.
+    """
+    rng = np.random.default_rng(seed)
+    scenarios = [{} for _ in range(n)]
+    for name, (low, high) in ranges.items():
+        points = (rng.permutation(n) + rng.random(n)) / n
+        for scenario, u in zip(scenarios, low + points * (high - low)):
+            scenario[name] = float(u)
+    return scenarios
+
+
+def scenario_id(scenario):
+    # Stable id used to skip scenarios that are already in the output file
+    return hashlib.sha256(json.dumps(scenario, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def apply_scenario(scenario, capacities, costs, storage):
+    capacities, costs, storage = dict(capacities), dict(costs), storage.copy()
+    for name, value in scenario.items():
+        kind, _, key = name.partition('.')
+        if kind == 'capacity':
+            # Storage capacity lives in the registry, whatever the capacities dict holds
+            techs = {tech.lower(): tech for tech in storage['name']}
+            if key.lower() in techs:
+                storage.loc[storage['name'] == techs[key.lower()], 'capacity'] = value
+            elif key in capacities:
+                capacities[key] = value
+            else:
+                raise ValueError(f"Unknown capacity parameter: {name}")
+        elif kind == 'cost':
+            # Storage costs live in the registry too, e.g. cost.ldes_charge -> LDES charge_cost
+            tech, _, side = key.rpartition('_')
+            techs = {tech.lower(): tech for tech in storage['name']}
+            if tech.lower() in techs and side in ('charge', 'discharge'):
+                storage.loc[storage['name'] == techs[tech.lower()], f'{side}_cost'] = value
+            elif key in costs:
+                costs[key] = value
+            else:
+                raise ValueError(f"Unknown cost parameter: {name}")
+        elif kind == 'storage':
+            tech, _, column = key.rpartition('.')
+            if tech not in set(storage['name']) or column not in sr.STORAGE_COLUMNS[1:]:
+                raise ValueError(f"Unknown storage parameter: {name}")
+            storage.loc[storage['name'] == tech, column] = value
+        else:
+            raise ValueError(f"Unknown sweep parameter: {name}")
+    return capacities, costs, sr.make_registry(storage)
+
+
+def make_data(demand_profile, generation_profiles, capacities, number_of_weeks):
+    # Same input table as main.py and the app: profiles repeated for the number of weeks
+    return pl.build_data(demand_profile, generation_profiles, capacities, 168 * number_of_weeks)
+
+
+_base = None
+
+
+def _init_worker(base):
+    # The base case is sent once per worker process rather than with every scenario
+    global _base
+    _base = base
+
+
+def run_scenario(scenario):
+    """
+    Solves one scenario against the worker's base case and returns a flat result row:
+    the scenario inputs, status, objective, solve time and total energy of each series.
+    """
+    capacities, costs, storage = apply_scenario(scenario, _base['capacities'], _base['costs'], _base['storage'])
+    data = make_data(_base['demand_profile'], _base['generation_profiles'], capacities, _base['number_of_weeks'])
+    time_horizon = 168 * _base['number_of_weeks']
+
+    row = {'scenario_id': scenario_id(scenario), **scenario}
+    start = time.perf_counter()
+    try:
+        prob, status, solution = opt.run_optimization(data, time_horizon, costs, capacities, storage=storage,
+                                                      solver=_base['solver'])
+    except Exception as e:
+        row.update({'status': f'Error: {e}', 'objective': None, 'solve_time': time.perf_counter() - start})
+        return row
+    row.update({'status': status, 'objective': prob.get('objective'), 'solve_time': time.perf_counter() - start})
+
+    row['total_demand'] = data['Demand (MW)'].sum()
+    row['total_solar'] = data['Solar Generation (MW)'].sum()
+    row['total_wind'] = data['Wind Generation (MW)'].sum()
+    for name, total in solution.sum().items():
+        if not name.startswith('SOC_'):
+            row[f'total_{name}'] = total
+    return row
+
+
+def completed(out_path):
+    # Ids of scenarios already written; a line cut short by a crash is ignored, and
+    # scenarios that failed with an error are run again
+    if not os.path.exists(out_path):
+        return set()
+    done = pd.read_csv(out_path, usecols=['scenario_id', 'status'], on_bad_lines='skip')
+    failed = done['status'].astype(str).str.startswith('Error')
+    return set(done.loc[~failed, 'scenario_id'].astype(str))
+
+
+def _append_row(out_path, row, columns):
+    """
+    Appends one result row to out_path and returns the file's columns. A row with columns
+    the file lacks (e.g. the first solved scenario after an error row, which has no totals)
+    rewrites the file with the union of the columns instead of dropping them.
+    """
+    if not os.path.exists(out_path):
+        pd.DataFrame([row]).to_csv(out_path, index=False)
+        return list(row)
+    if columns is None:
+        columns = list(pd.read_csv(out_path, nrows=0).columns)
+    if any(name not in columns for name in row):
+        table = pd.concat([pd.read_csv(out_path, on_bad_lines='skip'), pd.DataFrame([row])], ignore_index=True)
+        table.to_csv(out_path + '.tmp', index=False)
+        os.replace(out_path + '.tmp', out_path)
+        return list(table.columns)
+    pd.DataFrame([row]).reindex(columns=columns).to_csv(out_path, mode='a', header=False, index=False)
+    return columns
+
+
+def run_sweep(scenarios, demand_profile, generation_profiles, capacities, costs, storage, number_of_weeks=1,
+              out_path='sweep_results.csv', workers=None):
+    """
+    Runs every scenario across a process pool (one worker per core by default). Each
+    finished scenario is appended to out_path straight away, and scenarios already in
+    out_path are skipped, so an interrupted sweep continues where it stopped. Returns the
+    full result table.
+    """
+    done = completed(out_path)
+    pending = [s for s in scenarios if scenario_id(s) not in done]
+    print(f"{len(scenarios)} scenarios, {len(scenarios) - len(pending)} already in {out_path}")
+
+    for scenario in pending:
+        apply_scenario(scenario, capacities, costs, storage)  # unknown parameters fail before any solve
+    workers = workers or os.cpu_count()
+    base = {
+        'demand_profile': demand_profile, 'generation_profiles': generation_profiles,
+        'capacities': capacities, 'costs': costs, 'storage': storage, 'number_of_weeks': number_of_weeks,
+        # the parallelism is across scenarios
+        'solver': {'threads': 1} if workers > 1 else None,
+    }
+    columns = None
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker, initargs=(base,)) as pool:
+            futures = [pool.submit(run_scenario, s) for s in pending]
+            for n, future in enumerate(as_completed(futures), 1):
+                row = future.result()
+                columns = _append_row(out_path, row, columns)
+                print(f"[{n}/{len(pending)}] {row['scenario_id']} {row['status']} "
+                      f"objective={row['objective']} ({row['solve_time']:.1f}s)")
+
+    return pd.read_csv(out_path, on_bad_lines='skip').drop_duplicates('scenario_id', keep='last')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a sweep of dispatch scenarios in parallel.")
+    design = parser.add_mutually_exclusive_group(required=True)
+    design.add_argument('--grid', help='JSON file mapping each parameter to a list of values')
+    design.add_argument('--sample', help='JSON file mapping each parameter to [low, high]')
+    parser.add_argument('-n', '--samples', type=int, default=100, help='Number of sampled scenarios')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--weeks', type=int, default=1)
+    parser.add_argument('--demand', default='demand_profile.xlsx')
+    parser.add_argument('--generation', default='generation_profiles.xlsx')
+    parser.add_argument('--storage', help='Storage registry CSV/Excel file (default: LDES, SDES, Hydrogen)')
+    parser.add_argument('--out', default='sweep_results.csv')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: number of cores)')
+    args = parser.parse_args()
+
+    with open(args.grid or args.sample) as f:
+        spec = json.load(f)
+    scenarios = grid(spec) if args.grid else sample(spec, args.samples, args.seed)
+    storage = sr.load_registry(args.storage) if args.storage else sr.make_registry(BASE_STORAGE)
+
+    results = run_sweep(
+        scenarios, *pl.load_profiles(args.demand, args.generation),
+        BASE_CAPACITIES, BASE_COSTS, storage, number_of_weeks=args.weeks,
+        out_path=args.out, workers=args.workers
+    )
+    print(results[['scenario_id', 'status', 'objective', 'solve_time']].describe(include='all'))
+
+
+if __name__ == '__main__':
+    main()
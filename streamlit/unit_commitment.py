@@ -0,0 +1,235 @@
+import numpy as np
+import scipy.sparse as sp
+
+import model_builder as mb
+import performance as pf
+import solvers as sv
+import storage as sr
+
+# Unit commitment for the committed units (mb.COMMITTED): per unit the minimum stable
+# generation (fraction of capacity while on) and the start-up cost (£ per MW of capacity
+# per start). Start-up and shut-down ramps (MW in the first and last step on) default to
+# the larger of the minimum stable generation and the ramp rate.
+UNITS = {
+    'Gas': {'min_stable': 0.4, 'start_cost': 30.0},
+    'Coal': {'min_stable': 0.5, 'start_cost': 60.0},
+}
+DEFAULT_MIP_GAP = 0.005
+
+
+def build_uc_model(data, time_horizon, costs, capacities, efficiencies=None, storage=None, time_step=1.0,
+                   units=None):
+    """
+    mb.build_model with the simplified minimum up/down and ramp rows of the committed units
+    replaced by a tight unit-commitment formulation: binary Commit_<unit>, Start_<unit> and
+    Stop_<unit> series, minimum up/down times on the start-ups and shut-downs, output
+    between minimum stable generation and capacity while committed, and ramp limits on the
+    output above the minimum. The output limit carries the start-up and shut-down ramps of
+    the neighbouring steps (the 3-binary formulation of Morales-Espana et al.), which keeps
+    the LP relaxation close to the convex hull. Units without capacity are left out.
+
+    The initial commitment is free (no start-up at step 0), like the LP model, which has
+    no ramp limits into the first step. model['integrality'] marks the binaries and
+    model['min_stable'] holds each unit's minimum output (MW).
+    """
+    units = {**UNITS, **(units or {})}
+    base = mb.build_model(data, time_horizon, costs, capacities, efficiencies, storage, time_step=time_step)
+    T, dt = base['time_horizon'], base['time_step']
+    reduced = mb.drop_blocks(base, [f'{name}_{kind}' for name in mb.COMMITTED
+                                    for kind in ('Min_Up', 'Min_Down', 'Ramp_Up', 'Ramp_Down')])
+    committed = [name for name in mb.COMMITTED if capacities[name.lower()] > 0]
+    min_stable = {name: units[name]['min_stable'] * capacities[name.lower()] for name in committed}
+
+    new_series = [f'{kind}_{name}' for name in committed for kind in ('Commit', 'Start', 'Stop')]
+    series = base['series'] + new_series
+    offsets = {name: k * T for k, name in enumerate(series)}
+    n_base, n_cols = reduced['A'].shape[1], len(series) * T
+    rows = mb._RowBlocks(n_cols)
+    c = np.concatenate([base['c'], np.zeros(n_cols - n_base)])
+    col_upper = np.concatenate([base['col_upper'], np.ones(n_cols - n_base)])
+
+    hours = np.arange(T)
+    later = hours[1:]
+    up_steps, down_steps = mb.steps(mb.MIN_UP_TIME, dt), mb.steps(mb.MIN_DOWN_TIME, dt)
+
+    def col(name, t):
+        return offsets[name] + t
+
+    def window(name, width):
+        # Terms summing a series over the `width` steps up to and including each step
+        terms = []
+        for k in range(width):
+            inside = np.flatnonzero(hours - k >= 0)
+            terms.append((col(name, hours[inside] - k), 1.0, inside))
+        return terms
+
+    for name in committed:
+        capacity = capacities[name.lower()]
+        minimum = min_stable[name]
+        ramp = mb.RAMP_RATE * dt
+        # A unit has to reach its minimum in the step it starts and leave it in the step it stops
+        start_ramp = min(capacity, max(minimum, units[name].get('startup_ramp', ramp)))
+        stop_ramp = min(capacity, max(minimum, units[name].get('shutdown_ramp', ramp)))
+        gen, u, v, w = f'Gen_{name}', f'Commit_{name}', f'Start_{name}', f'Stop_{name}'
+        c[col(v, hours)] = units[name]['start_cost'] * capacity
+        col_upper[col(v, 0)] = col_upper[col(w, 0)] = 0.0  # the initial commitment is free
+
+        # Commitment changes only through start-ups and shut-downs
+        rows.add(f'{name}_Commitment', T - 1, [(col(u, later), 1.0), (col(u, later - 1), -1.0),
+                                               (col(v, later), -1.0), (col(w, later), 1.0)], 0.0, 0.0)
+        # A unit started in the last up_steps steps is on; one stopped in the last
+        # down_steps steps is off
+        rows.add(f'{name}_Min_Up', T, window(v, up_steps) + [(col(u, hours), -1.0)], -np.inf, 0.0)
+        rows.add(f'{name}_Min_Down', T, window(w, down_steps) + [(col(u, hours), 1.0)], -np.inf, 1.0)
+
+        # Output between minimum stable generation and capacity while committed, lowered
+        # to the start-up ramp in the first step on and the shut-down ramp in the last
+        rows.add(f'{name}_Min_Stable', T, [(col(gen, hours), 1.0), (col(u, hours), -minimum)], 0.0, np.inf)
+        upper = [(col(gen, hours), 1.0), (col(u, hours), -capacity), (col(v, hours), capacity - start_ramp)]
+        stop_next = (col(w, later), capacity - stop_ramp, hours[:-1])
+        if up_steps >= 2:
+            rows.add(f'{name}_Max_Output', T, upper + [stop_next], -np.inf, 0.0)
+        else:
+            # A unit may start and stop in consecutive steps, so the two limits stay apart
+            rows.add(f'{name}_Max_Output', T, upper, -np.inf, 0.0)
+            rows.add(f'{name}_Max_Output_Stop', T, upper[:2] + [stop_next], -np.inf, 0.0)
+
+        # Ramp limits on the output above the minimum stable generation
+        above = [(col(gen, later), 1.0), (col(u, later), -minimum), (col(gen, later - 1), -1.0),
+                 (col(u, later - 1), minimum)]
+        rows.add(f'{name}_Ramp_Up', T - 1, above, -np.inf, ramp)
+        rows.add(f'{name}_Ramp_Down', T - 1, [(cols, -coef, *rest) for cols, coef, *rest in above], -np.inf, ramp)
+
+    A_uc, lower_uc, upper_uc = rows.matrix()
+    n_rows = reduced['A'].shape[0]
+    blocks = dict(reduced['row_blocks'])
+    blocks.update({name: (start + n_rows, stop + n_rows) for name, (start, stop) in rows.blocks.items()})
+    return {
+        **reduced,
+        'series': series,
+        'offsets': offsets,
+        'c': c,
+        'A': sp.vstack([sp.hstack([reduced['A'], sp.csr_matrix((n_rows, n_cols - n_base))]), A_uc], format='csr'),
+        'row_lower': np.concatenate([reduced['row_lower'], lower_uc]),
+        'row_upper': np.concatenate([reduced['row_upper'], upper_uc]),
+        'row_blocks': blocks,
+        'col_lower': np.concatenate([base['col_lower'], np.zeros(n_cols - n_base)]),
+        'col_upper': col_upper,
+        'integrality': np.concatenate([np.zeros(n_base, dtype=np.int8), np.ones(n_cols - n_base, dtype=np.int8)]),
+        'committed': committed,
+        'min_stable': min_stable,
+    }
+
+
+def repair_commitment(on, up_steps, down_steps):
+    """
+    A rounded commitment (0/1 per step) made to respect the minimum up and down times:
+    gaps shorter than down_steps between two runs are filled and runs that start within the
+    horizon are extended to up_steps. Units only ever stay on longer, which is feasible
+    at minimum stable output.
+    """
+    on = np.asarray(on, dtype=bool).copy()
+    while True:
+        changed = False
+        edges = np.flatnonzero(np.diff(on.astype(np.int8))) + 1
+        starts = edges[on[edges]]
+        stops = edges[~on[edges]]
+        for stop in stops:
+            restart = starts[starts > stop]
+            if len(restart) and restart[0] - stop < down_steps:
+                on[stop:restart[0]] = True
+                changed = True
+        for start in starts:
+            if not on[start:start + up_steps].all():
+                on[start:start + up_steps] = True
+                changed = True
+        if not changed:
+            return on.astype(float)
+
+
+def relaxation_start(model, x):
+    """
+    Start-up values for the MIP from an LP relaxation solution: a unit is on where its
+    relaxed output reaches half its minimum stable generation (the relaxed commitment
+    itself tends to sit near 0.5 throughout), the schedule is repaired
+    (repair_commitment) and the start-ups and shut-downs follow from it. Returns (column
+    indices, values) for the binaries only; HiGHS completes the continuous part by
+    solving the LP with them fixed.
+    """
+    T, dt = model['time_horizon'], model['time_step']
+    up_steps, down_steps = mb.steps(mb.MIN_UP_TIME, dt), mb.steps(mb.MIN_DOWN_TIME, dt)
+    index, values = [], []
+    for name in model['committed']:
+        offsets = {kind: model['offsets'][f'{kind}_{name}'] for kind in ('Commit', 'Start', 'Stop')}
+        gen = x[model['offsets'][f'Gen_{name}']:model['offsets'][f'Gen_{name}'] + T]
+        on = repair_commitment(gen >= 0.5 * model['min_stable'][name], up_steps, down_steps)
+        change = np.diff(on, prepend=on[0])
+        for kind, series in (('Commit', on), ('Start', np.maximum(change, 0)), ('Stop', np.maximum(-change, 0))):
+            index.append(offsets[kind] + np.arange(T))
+            values.append(series)
+    if not index:
+        return np.zeros(0, dtype=np.int32), np.zeros(0)
+    return np.concatenate(index).astype(np.int32), np.concatenate(values)
+
+
+def run_unit_commitment(data, time_horizon, costs, capacities, efficiencies=None, storage=None, time_step=1.0,
+                        solver=None, units=None, warm_start=True):
+    """
+    Builds and solves the unit-commitment MIP (build_uc_model). With warm_start the LP
+    relaxation is solved first, and its rounded commitment (relaxation_start) is handed to
+    HiGHS as a first incumbent, so a feasible schedule exists from the start of the
+    search. On the cases tried it did not make the MIP solve faster: HiGHS found the same
+    schedules in the same iterations without it. The relative gap is solver['mip_gap']
+    (DEFAULT_MIP_GAP when not set).
+
+    Returns (model, status, solution) like opt.run_matrix_optimization; model['solver']
+    holds the MIP stats (objective, best bound, gap, nodes) and model['relaxation'] the LP
+    relaxation objective. The solution adds the Commit_*, Start_* and Stop_* series.
+    """
+    if storage is None:
+        storage = sr.registry_from_inputs(capacities, efficiencies, costs)
+    options = sv.solver_options({**(solver or {}), 'backend': 'highs'})
+    if options['mip_gap'] is None:
+        options['mip_gap'] = DEFAULT_MIP_GAP
+
+    performance = []
+    with pf.phase(performance, 'build') as entry:
+        model = build_uc_model(data, time_horizon, costs, capacities, efficiencies, storage, time_step, units)
+        entry.update(pf.model_size(model))
+
+    highs = sv.load_highs(model)
+    sv.set_highs_options(highs, options)
+    model['relaxation'] = None
+    if warm_start and model['committed']:
+        relaxed = {key: value for key, value in model.items() if key != 'integrality'}
+        with pf.phase(performance, 'solve', label='relaxation', **pf.model_size(model)) as entry:
+            result = sv.solve_arrays(relaxed, options)
+            entry.update(iterations=result['stats']['iterations'], solver_seconds=result['stats']['solve_time'])
+        model['relaxation'] = result['objective']
+        if result['x'] is not None:
+            index, values = relaxation_start(model, result['x'])
+            highs.setSolution(len(index), index, values)
+
+    with pf.phase(performance, 'solve', label='mip', **pf.model_size(model)) as entry:
+        start_time = highs.getRunTime()
+        highs.run()
+        status, x, model['objective'] = sv.highs_result(highs, model['objective_constant'])
+        model['solver'] = sv.highs_stats(highs, options, model['objective'], start_time)
+        entry.update(iterations=model['solver']['iterations'], solver_seconds=model['solver']['solve_time'])
+
+    with pf.phase(performance, 'extract'):
+        solution = mb.make_solution(mb.extract_values(model, x) if x is not None else {})
+    model['performance'] = performance
+    return model, status, solution
+
+
+def commitment_summary(model, solution):
+    # Starts, committed steps and start-up cost of each committed unit
+    lines = []
+    for name in model['committed']:
+        starts = solution[f'Start_{name}'].round().sum()
+        on = solution[f'Commit_{name}'].round().sum()
+        cost = model['c'][model['offsets'][f'Start_{name}']] * starts
+        lines.append(f"  {name}: {int(starts)} start(s), on in {int(on)} of {len(solution)} steps, "
+                     f"start-up cost {cost:,.2f}")
+    return '\n'.join(lines)
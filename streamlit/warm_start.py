@@ -0,0 +1,87 @@
+import hashlib
+
+import numpy as np
+
+import model_builder as mb
+import presolve as ps
+import solvers as sv
+import performance as pf
+import sensitivity as se
+
+# Registry columns that only enter the objective
+COST_COLUMNS = ['charge_cost', 'discharge_cost']
+
+
+def structure_key(data, time_horizon, capacities, storage, time_step=1.0):
+    """
+    Hash of every input that shapes the feasible region: profiles, horizon, time step,
+    capacities and the non-cost storage columns. Two runs with the same key differ only
+    in their costs.
+    """
+    h = hashlib.sha256()
+    h.update(f'{time_horizon}:{float(time_step)}'.encode())
+    h.update(np.ascontiguousarray(data.to_numpy(dtype=float)).tobytes())
+    h.update(repr(sorted(capacities.items())).encode())
+    h.update(storage.drop(columns=COST_COLUMNS).to_csv(index=False).encode())
+    return h.hexdigest()
+
+
+class WarmStartSolver:
+    """
+    Keeps a built dispatch model loaded in HiGHS. When only costs change, the objective
+    coefficients are updated in place and the LP is re-solved from the previous basis.
+    """
+
+    def __init__(self, data, time_horizon, costs, capacities, storage, presolve=True, log_file=None,
+                 time_step=1.0):
+        self.key = structure_key(data, time_horizon, capacities, storage, time_step)
+        self.data = data
+        self.capacities = capacities
+        # The build phases are reported with the first solve only
+        self.performance = []
+        with pf.phase(self.performance, 'build') as entry:
+            self.model = mb.build_model(data, time_horizon, costs, capacities, storage=storage, time_step=time_step)
+            entry.update(pf.model_size(self.model))
+        if presolve:
+            with pf.phase(self.performance, 'presolve') as entry:
+                self.model = ps.reduce_model(self.model)
+                entry.update(pf.model_size(self.model))
+        self.highs = sv.load_highs(self.model, log_file)
+        self.iterations = []
+
+    def matches(self, data, time_horizon, capacities, storage, time_step=1.0):
+        return self.key == structure_key(data, time_horizon, capacities, storage, time_step)
+
+    def solve(self, costs, storage, solver=None, sensitivity=False):
+        # solver: method, threads, time_limit and mip_gap of solvers.DEFAULT_OPTIONS; the
+        # backend is always HiGHS, which keeps the basis between solves. With sensitivity
+        # the model also gets 'sensitivity' as in optimisation.run_matrix_optimization.
+        # Only push the coefficients that changed since the last solve
+        c, constant = mb.objective_coefficients(self.model, self.data, costs, storage)
+        changed = np.flatnonzero(c != self.model['c'])
+        if len(changed):
+            self.highs.changeColsCost(len(changed), changed.astype(np.int32), c[changed])
+        self.model = {**self.model, 'c': c, 'objective_constant': constant}
+
+        performance, self.performance = self.performance, []
+        options = sv.solver_options({**(solver or {}), 'backend': 'highs'})
+        with pf.phase(performance, 'solve', warm_start=bool(self.iterations), **pf.model_size(self.model)) as entry:
+            sv.set_highs_options(self.highs, options)
+            start_time = self.highs.getRunTime()
+            self.highs.run()
+            self.iterations.append(self.highs.getInfo().simplex_iteration_count)
+            status, x, self.model['objective'] = sv.highs_result(self.highs, constant)
+            self.model['solver'] = sv.highs_stats(self.highs, options, self.model['objective'], start_time)
+            entry.update(iterations=self.model['solver']['iterations'],
+                         solver_seconds=self.model['solver']['solve_time'])
+        self.model['duals'] = sv.highs_duals(self.highs) if x is not None else None
+        self.model['ranging'] = sv.highs_ranging(self.highs) if sensitivity and status == 'Optimal' else None
+        self.model['sensitivity'] = None
+        if sensitivity and x is not None and self.model['duals'] is not None:
+            with pf.phase(performance, 'sensitivity'):
+                self.model['sensitivity'] = se.analyse(self.model, x, self.data, costs, self.capacities, storage)
+        with pf.phase(performance, 'extract'):
+            solution = mb.make_solution(mb.extract_values(self.model, x) if x is not None else {})
+        self.model['performance'] = performance
+
+        return self.model, status, solution